@@ -0,0 +1,23 @@
+# batch_utils.py
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def imap_bounded(executor, fn, items, max_pending=None):
+    """Like executor.map, but pulls items lazily and yields results as they finish.
+
+    At most max_pending tasks are in flight, so a generator of instances (for
+    example a large archive being streamed) is never materialized up front.
+    """
+    if max_pending is None:
+        max_pending = 2 * getattr(executor, "_max_workers", 4)
+    pending = set()
+    for item in items:
+        pending.add(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
@@ -0,0 +1,334 @@
+# benchmarks.py
+import io
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import contextlib
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_THRESHOLD = 0.10
+BENCH_VERSION = 1
+# Walkers of WalkSAT_Batched in the flips/sec benchmark (its default max_tries).
+# With a single walker it would only measure NumPy call overhead.
+BATCHED_WALKERS = 16
+
+# Seeded fixtures built with the repo's own generators: (name, generator, args).
+FIXTURES = [
+    ("random3sat_50x200", "random3sat", (50, 200)),
+    ("realistic_150x750", "realistic3sat", (150, 750)),
+    ("realistic_150x900", "realistic3sat", (150, 900)),
+    ("sudoku_empty_9x9", "sudoku", (9,)),
+]
+
+
+# --- Fixtures ---
+
+def _write_fixture(kind, args, path):
+    if kind == "random3sat":
+        from generate_random_3sat import generate_random_3sat
+        generate_random_3sat(args[0], args[1], path)
+    elif kind == "realistic3sat":
+        from generate_bulk_3sat import generate_realistic_3sat
+        generate_realistic_3sat(args[0], args[1], path)
+    elif kind == "sudoku":
+        from generate_bulk_sudoku import sudoku_to_cnf
+        clauses = sudoku_to_cnf(args[0])
+        with open(path, "w") as f:
+            f.write(f"p cnf {args[0] ** 3} {len(clauses)}\n")
+            for clause in clauses:
+                f.write(" ".join(map(str, clause)) + " 0\n")
+
+
+def build_fixtures(folder, seed):
+    """Generate every fixture into folder; the same seed gives byte-identical files."""
+    paths = {}
+    for i, (name, kind, args) in enumerate(FIXTURES):
+        random.seed(seed * 1000 + i)
+        path = os.path.join(folder, f"{name}.cnf")
+        _write_fixture(kind, args, path)
+        paths[name] = path
+    return paths
+
+
+# --- Measurement helpers ---
+
+def _measure(fn, repeat):
+    """Run fn repeat times; returns the list of wall times in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _entry(value, unit, higher_is_better, samples=None):
+    entry = {"value": round(value, 6), "unit": unit, "higher_is_better": higher_is_better}
+    if samples is not None:
+        entry["samples"] = [round(s, 6) for s in samples]
+    return entry
+
+
+# --- Benchmarks ---
+# Each takes (fixtures, repeat) and returns {benchmark name: entry}.
+
+def bench_parse(fixtures, repeat):
+    from run_walksat import parse_cnf
+    from cnf_loader import load_cnf
+
+    results = {}
+    for name, path in fixtures.items():
+        mb = os.path.getsize(path) / (1024 * 1024)
+        samples = _measure(lambda: parse_cnf(path), repeat)
+        results[f"parse_cnf/{name}"] = _entry(mb / min(samples), "MB/s", True, samples)
+        samples = _measure(lambda: load_cnf(path, use_cache=False), repeat)
+        results[f"load_cnf_uncached/{name}"] = _entry(mb / min(samples), "MB/s", True, samples)
+    return results
+
+
+def bench_walksat(fixtures, repeat, seed=0):
+    from run_walksat import parse_cnf, SOLVERS
+
+    # Dense random formulas are (almost surely) UNSAT, so every run spends
+    # its whole flip budget and flips/sec is measured over a fixed workload.
+    clauses, num_vars = parse_cnf(fixtures["realistic_150x900"])
+    flip_budget = {"WalkSAT_Optimized": 2000, "WalkSAT_Incremental": 20000, "WalkSAT_Batched": 2000,
+                   "ProbSAT": 20000, "NoveltyPlus": 20000}
+    results = {}
+    for solver_name, solver in sorted(SOLVERS.items()):
+        # Batched counts the flips of all its walkers.
+        tries = BATCHED_WALKERS if solver_name == "WalkSAT_Batched" else 1
+        rates = []
+        for i in range(repeat):
+            random.seed(seed + i)
+            stats = {}
+            solver(clauses, num_vars, max_flips=flip_budget.get(solver_name, 2000), max_tries=tries, stats=stats)
+            rates.append(stats["flips_per_sec"])
+        suffix = f"_x{tries}" if tries > 1 else ""
+        results[f"flips_per_sec/{solver_name}{suffix}"] = _entry(max(rates), "flips/s", True)
+    return results
+
+
+def bench_micro(fixtures, repeat, seed=0):
+    from run_walksat import parse_cnf, check_clause, calculate_break_count
+
+    clauses, num_vars = parse_cnf(fixtures["realistic_150x750"])
+    rng = random.Random(seed)
+    assignment = [rng.choice([True, False]) for _ in range(num_vars + 1)]
+    var_to_clauses_map = {i: [] for i in range(1, num_vars + 1)}
+    for clause in clauses:
+        for lit in clause:
+            var_to_clauses_map[abs(lit)].append(clause)
+    sample_clauses = [rng.choice(clauses) for _ in range(1000)]
+    sample_vars = [rng.randint(1, num_vars) for _ in range(1000)]
+
+    def run_check():
+        for clause in sample_clauses:
+            check_clause(clause, assignment)
+
+    def run_break():
+        for var in sample_vars:
+            calculate_break_count(var, assignment, clauses, var_to_clauses_map)
+
+    results = {}
+    for name, fn in (("check_clause", run_check), ("calculate_break_count", run_break)):
+        per_call = [t / 1000 for t in timeit.repeat(fn, number=1, repeat=max(repeat, 3))]
+        results[f"micro/{name}"] = _entry(min(per_call) * 1e9, "ns/call", False)
+    return results
+
+
+def bench_glucose_setup(fixtures, repeat):
+    from pysat.solvers import Glucose3
+    from run_walksat import parse_cnf
+    from run_dpll import solve_instance
+
+    results = {}
+    for name in ("realistic_150x750", "sudoku_empty_9x9"):
+        clauses, _ = parse_cnf(fixtures[name])
+
+        def setup():
+            # What solve_instance pays before solve_limited: a fresh solver
+            # plus one add_clause call per clause.
+            solver = Glucose3()
+            for clause in clauses:
+                solver.add_clause(clause)
+            solver.delete()
+
+        samples = _measure(setup, repeat)
+        results[f"glucose_setup/{name}"] = _entry(min(samples) * 1000, "ms", False, samples)
+        folder, file = os.path.split(fixtures[name])
+        with contextlib.redirect_stdout(io.StringIO()):
+            samples = _measure(lambda: solve_instance((0, file, folder, 5)), repeat)
+        results[f"solve_instance/{name}"] = _entry(min(samples) * 1000, "ms", False, samples)
+    return results
+
+
+def bench_features(fixtures, repeat):
+    from cnf_loader import load_cnf
+    from features import extract_features
+
+    results = {}
+    for name, path in fixtures.items():
+        lits, offsets, num_vars = load_cnf(path, use_cache=False)
+        samples = _measure(lambda: extract_features(lits, offsets, num_vars), repeat)
+        results[f"features/{name}"] = _entry(min(samples) * 1000, "ms", False, samples)
+    return results
+
+
+def bench_inference(fixtures, repeat, model_path="best_solver_predictor.pkl"):
+    from features import model_feature_vector
+    from forest_model import forest_path_for, load_forest
+
+    if not os.path.exists(model_path):
+        return {}
+    batch = np.array([model_feature_vector(f"random3sat_{n}", n, n * r)
+                      for n in range(50, 150) for r in (3, 4, 5, 6)], dtype=np.float64)
+    single = batch[:1]
+    results = {}
+
+    forest_path = forest_path_for(model_path)
+    if os.path.exists(forest_path):
+        samples = _measure(lambda: load_forest(forest_path), repeat)
+        results["inference/forest_load"] = _entry(min(samples) * 1000, "ms", False, samples)
+        forest = load_forest(forest_path)
+        samples = _measure(lambda: forest.predict(single), max(repeat, 20))
+        results["inference/forest_single"] = _entry(statistics.median(samples) * 1000, "ms", False)
+        samples = _measure(lambda: forest.predict(batch), repeat)
+        results["inference/forest_batch400"] = _entry(min(samples) * 1000, "ms", False, samples)
+
+    import warnings
+    import joblib
+    warnings.filterwarnings("ignore")
+    samples = _measure(lambda: joblib.load(model_path), 1)
+    results["inference/sklearn_load"] = _entry(min(samples) * 1000, "ms", False, samples)
+    model = joblib.load(model_path)
+    samples = _measure(lambda: model.predict(single), max(repeat, 20))
+    results["inference/sklearn_single"] = _entry(statistics.median(samples) * 1000, "ms", False)
+    samples = _measure(lambda: model.predict(batch), repeat)
+    results["inference/sklearn_batch400"] = _entry(min(samples) * 1000, "ms", False, samples)
+    return results
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "walksat": bench_walksat,
+    "micro": bench_micro,
+    "glucose": bench_glucose_setup,
+    "features": bench_features,
+    "inference": bench_inference,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_benchmarks(groups=None, repeat=5, seed=0, fixture_dir=None):
+    """Run the selected benchmark groups and return the JSON-ready report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = fixture_dir or tmp
+        os.makedirs(folder, exist_ok=True)
+        fixtures = build_fixtures(folder, seed)
+        results = {}
+        for group in groups or BENCHMARKS:
+            start = time.perf_counter()
+            results.update(BENCHMARKS[group](fixtures, repeat))
+            print(f"  {group:10s} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return {
+        "version": BENCH_VERSION,
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Return (rows, failures) comparing two reports benchmark by benchmark.
+
+    change is the relative improvement (positive = better) after accounting
+    for whether higher or lower values are better. Failures are regressions
+    beyond threshold plus baseline benchmarks the current report lacks.
+    """
+    rows, failures = [], []
+    for name, new in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None or not old["value"]:
+            rows.append((name, None, new["value"], new["unit"], None, "new"))
+            continue
+        ratio = new["value"] / old["value"]
+        if new["higher_is_better"]:
+            change = ratio - 1
+        else:
+            change = 1 / ratio - 1 if ratio else float("inf")
+        status = "REGRESSION" if change < -threshold else "improved" if change > threshold else "ok"
+        rows.append((name, old["value"], new["value"], new["unit"], change, status))
+        if status == "REGRESSION":
+            failures.append(name)
+    for name, old in baseline["benchmarks"].items():
+        if name not in current["benchmarks"]:
+            rows.append((name, old["value"], None, old["unit"], None, "missing"))
+            failures.append(name)
+    return rows, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproducible performance benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run benchmarks and write a JSON report")
+    run_parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmark groups to run")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--fixture-dir", help="keep the generated fixtures here instead of a temp dir")
+    compare_parser = sub.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative slowdown that counts as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_benchmarks(args.only, args.repeat, args.seed, args.fixture_dir)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        for name, entry in report["benchmarks"].items():
+            print(f"{name:45s} {entry['value']:14.3f} {entry['unit']}")
+        print(f"\n Benchmark results saved to '{args.output}'")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows, failures = compare(baseline, current, args.threshold)
+        for name, old, new, unit, change, status in rows:
+            old_text = f"{old:14.3f}" if old is not None else f"{'-':>14s}"
+            new_text = f"{new:14.3f}" if new is not None else f"{'-':>14s}"
+            change_text = f"{change * 100:+7.1f}%" if change is not None else f"{'':>8s}"
+            print(f"{name:45s} {old_text} -> {new_text} {unit:8s} {change_text}  {status}")
+        if failures:
+            missing = sum(status == "missing" for *_, status in rows)
+            print(f"\n {len(failures) - missing} regression(s) beyond {args.threshold:.0%}, "
+                  f"{missing} benchmark(s) missing")
+            sys.exit(1)
+        print(f"\n No regressions beyond {args.threshold:.0%}")
@@ -0,0 +1,612 @@
+# cluster.py
+import os
+import csv
+import sys
+import json
+import time
+import socket
+import argparse
+import importlib
+import threading
+import socketserver
+import multiprocessing as mp
+from collections import deque
+from cnf_loader import cache_member
+from results_sink import ResultsSink
+from results_store import ResultsStore, RunPlan
+
+DEFAULT_PORT = 7070
+# A lease not renewed for this long is presumed dead and its instance is
+# handed out again. Workers renew their leases every HEARTBEAT_INTERVAL, or
+# more often when the coordinator runs with short leases.
+LEASE_SECONDS = 30.0
+HEARTBEAT_INTERVAL = 5.0
+# An instance whose lease expired this many times is recorded as ERROR.
+MAX_ATTEMPTS = 3
+# Idle workers ask again after this many seconds.
+POLL_INTERVAL = 0.5
+# Task files kept ready in the pending/ folder of a lease directory.
+LEASE_DIR_PREFETCH = 64
+DONE_MARKER = "DONE"
+
+# Runner module and its task function, per runner name.
+RUNNERS = {
+    "dpll": ("run_dpll", "solve_instance"),
+    "walksat": ("run_walksat", "process_file"),
+    "solver": ("run_solver", "solve_task"),
+}
+
+
+def task_function(runner):
+    module_name, function_name = RUNNERS[runner]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _json_default(value):
+    # NumPy scalars in result rows.
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _dumps(message):
+    return json.dumps(message, default=_json_default)
+
+
+def _beat(renew, stop, interval=HEARTBEAT_INTERVAL):
+    """Call renew() every interval until stop is set; a failed renewal ends the loop."""
+    while not stop.wait(interval):
+        try:
+            renew()
+        except (OSError, ValueError):
+            return
+
+
+class Coordinator:
+    """Hand out the instances of a RunPlan as leases and collect the rows.
+
+    Workers lease one instance at a time, so fast workers simply come back
+    for more. A lease is held until its row arrives; leases of a worker that
+    stops renewing them expire after lease_seconds, and their instances are
+    queued again. The first row for an instance wins and later duplicates are
+    dropped. All rows go through plan.complete(), so the store and the output
+    files have a single writer whatever the number of workers.
+    """
+
+    def __init__(self, runner, plan, make_task, solver, lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.runner = runner
+        self.plan = plan
+        self.instances = iter(plan)
+        self.make_task = make_task
+        self.solver = solver
+        self.lease_seconds = lease_seconds
+        self.heartbeat = min(HEARTBEAT_INTERVAL, lease_seconds / 3)
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.tasks = {}         # task id -> (instance name, file_info), until its row arrives
+        self.queue = deque()    # task ids waiting for a worker
+        self.leases = {}        # task id -> [worker, expiry]
+        self.attempts = {}
+        self.next_id = 0
+        self.exhausted = False
+        self.finished = threading.Event()
+        self.completed = 0
+        self.requeued = 0
+
+    def _next_task(self):
+        while self.queue:
+            task_id = self.queue.popleft()
+            if task_id in self.tasks and task_id not in self.leases:
+                return task_id
+        if not self.exhausted:
+            for name, formula in self.instances:
+                self.next_id += 1
+                if formula is not None:
+                    # Archive member: cache it beside the archive now, or every
+                    # worker would scan the archive up to it again.
+                    cache_member(os.path.join(self.plan.folder, name), formula)
+                # formula=None: workers load the instance from the shared folder.
+                self.tasks[self.next_id] = (name, self.make_task(self.next_id, name, None))
+                return self.next_id
+            self.exhausted = True
+            self._check_finished()
+        return None
+
+    def _check_finished(self):
+        if self.exhausted and not self.tasks:
+            self.finished.set()
+
+    def _requeue(self, task_id):
+        self.leases.pop(task_id, None)
+        self.attempts[task_id] = self.attempts.get(task_id, 0) + 1
+        if self.attempts[task_id] >= self.max_attempts:
+            name, _ = self.tasks.pop(task_id)
+            print(f" {name}: lease expired {self.attempts[task_id]} times, recording ERROR")
+            self.plan.complete({"instance": name, "solver": self.solver, "result": "ERROR"})
+            self._check_finished()
+        else:
+            self.requeued += 1
+            self.queue.append(task_id)
+
+    def _reap(self):
+        now = time.monotonic()
+        for task_id in [t for t, (_, expiry) in self.leases.items() if expiry < now]:
+            self._requeue(task_id)
+
+    def lease(self, worker):
+        """Next task for worker: {"task", "runner", "info", "heartbeat"}, {"wait": s} or {"done": True}."""
+        with self.lock:
+            self._reap()
+            task_id = self._next_task()
+            if task_id is None:
+                return {"done": True} if self.finished.is_set() else {"wait": POLL_INTERVAL}
+            self.leases[task_id] = [worker, time.monotonic() + self.lease_seconds]
+            return {"task": task_id, "runner": self.runner, "info": self.tasks[task_id][1],
+                    "heartbeat": self.heartbeat}
+
+    def renew(self, worker=None, task_ids=None):
+        """Extend the leases held by worker, or the given task ids."""
+        with self.lock:
+            expiry = time.monotonic() + self.lease_seconds
+            for task_id, lease in self.leases.items():
+                if (task_ids is None and lease[0] == worker) or (task_ids is not None and task_id in task_ids):
+                    lease[1] = expiry
+            return {"ok": True}
+
+    def release(self, worker=None, task_ids=None):
+        """Give up the leases of a worker known to be gone (or the given task ids)."""
+        with self.lock:
+            for task_id in [t for t, (w, _) in self.leases.items()
+                            if (task_ids is None and w == worker) or (task_ids is not None and t in task_ids)]:
+                self._requeue(task_id)
+
+    def result(self, worker, task_id, row):
+        """Accept the row of a task; a late duplicate of a finished task is ignored."""
+        with self.lock:
+            if task_id not in self.tasks:
+                return {"ok": False}
+            del self.tasks[task_id]
+            self.leases.pop(task_id, None)
+            self.plan.complete(row)
+            self.completed += 1
+            self._check_finished()
+            return {"ok": True}
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "lease":
+            return self.lease(request["worker"])
+        if op == "heartbeat":
+            return self.renew(request["worker"])
+        if op == "result":
+            return self.result(request["worker"], request["task"], request["row"])
+        return {"error": f"unknown op {op!r}"}
+
+
+# --- TCP transport ---
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        workers = set()
+        try:
+            for raw in self.rfile:
+                request = json.loads(raw)
+                workers.add(request.get("worker"))
+                self.wfile.write((_dumps(coordinator.handle(request)) + "\n").encode())
+                self.wfile.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            # A closed connection means the worker is gone: requeue its
+            # instances now instead of waiting for the leases to expire.
+            for worker in workers:
+                coordinator.release(worker)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Connection:
+    """One JSON-lines connection to the coordinator, shared with the heartbeat thread."""
+
+    def __init__(self, host, port, connect_timeout=30.0):
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.sock = socket.create_connection((host, port))
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(POLL_INTERVAL)
+        self.stream = self.sock.makefile("rw")
+        self.lock = threading.Lock()
+
+    def call(self, **request):
+        with self.lock:
+            self.stream.write(_dumps(request) + "\n")
+            self.stream.flush()
+            line = self.stream.readline()
+        if not line:
+            raise ConnectionError("coordinator closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.sock.close()
+
+
+def run_worker(host, port, worker=None):
+    """Lease and solve instances from a coordinator until it reports done."""
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    conn = _Connection(host, port)
+    stop = threading.Event()
+    beating = False
+    functions = {}
+    solved = 0
+    try:
+        while True:
+            reply = conn.call(op="lease", worker=worker)
+            if reply.get("done"):
+                break
+            if "task" not in reply:
+                time.sleep(reply.get("wait", POLL_INTERVAL))
+                continue
+            if not beating:
+                threading.Thread(target=_beat, args=(lambda: conn.call(op="heartbeat", worker=worker), stop,
+                                                     reply["heartbeat"]), daemon=True).start()
+                beating = True
+            runner = reply["runner"]
+            if runner not in functions:
+                functions[runner] = task_function(runner)
+            row = functions[runner](tuple(reply["info"]))
+            conn.call(op="result", worker=worker, task=reply["task"], row=row)
+            solved += 1
+    except ConnectionError:
+        pass
+    finally:
+        stop.set()
+        conn.close()
+    return solved
+
+
+def serve_tcp(coordinator, bind, port):
+    server = _TCPServer((bind, port), _RequestHandler)
+    server.coordinator = coordinator
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# --- Filesystem transport ---
+# For nodes that share a filesystem but cannot reach the coordinator over TCP.
+# The coordinator writes tasks to <dir>/pending/; a worker claims one by
+# renaming it into <dir>/leased/ (rename is atomic, so exactly one worker
+# wins), keeps touching the leased file as its heartbeat, and writes the row
+# to <dir>/results/. Leased files left untouched for lease_seconds belong to
+# dead workers and go back to pending/.
+
+LEASE_DIR_WORKER = "lease-dir"
+
+
+def _lease_dirs(lease_dir):
+    dirs = [os.path.join(lease_dir, name) for name in ("pending", "leased", "results")]
+    for path in dirs:
+        os.makedirs(path, exist_ok=True)
+    return dirs
+
+
+def _write_json(path, message):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(_dumps(message))
+    os.replace(tmp_path, path)
+
+
+def _task_id(entry):
+    return int(entry.split(".", 1)[0])
+
+
+def reset_lease_dir(lease_dir):
+    """Clear task files and the done marker left by an earlier run."""
+    for path in _lease_dirs(lease_dir):
+        for entry in os.listdir(path):
+            os.remove(os.path.join(path, entry))
+    done_marker = os.path.join(lease_dir, DONE_MARKER)
+    if os.path.exists(done_marker):
+        os.remove(done_marker)
+
+
+def serve_lease_dir(coordinator, lease_dir, prefetch=LEASE_DIR_PREFETCH):
+    """Drive the coordinator through a lease directory until every task has a row."""
+    pending, leased, results = _lease_dirs(lease_dir)
+    done_marker = os.path.join(lease_dir, DONE_MARKER)
+
+    while not coordinator.finished.is_set():
+        for entry in os.listdir(results):
+            if not entry.endswith(".json"):
+                continue
+            path = os.path.join(results, entry)
+            with open(path) as f:
+                message = json.load(f)
+            coordinator.result(message["worker"], message["task"], message["row"])
+            os.remove(path)
+
+        # Tasks still waiting in pending/ or held by a live worker keep their
+        # lease; stale leased files are taken back.
+        now = time.time()
+        live, dead = set(), set()
+        for entry in os.listdir(pending):
+            if entry.endswith(".json"):
+                live.add(_task_id(entry))
+        for entry in os.listdir(leased):
+            path = os.path.join(leased, entry)
+            try:
+                stale = now - os.path.getmtime(path) > coordinator.lease_seconds
+            except OSError:
+                continue
+            if stale:
+                os.remove(path)
+                dead.add(_task_id(entry))
+            else:
+                live.add(_task_id(entry))
+        coordinator.renew(task_ids=live)
+        if dead:
+            coordinator.release(task_ids=dead)
+
+        for _ in range(max(0, prefetch - len(os.listdir(pending)))):
+            reply = coordinator.lease(LEASE_DIR_WORKER)
+            if "task" not in reply:
+                break
+            _write_json(os.path.join(pending, f"{reply['task']}.json"), reply)
+        time.sleep(POLL_INTERVAL)
+
+    open(done_marker, "w").close()
+
+
+def run_lease_dir_worker(lease_dir, worker=None):
+    """Claim and solve tasks from a lease directory until the coordinator is done."""
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    pending, leased, results = _lease_dirs(lease_dir)
+    functions = {}
+    solved = 0
+    while True:
+        claimed = None
+        for entry in sorted(os.listdir(pending)):
+            if not entry.endswith(".json"):
+                continue
+            source = os.path.join(pending, entry)
+            target = os.path.join(leased, f"{entry[:-5]}.{worker}")
+            try:
+                # rename keeps the mtime of when the task was written, so touch
+                # it first: touched after the rename, a task that waited in
+                # pending/ could look stale and be swept back before the touch.
+                os.utime(source)
+                os.rename(source, target)
+            except OSError:
+                continue  # another worker was faster
+            claimed = target
+            break
+        if claimed is None:
+            if os.path.exists(os.path.join(lease_dir, DONE_MARKER)):
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        with open(claimed) as f:
+            task = json.load(f)
+        stop = threading.Event()
+        threading.Thread(target=_beat, args=(lambda: os.utime(claimed), stop, task["heartbeat"]),
+                         daemon=True).start()
+        try:
+            runner = task["runner"]
+            if runner not in functions:
+                functions[runner] = task_function(runner)
+            row = functions[runner](tuple(task["info"]))
+        finally:
+            stop.set()
+        _write_json(os.path.join(results, f"{task['task']}.{worker}.json"),
+                    {"worker": worker, "task": task["task"], "row": row})
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+        solved += 1
+    return solved
+
+
+def _worker_main(connect, lease_dir, worker):
+    if lease_dir:
+        run_lease_dir_worker(lease_dir, worker)
+    else:
+        host, port = connect
+        run_worker(host, port, worker)
+
+
+def start_workers(count, connect=None, lease_dir=None, prefix=None):
+    """Start count worker processes on this host (spawned, so no coordinator state is inherited)."""
+    context = mp.get_context("spawn")
+    prefix = prefix or f"{socket.gethostname()}-{os.getpid()}"
+    processes = []
+    for k in range(count):
+        process = context.Process(target=_worker_main, args=(connect, lease_dir, f"{prefix}-w{k}"))
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def coordinate(runner, runner_argv, port=DEFAULT_PORT, bind="127.0.0.1", lease_dir=None,
+               lease_seconds=LEASE_SECONDS, local_workers=0):
+    """Run one sweep of a runner with its arguments, solved by any number of workers."""
+    module = importlib.import_module(RUNNERS[runner][0])
+    args = module.parse_args(runner_argv)
+    solver, params, make_task = module.run_setup(args)
+    store = ResultsStore(args.store)
+    start = time.perf_counter()
+
+    with ResultsSink(args.output, module.RESULT_SCHEMA, truncate=True,
+                     store_path=args.store, store_params=params) as sink:
+        plan = RunPlan(args.folder, store, solver, params, sink, fresh=args.fresh,
+                       retime_fraction=args.retime_fraction)
+        coordinator = Coordinator(runner, plan, make_task, solver, lease_seconds)
+        server = None
+        if lease_dir:
+            reset_lease_dir(lease_dir)
+            connect = None
+            print(f"Coordinating {solver} {params} through lease directory '{lease_dir}'")
+        else:
+            server = serve_tcp(coordinator, bind, port)
+            connect = ("127.0.0.1" if bind in ("", "0.0.0.0") else bind, server.server_address[1])
+            print(f"Coordinating {solver} {params} on {bind}:{server.server_address[1]}")
+        workers = start_workers(local_workers, connect, lease_dir) if local_workers else []
+        try:
+            if lease_dir:
+                serve_lease_dir(coordinator, lease_dir)
+            else:
+                coordinator.finished.wait()
+            for process in workers:
+                process.join()
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+    store.close()
+
+    print(f"\n {coordinator.completed} instances solved in {time.perf_counter() - start:.1f}s, "
+          f"{coordinator.requeued} leases re-queued, {plan.aliases} duplicate formulas found")
+    print(f" Results saved to '{args.output}'")
+
+
+# --- Lease recovery check ---
+
+CHECK_LEASE_SECONDS = 2.0
+
+
+def _check_sweep(lease_dir, timeout):
+    """One sweep of a single hard instance with one worker killed mid-task.
+
+    Returns (coordinator, result of the instance) after a second worker has
+    finished the re-queued lease.
+    """
+    import tempfile
+    import run_dpll
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "instances")
+        os.makedirs(folder)
+        clauses, num_vars = run_dpll.pigeonhole(11, 10)
+        with open(os.path.join(folder, "php_11_10.cnf"), "w") as f:
+            f.write(f"p cnf {num_vars} {len(clauses)}\n")
+            f.writelines(" ".join(map(str, clause)) + " 0\n" for clause in clauses)
+        args = run_dpll.parse_args(["--folder", folder, "--output", os.path.join(tmp, "results.csv"),
+                                    "--store", os.path.join(tmp, "store.sqlite"), "--timeout", str(timeout)])
+        solver, params, make_task = run_dpll.run_setup(args)
+        store = ResultsStore(args.store)
+        with ResultsSink(args.output, run_dpll.RESULT_SCHEMA, truncate=True,
+                         store_path=args.store, store_params=params) as sink:
+            plan = RunPlan(args.folder, store, solver, params, sink)
+            coordinator = Coordinator("dpll", plan, make_task, solver, CHECK_LEASE_SECONDS)
+            server = connect = serving = None
+            if lease_dir:
+                lease_dir = os.path.join(tmp, lease_dir)
+                reset_lease_dir(lease_dir)
+                serving = threading.Thread(target=serve_lease_dir, args=(coordinator, lease_dir), daemon=True)
+                serving.start()
+                # Let the task sit in pending/ past a lease, as it would behind a long queue.
+                time.sleep(1.5 * CHECK_LEASE_SECONDS)
+            else:
+                server = serve_tcp(coordinator, "127.0.0.1", 0)
+                connect = ("127.0.0.1", server.server_address[1])
+            try:
+                victim = start_workers(1, connect, lease_dir, prefix="victim")[0]
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline and not _holds_lease(coordinator, lease_dir, "victim"):
+                    time.sleep(0.05)
+                victim.kill()
+                victim.join()
+                rescuer = start_workers(1, connect, lease_dir, prefix="rescuer")[0]
+                coordinator.finished.wait(4 * timeout + 2 * CHECK_LEASE_SECONDS)
+                if serving is not None:
+                    serving.join(POLL_INTERVAL * 4)
+                rescuer.join(timeout)
+                if rescuer.is_alive():
+                    rescuer.kill()
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+        store.close()
+        with open(args.output, newline="") as f:
+            rows = list(csv.DictReader(f))
+    return coordinator, rows[0]["result"] if rows else None
+
+
+def _holds_lease(coordinator, lease_dir, prefix):
+    if lease_dir:
+        leased = os.path.join(lease_dir, "leased")
+        return any(f".{prefix}-" in entry for entry in os.listdir(leased)) if os.path.isdir(leased) else False
+    with coordinator.lock:
+        return any(worker.startswith(prefix) for worker, _ in coordinator.leases.values())
+
+
+def check_leases(timeout=3.0):
+    """Check that the lease of a killed worker is re-queued; returns the failures.
+
+    Over TCP and through a lease directory, a worker is killed while it
+    solves a hard instance, and a second worker must finish it.
+    """
+    failures = []
+    for transport, lease_dir in (("tcp", None), ("lease-dir", "leases")):
+        coordinator, result = _check_sweep(lease_dir, timeout)
+        if coordinator.requeued != 1:
+            failures.append(f"{transport}: {coordinator.requeued} leases re-queued instead of 1")
+        if result in (None, "ERROR"):
+            failures.append(f"{transport}: instance finished as {result} instead of being solved again")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Distribute a run_dpll / run_walksat sweep over worker processes on any number of hosts.",
+        epilog="Arguments after -- are passed to the runner, e.g. "
+               "cluster.py coordinate dpll --local-workers 4 -- --folder instances/ --timeout 5"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coord = commands.add_parser("coordinate", help="plan the run, hand out leases and write the results")
+    coord.add_argument("runner", choices=sorted(RUNNERS))
+    coord.add_argument("--bind", default="127.0.0.1", help="address to listen on (0.0.0.0 for remote workers)")
+    coord.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coord.add_argument("--lease-dir", help="use a shared directory instead of TCP")
+    coord.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+    coord.add_argument("--local-workers", type=int, default=0, help="also start this many workers on this host")
+
+    commands.add_parser("check-leases", help="check that the lease of a killed worker is re-queued")
+
+    work = commands.add_parser("work", help="lease and solve instances")
+    work.add_argument("--connect", default=f"127.0.0.1:{DEFAULT_PORT}", help="coordinator HOST:PORT")
+    work.add_argument("--lease-dir", help="claim tasks from a shared directory instead of TCP")
+    work.add_argument("--processes", type=int, default=min(8, os.cpu_count() or 4))
+
+    argv = sys.argv[1:]
+    runner_argv = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, runner_argv = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.command == "coordinate":
+        coordinate(args.runner, runner_argv, args.port, args.bind, args.lease_dir,
+                   args.lease_seconds, args.local_workers)
+    elif args.command == "check-leases":
+        failures = check_leases()
+        print("\n".join(failures) or "Leases of killed workers are re-queued over TCP and lease directories.")
+        raise SystemExit(1 if failures else 0)
+    else:
+        host, _, port = args.connect.rpartition(":")
+        processes = start_workers(args.processes, (host, int(port)), args.lease_dir)
+        for process in processes:
+            process.join()
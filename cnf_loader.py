@@ -0,0 +1,370 @@
+# cnf_loader.py
+import io
+import os
+import bz2
+import gzip
+import lzma
+import struct
+import tarfile
+import hashlib
+import warnings
+import numpy as np
+
+# Binary clause cache written beside each instance as "<instance>.csr":
+#   header  magic, version, source size, source mtime (ns), source sha1,
+#           num_vars, num_lits, num_clauses
+#   body    int32 literals (num_lits), int32 clause offsets (num_clauses + 1)
+# Clause i is lits[offsets[i]:offsets[i + 1]] (CSR layout).
+CACHE_SUFFIX = ".csr"
+CACHE_MAGIC = b"CNFCSR\x00\x00"
+CACHE_VERSION = 2
+HEADER_FORMAT = "<8sIqq20sqqq"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Standalone instances may be compressed; archives are enumerated member by
+# member and addressed as "<archive>::<member>".
+COMPRESSED_OPENERS = {".gz": gzip.open, ".xz": lzma.open, ".lzma": lzma.open, ".bz2": bz2.open}
+CNF_SUFFIXES = (".cnf",) + tuple(".cnf" + ext for ext in COMPRESSED_OPENERS)
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2")
+MEMBER_SEPARATOR = "::"
+# Archive members get the same binary cache under "<archive>.members/", with
+# the archive's size and mtime in the header. It is written by cache_member
+# for runs that hand members to other processes by name.
+MEMBER_CACHE_SUFFIX = ".members"
+READ_BLOCK_SIZE = 1 << 20
+
+
+def _is_clause_line(line):
+    return bool(line) and line[:1] not in (b"c", b"p", b"%")
+
+
+def _tokens_to_csr(ints):
+    """Split a flat 0-terminated literal stream into (lits, offsets)."""
+    ints = np.asarray(ints, dtype=np.int64)
+    if len(ints) and ints[-1] != 0:
+        ints = np.append(ints, 0)
+    is_zero = ints == 0
+    lits = ints[~is_zero].astype(np.int32)
+    ends = np.flatnonzero(is_zero) - np.arange(is_zero.sum())
+    # A bare "0" is an empty clause (the formula is UNSAT) and is kept, like
+    # pysat's CNF parser does; it shows up as a repeated offset.
+    offsets = np.concatenate(([0], ends)).astype(np.int32)
+    return lits, offsets
+
+
+def _parse_block(block):
+    """Parse a block of whole lines into (literal stream, header num_vars or None, ended).
+
+    ended is True at a "%" line, which ends the formula in SATLIB files; the
+    "0" that follows it there is not an empty clause.
+    """
+    header_vars = None
+    clause_lines = []
+    ended = False
+    for line in block.splitlines():
+        line = line.strip()
+        if line.startswith(b"%"):
+            ended = True
+            break
+        if _is_clause_line(line):
+            clause_lines.append(line)
+        elif line.startswith(b"p") and header_vars is None:
+            parts = line.split()
+            try:
+                header_vars = int(parts[2]) if len(parts) >= 3 else 0
+            except ValueError:
+                header_vars = 0
+    body = b" ".join(clause_lines)
+    if not body:
+        return np.zeros(0, dtype=np.int64), header_vars, ended
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            return np.fromstring(body, dtype=np.int64, sep=" "), header_vars, ended
+    except (ValueError, DeprecationWarning):
+        # Malformed tokens: fall back to a tolerant line-by-line parse that
+        # skips bad lines, like parse_cnf does.
+        ints = []
+        for line in clause_lines:
+            try:
+                ints.extend(int(x) for x in line.split())
+            except ValueError:
+                continue
+        return np.array(ints, dtype=np.int64), header_vars, ended
+
+
+def parse_dimacs_stream(stream, block_size=READ_BLOCK_SIZE):
+    """Parse a binary DIMACS stream into (lits, offsets, num_vars).
+
+    The stream is consumed block by block, so the full text of a (possibly
+    compressed) instance is never held in memory at once.
+    """
+    pieces = []
+    header_vars = None
+    tail = b""
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind(b"\n")
+        if cut < 0:
+            tail = block
+            continue
+        tail = block[cut + 1:]
+        ints, block_vars, ended = _parse_block(block[:cut + 1])
+        pieces.append(ints)
+        if header_vars is None:
+            header_vars = block_vars
+        if ended:
+            tail = b""
+            break
+    if tail:
+        ints, block_vars, _ = _parse_block(tail)
+        pieces.append(ints)
+        if header_vars is None:
+            header_vars = block_vars
+
+    lits, offsets = _tokens_to_csr(np.concatenate(pieces) if pieces else [])
+    max_lit = int(np.abs(lits).max()) if len(lits) else 0
+    return lits, offsets, max(header_vars or 0, max_lit)
+
+
+def parse_dimacs(data):
+    """Parse DIMACS CNF bytes into (lits, offsets, num_vars)."""
+    return parse_dimacs_stream(io.BytesIO(data))
+
+
+def open_instance(path):
+    """Open a standalone instance for binary reading, decompressing by suffix."""
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(path)[1], open)
+    return opener(path, "rb")
+
+
+def _is_archive(name):
+    return name.endswith(ARCHIVE_SUFFIXES)
+
+
+def _open_member(tar, info):
+    stream = tar.extractfile(info)
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(info.name)[1])
+    return opener(stream, "rb") if opener is not None else stream
+
+
+def _load_member(path, use_cache=True):
+    archive, member = path.split(MEMBER_SEPARATOR, 1)
+    if use_cache:
+        cached = _read_member_cache(path)
+        if cached is not None:
+            return cached
+    # Without a cache the archive is scanned up to the member.
+    with tarfile.open(archive, mode="r|*") as tar:
+        for info in tar:
+            if info.name == member:
+                formula = parse_dimacs_stream(_open_member(tar, info))
+                if use_cache:
+                    cache_member(path, formula)
+                return formula
+    raise FileNotFoundError(f"{member} not found in {archive}")
+
+
+def iter_archive(archive):
+    """Lazily yield (member_name, (lits, offsets, num_vars)) from a tar archive.
+
+    The archive is read in streaming mode, so members are decompressed and
+    parsed in a single sequential pass without unpacking anything to disk.
+    """
+    with tarfile.open(archive, mode="r|*") as tar:
+        for info in tar:
+            if info.isfile() and info.name.endswith(CNF_SUFFIXES):
+                yield info.name, parse_dimacs_stream(_open_member(tar, info))
+
+
+def iter_instances(folder):
+    """Lazily yield (name, formula) for every instance in folder.
+
+    Standalone files (plain or compressed) yield formula None and are loaded
+    by the worker through load_cnf, which caches them. Archive members yield
+    "<archive>::<member>" with the already parsed CSR arrays.
+    """
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if not entry.is_file():
+            continue
+        if entry.name.endswith(CNF_SUFFIXES):
+            yield entry.name, None
+        elif _is_archive(entry.name):
+            for member, formula in iter_archive(entry.path):
+                yield entry.name + MEMBER_SEPARATOR + member, formula
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+def _mix64(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps modulo 2**64.
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def formula_fingerprint(lits, offsets, num_vars):
+    """Canonical hash of a formula.
+
+    Stable under clause order, literal order within a clause, duplicate
+    literals and duplicate clauses: each clause is hashed as a set of literals,
+    and the formula hash covers the sorted set of distinct clause hashes.
+    """
+    lits = np.asarray(lits, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    clause_ids = np.repeat(np.arange(len(lengths)), lengths)
+
+    # Sort literals inside each clause and drop repeated ones.
+    order = np.lexsort((lits, clause_ids))
+    lits, clause_ids = lits[order], clause_ids[order]
+    keep = np.ones(len(lits), dtype=bool)
+    keep[1:] = (lits[1:] != lits[:-1]) | (clause_ids[1:] != clause_ids[:-1])
+    lits, clause_ids = lits[keep], clause_ids[keep]
+
+    with np.errstate(over="ignore"):
+        lit_hash = _mix64(lits.astype(np.uint64))
+        sums = np.zeros(len(lengths), dtype=np.uint64)
+        np.add.at(sums, clause_ids, lit_hash)
+        sizes = np.bincount(clause_ids, minlength=len(lengths)).astype(np.uint64)
+        clause_hash = _mix64(sums ^ _mix64(sizes))
+
+    h = hashlib.sha1()
+    h.update(str(int(num_vars)).encode())
+    h.update(np.unique(clause_hash).astype("<u8").tobytes())
+    return h.hexdigest()
+
+
+def cache_path(path):
+    return path + CACHE_SUFFIX
+
+
+def _read_header(cache_file):
+    with open(cache_file, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) != HEADER_SIZE:
+        return None
+    header = struct.unpack(HEADER_FORMAT, raw)
+    if header[0] != CACHE_MAGIC or header[1] != CACHE_VERSION:
+        return None
+    return header
+
+
+def _map_cache(cache_file, header):
+    _, _, _, _, _, num_vars, num_lits, num_clauses = header
+    lits = np.memmap(cache_file, dtype=np.int32, mode="r",
+                     offset=HEADER_SIZE, shape=(num_lits,)) if num_lits else np.zeros(0, np.int32)
+    offsets = np.memmap(cache_file, dtype=np.int32, mode="r",
+                        offset=HEADER_SIZE + 4 * num_lits, shape=(num_clauses + 1,))
+    return lits, offsets, int(num_vars)
+
+
+def _write_cache(cache_file, st, digest, lits, offsets, num_vars):
+    header = struct.pack(HEADER_FORMAT, CACHE_MAGIC, CACHE_VERSION, st.st_size,
+                         st.st_mtime_ns, digest, num_vars, len(lits), len(offsets) - 1)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(header)
+            f.write(np.ascontiguousarray(lits, dtype="<i4").tobytes())
+            f.write(np.ascontiguousarray(offsets, dtype="<i4").tobytes())
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # Read-only instance folders simply run without a cache.
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def member_cache_path(path):
+    archive, member = path.split(MEMBER_SEPARATOR, 1)
+    return os.path.join(archive + MEMBER_CACHE_SUFFIX, member) + CACHE_SUFFIX
+
+
+def _read_member_cache(path):
+    cache_file = member_cache_path(path)
+    if not os.path.exists(cache_file):
+        return None
+    header = _read_header(cache_file)
+    st = os.stat(path.split(MEMBER_SEPARATOR, 1)[0])
+    if header is None or header[2] != st.st_size or header[3] != st.st_mtime_ns:
+        return None
+    return _map_cache(cache_file, header)
+
+
+def cache_member(path, formula):
+    """Cache an archive member already parsed by iter_instances.
+
+    Later load_cnf calls for "<archive>::<member>" then map the cache instead
+    of scanning the archive up to the member, which makes loading every
+    member by name quadratic in the archive size. A member already cached
+    for this version of the archive is left alone.
+    """
+    if _read_member_cache(path) is not None:
+        return
+    cache_file = member_cache_path(path)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    except OSError:
+        return
+    lits, offsets, num_vars = formula
+    # Members are validated by the archive's size and mtime only.
+    _write_cache(cache_file, os.stat(path.split(MEMBER_SEPARATOR, 1)[0]), bytes(20), lits, offsets, num_vars)
+
+
+def load_cnf(path, use_cache=True):
+    """Load a CNF file as CSR arrays (lits, offsets, num_vars).
+
+    With use_cache, the arrays are memory-mapped from "<path>.csr". The cache is
+    trusted when the source size and mtime match; otherwise the source hash is
+    compared, and the cache is rebuilt only when the content really changed.
+    Compressed files are cached the same way. Archive members are cached under
+    "<archive>.members/" and trusted while the archive's size and mtime match.
+    """
+    if MEMBER_SEPARATOR in path:
+        return _load_member(path, use_cache)
+    st = os.stat(path)
+    cache_file = cache_path(path)
+    digest = None
+    if use_cache and os.path.exists(cache_file):
+        header = _read_header(cache_file)
+        if header is not None:
+            if header[2] == st.st_size and header[3] == st.st_mtime_ns:
+                return _map_cache(cache_file, header)
+            digest = file_digest(path)
+            if header[4] == digest:
+                lits, offsets, num_vars = _map_cache(cache_file, header)
+                _write_cache(cache_file, st, digest, lits, offsets, num_vars)
+                return lits, offsets, num_vars
+
+    with open_instance(path) as f:
+        lits, offsets, num_vars = parse_dimacs_stream(f)
+    if use_cache:
+        if digest is None:
+            digest = file_digest(path)
+        _write_cache(cache_file, st, digest, lits, offsets, num_vars)
+    return lits, offsets, num_vars
+
+
+def to_clause_lists(lits, offsets):
+    """Expand CSR arrays into the list-of-lists form the solvers take."""
+    flat = lits.tolist()
+    bounds = offsets.tolist()
+    return [flat[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+def load_clauses(path, use_cache=True, formula=None):
+    """Drop-in for run_walksat.parse_cnf: returns (clauses, num_vars).
+
+    formula, when given, is a CSR triple already parsed by iter_instances.
+    """
+    lits, offsets, num_vars = formula if formula is not None else load_cnf(path, use_cache)
+    return to_clause_lists(lits, offsets), num_vars
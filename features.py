@@ -0,0 +1,362 @@
+# features.py
+import os
+import csv
+import json
+import time
+import random
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from pysat.solvers import Glucose3
+from cnf_loader import iter_instances, load_cnf, to_clause_lists, formula_fingerprint
+
+FEATURES_VERSION = 3
+FEATURE_CACHE = "feature_cache"
+
+# Per-group work limits. They count work rather than seconds, so the features
+# cached by fingerprint do not depend on the machine or on its load:
+#   graph       variable-graph pairs (sum of squared clause lengths); the group
+#               is skipped above it
+#   up_probe    unit-propagation probes
+#   ls_probe    seeded local-search flips
+#   preprocess  clause comparisons in subsumption and variable elimination
+# size, clause_length, variable_degree and polarity are single vectorized
+# passes over the literals and are not limited.
+DEFAULT_LIMITS = {
+    "graph": 4_000_000,
+    "up_probe": 32,
+    "ls_probe": 1000,
+    "preprocess": 1_000_000,
+}
+
+
+# Columns the trained predictor (best_solver_predictor.pkl) expects, in order.
+# They are built by merge_and_train.py from the two runners' num_vars and
+# num_clauses, which are identical for a given instance.
+MODEL_FEATURE_COLS = [
+    "num_vars_dpll", "num_clauses_dpll", "ratio_dpll",
+    "num_vars_walksat", "num_clauses_walksat", "ratio_walksat",
+    "is_sudoku", "is_random3sat", "vars_times_clauses_dpll",
+    "clause_density_dpll", "vars_times_clauses_walksat",
+    "clause_density_walksat", "var_diff", "clause_diff",
+    "var_ratio", "clause_ratio"
+]
+
+
+def model_feature_vector(instance, num_vars, num_clauses):
+    """The MODEL_FEATURE_COLS row for one instance, as merge_and_train builds it."""
+    ratio = num_clauses / (num_vars + 1e-6)
+    name = instance.lower()
+    return [
+        num_vars, num_clauses, ratio,
+        num_vars, num_clauses, ratio,
+        int("sudoku" in name), int("random" in name), num_vars * num_clauses,
+        ratio, num_vars * num_clauses,
+        ratio, 0, 0,
+        num_vars / (num_vars + 1e-6), num_clauses / (num_clauses + 1e-6)
+    ]
+
+
+def model_feature_matrix(instances, num_vars, num_clauses):
+    """model_feature_vector for many instances at once, as a float64 array."""
+    num_vars = np.asarray(num_vars, dtype=np.float64)
+    num_clauses = np.asarray(num_clauses, dtype=np.float64)
+    import pandas as pd
+    names = pd.Series(np.asarray(instances, dtype=object)).str.lower()
+    ratio = num_clauses / (num_vars + 1e-6)
+    product = num_vars * num_clauses
+    zeros = np.zeros_like(num_vars)
+    return np.column_stack([
+        num_vars, num_clauses, ratio,
+        num_vars, num_clauses, ratio,
+        names.str.contains("sudoku", regex=False).to_numpy(dtype=np.float64),
+        names.str.contains("random", regex=False).to_numpy(dtype=np.float64), product,
+        ratio, product,
+        ratio, zeros, zeros,
+        num_vars / (num_vars + 1e-6), num_clauses / (num_clauses + 1e-6)
+    ])
+
+
+def structural_columns(model):
+    """Feature names a predictor was trained on, or None for MODEL_FEATURE_COLS.
+
+    Selectors trained with --structural-features carry the instance_features
+    names they use; older exports carry no names at all.
+    """
+    names = getattr(model, "feature_names", None)
+    if names is None:
+        names = getattr(model, "feature_names_in_", None)
+    names = [] if names is None else list(names)
+    return names if names and names != MODEL_FEATURE_COLS else None
+
+
+def structural_row(features, columns):
+    """instance_features values in columns order; a skipped group's features are 0."""
+    return [float(features.get(name, 0.0)) for name in columns]
+
+
+def predictor_features(model, instance, path, formula=None, cache_dir=FEATURE_CACHE):
+    """The feature row model expects for one instance.
+
+    instance is the name used for the name flags of MODEL_FEATURE_COLS; path
+    (or the already parsed formula) is read for structural features.
+    """
+    columns = structural_columns(model)
+    if columns is None:
+        _, offsets, num_vars = formula if formula is not None else load_cnf(path)
+        return model_feature_vector(instance, num_vars, len(offsets) - 1)
+    return structural_row(instance_features(path, formula, cache_dir)[0], columns)
+
+
+def _stats(prefix, values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {f"{prefix}_{k}": 0.0 for k in ("mean", "std", "min", "max", "cv", "entropy")}
+    mean = values.mean()
+    std = values.std()
+    _, counts = np.unique(values, return_counts=True)
+    probs = counts / counts.sum()
+    return {
+        f"{prefix}_mean": float(mean),
+        f"{prefix}_std": float(std),
+        f"{prefix}_min": float(values.min()),
+        f"{prefix}_max": float(values.max()),
+        f"{prefix}_cv": float(std / mean) if mean else 0.0,
+        f"{prefix}_entropy": float(-(probs * np.log2(probs)).sum()),
+    }
+
+
+class _Formula:
+    """CSR arrays plus the derived index arrays shared by the feature groups."""
+
+    def __init__(self, lits, offsets, num_vars):
+        self.lits = np.asarray(lits, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.num_vars = int(num_vars)
+        self.num_clauses = len(self.offsets) - 1
+        self.lengths = np.diff(self.offsets)
+        self.clause_ids = np.repeat(np.arange(self.num_clauses), self.lengths)
+        self.vars = np.abs(self.lits)
+        self.positive = self.lits > 0
+
+
+def _size_features(f, limit):
+    return {
+        "num_vars": f.num_vars,
+        "num_clauses": f.num_clauses,
+        "num_lits": len(f.lits),
+        "clause_var_ratio": f.num_clauses / max(f.num_vars, 1),
+        "lit_clause_ratio": len(f.lits) / max(f.num_clauses, 1),
+    }
+
+
+def _clause_length_features(f, limit):
+    n = max(f.num_clauses, 1)
+    features = _stats("clause_len", f.lengths)
+    features.update({
+        "frac_unit": float((f.lengths == 1).sum() / n),
+        "frac_binary": float((f.lengths == 2).sum() / n),
+        "frac_ternary": float((f.lengths == 3).sum() / n),
+        "frac_long": float((f.lengths > 3).sum() / n),
+    })
+    return features
+
+
+def _variable_degree_features(f, limit):
+    degree = np.bincount(f.vars, minlength=f.num_vars + 1)[1:]
+    features = _stats("var_degree", degree)
+    features["frac_unused_vars"] = float((degree == 0).sum() / max(f.num_vars, 1))
+    return features
+
+
+def _polarity_features(f, limit):
+    n = max(f.num_clauses, 1)
+    pos_per_clause = np.bincount(f.clause_ids, weights=f.positive, minlength=f.num_clauses)
+    pos_ratio_clause = pos_per_clause / np.maximum(f.lengths, 1)
+    pos_per_var = np.bincount(f.vars, weights=f.positive, minlength=f.num_vars + 1)[1:]
+    deg = np.bincount(f.vars, minlength=f.num_vars + 1)[1:]
+    used = deg > 0
+    # 0 = perfectly balanced variable, 1 = pure literal
+    balance = np.abs(2 * pos_per_var[used] / deg[used] - 1) if used.any() else np.zeros(0)
+    features = {
+        "frac_pos_lits": float(f.positive.mean()) if len(f.lits) else 0.0,
+        "frac_horn": float((pos_per_clause <= 1).sum() / n),
+        "frac_anti_horn": float(((f.lengths - pos_per_clause) <= 1).sum() / n),
+        "frac_pure_vars": float((balance == 1).sum() / max(used.sum(), 1)),
+    }
+    features.update(_stats("clause_pos_ratio", pos_ratio_clause))
+    features.update(_stats("var_polarity_balance", balance))
+    return features
+
+
+def _graph_features(f, limit):
+    # Variable graph: variables adjacent when they share a clause. Building it
+    # costs about sum(len^2) pairs, so skip it above the limit.
+    pairs = float((f.lengths.astype(np.float64) ** 2).sum())
+    if pairs > limit:
+        return None
+    incidence = sp.csr_matrix(
+        (np.ones(len(f.lits), dtype=np.float32), (f.clause_ids, f.vars - 1)),
+        shape=(f.num_clauses, max(f.num_vars, 1))
+    )
+    var_graph = (incidence.T @ incidence).tocsr()
+    var_graph.setdiag(0)
+    var_graph.eliminate_zeros()
+    vg_degree = np.diff(var_graph.indptr)
+    features = _stats("vg_degree", vg_degree)
+    n = max(f.num_vars, 1)
+    features["vg_density"] = float(var_graph.nnz / max(n * (n - 1), 1))
+    return features
+
+
+def _up_probe_features(f, limit):
+    # Unit-propagation probing: assign random literals and measure how much
+    # propagation they trigger and how often they fail immediately.
+    rng = random.Random(0)
+    implied = []
+    failed = 0
+    with Glucose3(bootstrap_with=to_clause_lists(f.lits, f.offsets)) as solver:
+        ok, root = solver.propagate()
+        if not ok:
+            return {"up_root_fixed": 1.0, "up_implied_mean": 0.0, "up_failed_frac": 1.0, "up_probes": 0}
+        for _ in range(limit):
+            lit = rng.randint(1, max(f.num_vars, 1)) * rng.choice((-1, 1))
+            ok, lits = solver.propagate(assumptions=[lit])
+            if ok:
+                implied.append(len(lits) - len(root))
+            else:
+                failed += 1
+    probes = len(implied) + failed
+    return {
+        "up_root_fixed": len(root) / max(f.num_vars, 1),
+        "up_implied_mean": float(np.mean(implied)) / max(f.num_vars, 1) if implied else 0.0,
+        "up_failed_frac": failed / probes if probes else 0.0,
+        "up_probes": probes,
+    }
+
+
+def _ls_probe_features(f, limit):
+    from run_walksat import walksat_incremental
+
+    # Seeded, so the same formula always takes the same flips. The flip rate
+    # is left out: it measures the machine, not the instance.
+    stats = {}
+    assignment = walksat_incremental(to_clause_lists(f.lits, f.offsets), f.num_vars,
+                                     max_flips=limit, max_tries=1, stats=stats, rng=random.Random(0))
+    return {
+        "ls_solved": int(assignment is not None),
+        "ls_flips": stats.get("flips", 0),
+    }
+
+
+def _preprocess_features(f, limit):
+    from preprocess import preprocess
+
+    pre = preprocess(to_clause_lists(f.lits, f.offsets), f.num_vars, max_work=limit)
+    stats = pre.stats
+    n = max(f.num_clauses, 1)
+    return {
+        "pre_decided": {"SAT": 1, "UNSAT": -1}.get(pre.status, 0),
+        "pre_clause_reduction": 1 - stats["clauses_after"] / n,
+        "pre_var_reduction": 1 - stats["vars_after"] / max(f.num_vars, 1),
+        "pre_tautology_frac": stats["tautologies"] / n,
+        "pre_duplicate_frac": stats["duplicate_clauses"] / n,
+        "pre_subsumed_frac": stats["subsumed"] / n,
+        "pre_unit_frac": stats["units"] / max(f.num_vars, 1),
+        "pre_pure_frac": stats["pure_literals"] / max(f.num_vars, 1),
+    }
+
+
+FEATURE_GROUPS = {
+    "size": _size_features,
+    "clause_length": _clause_length_features,
+    "variable_degree": _variable_degree_features,
+    "polarity": _polarity_features,
+    "graph": _graph_features,
+    "up_probe": _up_probe_features,
+    "ls_probe": _ls_probe_features,
+    "preprocess": _preprocess_features,
+}
+
+
+def extract_features(lits, offsets, num_vars, groups=None, limits=None):
+    """Compute feature groups for a CSR formula.
+
+    Returns (features, costs): a flat dict of features and the seconds spent
+    in each group. A group skipped for exceeding its work limit contributes
+    no features and reports a negative cost.
+    """
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    f = _Formula(lits, offsets, num_vars)
+    features, costs = {}, {}
+    for name in groups or FEATURE_GROUPS:
+        start = time.perf_counter()
+        values = FEATURE_GROUPS[name](f, limits.get(name))
+        cost = time.perf_counter() - start
+        if values is None:
+            costs[name] = -1.0
+            continue
+        features.update(values)
+        costs[name] = round(cost, 6)
+    return features, costs
+
+
+def instance_features(path, formula=None, cache_dir=FEATURE_CACHE, groups=None, limits=None):
+    """Features of one instance, cached by formula fingerprint in cache_dir.
+
+    The cache assumes DEFAULT_LIMITS; pass cache_dir=None with other limits.
+    """
+    lits, offsets, num_vars = formula if formula is not None else load_cnf(path)
+    cache_file = None
+    if cache_dir:
+        fingerprint = formula_fingerprint(lits, offsets, num_vars)
+        cache_file = os.path.join(cache_dir, f"{fingerprint}.json")
+        if os.path.exists(cache_file):
+            with open(cache_file) as fh:
+                cached = json.load(fh)
+            if cached.get("version") == FEATURES_VERSION and set(groups or FEATURE_GROUPS) <= set(cached["costs"]):
+                return cached["features"], cached["costs"]
+
+    features, costs = extract_features(lits, offsets, num_vars, groups, limits)
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as fh:
+            json.dump({"version": FEATURES_VERSION, "features": features, "costs": costs}, fh)
+        os.replace(tmp_file, cache_file)
+    return features, costs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract structural instance features.")
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--output", default="features.csv")
+    parser.add_argument("--cache-dir", default=FEATURE_CACHE)
+    args = parser.parse_args()
+
+    rows = []
+    total_costs = {}
+    for name, formula in iter_instances(args.folder):
+        features, costs = instance_features(os.path.join(args.folder, name), formula, args.cache_dir)
+        row = {"instance": name}
+        row.update(features)
+        row.update({f"cost_{group}": cost for group, cost in costs.items()})
+        rows.append(row)
+        for group, cost in costs.items():
+            total_costs.setdefault(group, []).append(cost)
+
+    fieldnames = ["instance"]
+    for row in rows:
+        fieldnames.extend(k for k in row if k not in fieldnames)
+    with open(args.output, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"Features for {len(rows)} instances saved to '{args.output}'")
+    print("Per-group cost (mean ms / max ms, skipped):")
+    for group, costs in total_costs.items():
+        ran = [c for c in costs if c >= 0]
+        mean_ms = 1000 * sum(ran) / len(ran) if ran else 0.0
+        max_ms = 1000 * max(ran) if ran else 0.0
+        print(f"  {group:16s} {mean_ms:8.2f} / {max_ms:8.2f}  ({len(costs) - len(ran)} skipped)")
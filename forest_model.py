@@ -0,0 +1,180 @@
+# forest_model.py
+import os
+import json
+import struct
+import numpy as np
+
+# Flat random-forest format written by export_forest ("<model>.rf"):
+#   header   magic, version, kind (0 classifier, 1 regressor), n_trees,
+#            n_nodes, n_features, n_outputs, meta length
+#   meta     UTF-8 JSON: feature names and, for selectors, solver labels
+#   classes  float64 (n_outputs)           classifier labels, empty for regressors
+#   roots    int32 (n_trees)               index of each tree's root node
+#   feature  int32 (n_nodes)               split feature, -1 at leaves
+#   left     int32 (n_nodes)               left child (global index), -1 at leaves
+#   right    int32 (n_nodes)               right child (global index), -1 at leaves
+#   threshold float64 (n_nodes)            go left when x[feature] <= threshold
+#   value    float64 (n_nodes, n_outputs)  class probabilities / regression value
+# All trees share one node array; evaluating the forest needs only NumPy.
+FOREST_MAGIC = b"RFOREST\x00"
+FOREST_VERSION = 1
+HEADER_FORMAT = "<8sIIIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CLASSIFIER, REGRESSOR = 0, 1
+
+
+def forest_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".rf"
+
+
+def export_forest(model, path, feature_names=(), solver_labels=None):
+    """Write a fitted sklearn RandomForestClassifier/Regressor in the flat format.
+
+    solver_labels names the solver behind each class of a selector.
+    """
+    is_classifier = hasattr(model, "classes_")
+    roots, feature, left, right, threshold, value = [], [], [], [], [], []
+    base = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        roots.append(base)
+        feature.append(np.where(leaf, -1, tree.feature))
+        left.append(np.where(leaf, -1, tree.children_left + base))
+        right.append(np.where(leaf, -1, tree.children_right + base))
+        threshold.append(tree.threshold)
+        v = tree.value[:, 0, :]
+        if is_classifier:
+            # Depending on the sklearn version leaves hold counts or fractions.
+            v = v / np.maximum(v.sum(axis=1, keepdims=True), 1e-300)
+        value.append(v)
+        base += tree.node_count
+
+    value = np.concatenate(value).astype("<f8")
+    classes = np.asarray(model.classes_, dtype="<f8") if is_classifier else np.zeros(0, "<f8")
+    meta = {"feature_names": list(feature_names)}
+    if solver_labels is not None:
+        meta["solver_labels"] = list(solver_labels)
+    meta = json.dumps(meta).encode()
+    header = struct.pack(HEADER_FORMAT, FOREST_MAGIC, FOREST_VERSION,
+                         CLASSIFIER if is_classifier else REGRESSOR, len(roots), base,
+                         model.n_features_in_, value.shape[1], len(meta))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(meta)
+        f.write(classes.tobytes())
+        for arrays, dtype in ((roots, "<i4"), (feature, "<i4"), (left, "<i4"), (right, "<i4"), (threshold, "<f8")):
+            f.write(np.ascontiguousarray(np.concatenate([np.atleast_1d(a) for a in arrays]), dtype=dtype).tobytes())
+        f.write(value.tobytes())
+    os.replace(tmp_path, path)
+
+
+class Forest:
+    """Random forest evaluated with vectorized NumPy traversal.
+
+    All (instance, tree) pairs descend one level per step, so a batch costs
+    about max_depth array operations instead of one Python call per tree.
+    """
+
+    def __init__(self, kind, classes, roots, feature, left, right, threshold, value, feature_names=(),
+                 solver_labels=None):
+        self.kind = kind
+        self.classes_ = classes
+        self.roots = roots
+        self.feature = feature
+        self.left = left
+        self.right = right
+        self.threshold = threshold
+        self.value = value
+        self.feature_names = list(feature_names)
+        self.solver_labels = solver_labels
+
+    def _leaves(self, X):
+        # sklearn compares float32 inputs against the stored thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        n_samples, n_trees = len(X), len(self.roots)
+        flat_x = X.ravel()
+        nodes = np.tile(self.roots, n_samples)
+        row_base = np.repeat(np.arange(n_samples) * X.shape[1], n_trees)
+        # Only pairs still at an internal node are advanced each step.
+        pending = np.arange(len(nodes))
+        while len(pending):
+            current = nodes[pending]
+            feature = self.feature[current]
+            inner = feature >= 0
+            pending, current, feature = pending[inner], current[inner], feature[inner]
+            go_left = flat_x[row_base[pending] + feature] <= self.threshold[current]
+            nodes[pending] = np.where(go_left, self.left[current], self.right[current])
+        return nodes.reshape(n_samples, n_trees)
+
+    def _mean_value(self, X):
+        return self.value[self._leaves(X)].mean(axis=1)
+
+    def predict_proba(self, X):
+        return self._mean_value(X)
+
+    def predict(self, X):
+        values = self._mean_value(X)
+        if self.kind == CLASSIFIER:
+            return self.classes_[values.argmax(axis=1)]
+        return values[:, 0]
+
+
+def load_forest(path):
+    """Load a forest written by export_forest; imports nothing from sklearn."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, kind, n_trees, n_nodes, _, n_outputs, meta_len = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != FOREST_MAGIC or version != FOREST_VERSION:
+        raise ValueError(f"'{path}' is not a version {FOREST_VERSION} forest file")
+    offset = HEADER_SIZE
+    meta = json.loads(data[offset:offset + meta_len])
+    offset += meta_len
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    classes = take("<f8", n_outputs if kind == CLASSIFIER else 0)
+    if kind == CLASSIFIER and np.all(classes == np.round(classes)):
+        classes = classes.astype(np.int64)
+    roots = take("<i4", n_trees).astype(np.intp)
+    feature = take("<i4", n_nodes).astype(np.intp)
+    left = take("<i4", n_nodes).astype(np.intp)
+    right = take("<i4", n_nodes).astype(np.intp)
+    threshold = take("<f8", n_nodes)
+    value = take("<f8", n_nodes * n_outputs).reshape(n_nodes, n_outputs)
+    return Forest(kind, classes, roots, feature, left, right, threshold, value, meta.get("feature_names", ()),
+                  meta.get("solver_labels"))
+
+
+def load_predictor(model_path):
+    """A .rf forest when one exists for model_path, else the joblib model."""
+    forest_path = model_path if model_path.endswith(".rf") else forest_path_for(model_path)
+    if os.path.exists(forest_path):
+        return load_forest(forest_path)
+    import warnings
+    import joblib
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    return joblib.load(model_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export a joblib random forest to the flat .rf format.")
+    parser.add_argument("model", nargs="?", default="best_solver_predictor.pkl")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    from features import MODEL_FEATURE_COLS
+    output = args.output or forest_path_for(args.model)
+    model = joblib.load(args.model)
+    export_forest(model, output, MODEL_FEATURE_COLS, getattr(model, "solver_labels", None))
+    print(f"Exported '{args.model}' to '{output}' ({os.path.getsize(output) / 1024:.0f} KB)")
@@ -1,71 +1,190 @@
 # generate_bulk_sudoku_realistic.py
 import os
+import random
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 # Folder to save Sudoku CNFs
 folder = "instances/"
-os.makedirs(folder, exist_ok=True)
 
 # Parameters
 num_instances = 200        # number of Sudoku CNF files
 grid_size = 9              # 9x9 standard Sudoku
 
+# Share of cells given as clues for each difficulty level. With uniqueness
+# checking, cells whose removal would allow a second solution stay given, so
+# the final count can be higher than the target.
+DIFFICULTY_GIVENS = {"easy": 0.55, "medium": 0.45, "hard": 0.35, "expert": 0.28}
+
+
+def var(r, c, v, N):
+    """Variable for "cell (r, c) holds value v"; r, c and v are 1-based."""
+    return (r - 1) * N * N + (c - 1) * N + v
+
+
+def sudoku_template(grid_size):
+    """Clauses of the empty grid as CSR arrays (lits, offsets).
+
+    Every cell holds at least one value, and every row, column and box holds
+    each value at most once. Box pairs that share a row or column are already
+    covered by the row / column constraints and are not repeated.
+    """
+    N = grid_size
+    b = int(round(N ** 0.5))
+    if b * b != N:
+        raise ValueError(f"grid size {N} is not a perfect square")
+    cells = np.arange(N * N).reshape(N, N)
+    values = np.arange(N)
+
+    # Cell constraints: N literals per cell.
+    cell_lits = (cells.reshape(-1, 1) * N + values + 1).ravel()
+
+    # Row, column and box groups of N cells each.
+    boxes = cells.reshape(b, b, b, b).transpose(0, 2, 1, 3).reshape(N, N)
+    i, j = np.triu_indices(N, 1)
+    same_line = ((i // b) == (j // b)) | ((i % b) == (j % b))  # positions inside a box
+
+    pairs = []
+    for groups, keep in ((cells, None), (cells.T, None), (boxes, ~same_line)):
+        first, second = groups[:, i], groups[:, j]
+        if keep is not None:
+            first, second = first[:, keep], second[:, keep]
+        # (groups x pairs x values) binary clauses.
+        lit_a = -(first[:, :, None] * N + values + 1)
+        lit_b = -(second[:, :, None] * N + values + 1)
+        pairs.append(np.stack([lit_a.ravel(), lit_b.ravel()], axis=1))
+    pair_lits = np.concatenate(pairs).ravel()
+
+    lits = np.concatenate([cell_lits, pair_lits]).astype(np.int32)
+    num_cell, num_pairs = N * N, len(pair_lits) // 2
+    offsets = np.concatenate([np.arange(num_cell) * N, num_cell * N + np.arange(num_pairs + 1) * 2]).astype(np.int32)
+    return lits, offsets
+
+
 def sudoku_to_cnf(grid_size):
     """Generate CNF clauses for a standard empty Sudoku puzzle"""
-    clauses = []
-    N = grid_size
-    cells = range(1, N+1)
-
-    # Cell constraints: each cell has at least one value
-    for r in cells:
-        for c in cells:
-            clause = [r*N*N + c*N + v for v in range(1, N+1)]
-            clauses.append(clause)
-
-    # Row constraints: no repeated numbers
-    for r in cells:
-        for v in cells:
-            for c1 in cells:
-                for c2 in cells:
-                    if c1 < c2:
-                        clauses.append([-((r-1)*N*N + (c1-1)*N + v), -((r-1)*N*N + (c2-1)*N + v)])
-
-    # Column constraints: no repeated numbers
-    for c in cells:
-        for v in cells:
-            for r1 in cells:
-                for r2 in cells:
-                    if r1 < r2:
-                        clauses.append([-((r1-1)*N*N + (c-1)*N + v), -((r2-1)*N*N + (c-1)*N + v)])
-
-    # Subgrid constraints: no repeated numbers in 3x3 blocks
-    block_size = int(N**0.5)
-    for br in range(0, N, block_size):
-        for bc in range(0, N, block_size):
-            for v in cells:
-                block_cells = [(r, c) for r in range(br+1, br+block_size+1) for c in range(bc+1, bc+block_size+1)]
-                for i in range(len(block_cells)):
-                    for j in range(i+1, len(block_cells)):
-                        r1, c1 = block_cells[i]
-                        r2, c2 = block_cells[j]
-                        clauses.append([-((r1-1)*N*N + (c1-1)*N + v), -((r2-1)*N*N + (c2-1)*N + v)])
-    return clauses
-
-print(f"📂 Generating {num_instances} Sudoku CNF instances...")
-
-for i in range(1, num_instances + 1):
-    filename = f"sudoku_realistic_{i}.cnf"
-    filepath = os.path.join(folder, filename)
+    lits, offsets = sudoku_template(grid_size)
+    flat, bounds = lits.tolist(), offsets.tolist()
+    return [flat[bounds[k]:bounds[k + 1]] for k in range(len(bounds) - 1)]
 
+
+@functools.lru_cache(maxsize=None)
+def template_text(grid_size):
+    """DIMACS body of the template, rendered once per process: (bytes, clause count)."""
     clauses = sudoku_to_cnf(grid_size)
-    num_vars = grid_size**3
-    num_clauses = len(clauses)
-
-    with open(filepath, 'w') as f:
-        f.write(f"p cnf {num_vars} {num_clauses}\n")
-        for clause in clauses:
-            f.write(" ".join(map(str, clause)) + " 0\n")
-    
-    if i % 20 == 0:
-        print(f"✅ {i}/{num_instances} instances generated")
-
-print(f"🎉 Completed generating {num_instances} Sudoku CNF files in '{folder}'")
+    body = "".join(" ".join(map(str, clause)) + " 0\n" for clause in clauses)
+    return body.encode(), len(clauses)
+
+
+def random_solution(grid_size, rng):
+    """A uniformly shuffled valid grid (rows of 1-based values)."""
+    N = grid_size
+    b = int(round(N ** 0.5))
+
+    def shuffled_lines():
+        bands = rng.sample(range(b), b)
+        return [band * b + line for band in bands for line in rng.sample(range(b), b)]
+
+    rows, cols = shuffled_lines(), shuffled_lines()
+    digits = rng.sample(range(1, N + 1), N)
+    # Base pattern: a valid grid for any N = b * b.
+    return [[digits[(b * (r % b) + r // b + c) % N] for c in cols] for r in rows]
+
+
+_activation = [0]
+
+
+@functools.lru_cache(maxsize=None)
+def _uniqueness_solver(grid_size):
+    from pysat.solvers import Glucose3
+    solver = Glucose3()
+    for clause in sudoku_to_cnf(grid_size):
+        solver.add_clause(clause)
+    _activation[0] = grid_size ** 3
+    return solver
+
+
+def _is_unique(solver, givens, activation):
+    # Every model except the known solution satisfies its blocking clause,
+    # so UNSAT under the givens means the solution is unique.
+    return not solver.solve(assumptions=givens + [activation])
+
+
+def make_puzzle(grid_size, difficulty, rng, unique=False):
+    """Return (solution, givens) where givens lists (r, c, v) clues, 1-based."""
+    N = grid_size
+    solution = random_solution(N, rng)
+    target = int(round(DIFFICULTY_GIVENS[difficulty] * N * N))
+    cells = [(r, c) for r in range(N) for c in range(N)]
+    rng.shuffle(cells)
+    given = set(cells)
+
+    if unique:
+        solver = _uniqueness_solver(N)
+        _activation[0] += 1
+        activation = _activation[0]
+        # Blocking clause for this solution, switched on by the activation literal.
+        solver.add_clause([-var(r + 1, c + 1, solution[r][c], N) for r, c in cells] + [-activation])
+    for r, c in cells:
+        if len(given) <= target:
+            break
+        given.discard((r, c))
+        if unique:
+            assumptions = [var(gr + 1, gc + 1, solution[gr][gc], N) for gr, gc in given]
+            if not _is_unique(solver, assumptions, activation):
+                given.add((r, c))
+    if unique:
+        # Retire this puzzle's blocking clause for good.
+        solver.add_clause([-activation])
+
+    givens = sorted((r + 1, c + 1, solution[r][c]) for r, c in given)
+    return solution, givens
+
+
+def write_puzzle(task):
+    """Write one puzzle instance: template clauses plus one unit clause per given."""
+    index, grid_size, difficulty, seed, unique, out_folder = task
+    rng = random.Random(seed * 1_000_003 + index)
+    _, givens = make_puzzle(grid_size, difficulty, rng, unique)
+    body, num_clauses = template_text(grid_size)
+    units = "".join(f"{var(r, c, v, grid_size)} 0\n" for r, c, v in givens)
+    header = (f"c sudoku {grid_size}x{grid_size} difficulty={difficulty} givens={len(givens)} seed={seed}\n"
+              f"p cnf {grid_size ** 3} {num_clauses + len(givens)}\n")
+    filename = f"sudoku{grid_size}_{difficulty}_{index}.cnf"
+    # One buffered write per file.
+    with open(os.path.join(out_folder, filename), "wb", buffering=1 << 20) as f:
+        f.write(header.encode() + body + units.encode())
+    return filename, len(givens)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Sudoku puzzle CNF instances.")
+    parser.add_argument("--count", type=int, default=num_instances)
+    parser.add_argument("--size", type=int, default=grid_size, choices=(4, 9, 16, 25))
+    parser.add_argument("--difficulty", default="mixed", choices=sorted(DIFFICULTY_GIVENS) + ["mixed"])
+    parser.add_argument("--unique", choices=("auto", "yes", "no"), default="auto",
+                        help="keep removing clues only while the solution stays unique (auto: grids up to 9x9)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", default=folder)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    os.makedirs(args.folder, exist_ok=True)
+    unique = args.unique == "yes" or (args.unique == "auto" and args.size <= 9)
+    levels = sorted(DIFFICULTY_GIVENS, key=DIFFICULTY_GIVENS.get, reverse=True)
+    tasks = [
+        (i, args.size, levels[(i - 1) % len(levels)] if args.difficulty == "mixed" else args.difficulty,
+         args.seed, unique, args.folder)
+        for i in range(1, args.count + 1)
+    ]
+    print(f"📂 Generating {args.count} {args.size}x{args.size} Sudoku CNF instances...")
+
+    workers = args.workers or min(8, os.cpu_count() or 4)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, _ in enumerate(executor.map(write_puzzle, tasks, chunksize=16), 1):
+            if done % 20 == 0:
+                print(f"✅ {done}/{args.count} instances generated")
+
+    print(f"🎉 Completed generating {args.count} Sudoku CNF files in '{args.folder}'")
@@ -11,8 +11,9 @@ def generate_random_3sat(num_vars, num_clauses, filename):
             lits = [str(v * random.choice([-1, 1])) for v in vars_]
             f.write(" ".join(lits) + " 0\n")
 
-os.makedirs("instances", exist_ok=True)
-for i in range(1, 11):
-    fname = os.path.join("instances", f"random3sat{i}.cnf")
-    generate_random_3sat(num_vars=50, num_clauses=200, filename=fname)
-    print("Wrote", fname)
+if __name__ == "__main__":
+    os.makedirs("instances", exist_ok=True)
+    for i in range(1, 11):
+        fname = os.path.join("instances", f"random3sat{i}.cnf")
+        generate_random_3sat(num_vars=50, num_clauses=200, filename=fname)
+        print("Wrote", fname)
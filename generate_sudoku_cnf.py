@@ -9,7 +9,8 @@ def generate_sudoku_cnf(filename):
             clause = [str(random.randint(1, num_vars) * random.choice([-1, 1])) for _ in range(3)]
             f.write(" ".join(clause) + " 0\n")
 
-for i in range(1, 11):
-    fname = f"sudoku_{i}.cnf"
-    generate_sudoku_cnf(fname)
-    print(f"Generated {fname}")
+if __name__ == "__main__":
+    for i in range(1, 11):
+        fname = f"sudoku_{i}.cnf"
+        generate_sudoku_cnf(fname)
+        print(f"Generated {fname}")
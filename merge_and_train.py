@@ -1,21 +1,59 @@
+import argparse
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 # Using imblearn for standardized oversampling
 from imblearn.over_sampling import RandomOverSampler
 import joblib 
+from forest_model import export_forest, forest_path_for
+from training import (PAR_FACTOR, RUNTIME_FLOOR, CHUNK_ROWS, TRAINING_METRICS, UPDATE_TREES, read_results,
+                      par10_runtime, portfolio_time, train_selector, update_selector)
 
 # --- Configuration ---
 DPLL_SOLVER_NAME = "DPLL (Class 0)"
 WALKSAT_SOLVER_NAME = "WalkSAT (Class 1)"
 
+parser = argparse.ArgumentParser(description="Merge solver results and train the solver selector.")
+parser.add_argument("--cost-sensitive", action="store_true",
+                    help="also train per-solver log-runtime regressors and compare total portfolio time")
+parser.add_argument("--timeout", type=float, default=5, help="cutoff in seconds used for PAR10 penalties")
+parser.add_argument("--results", nargs="+", metavar="CSV",
+                    help="train an N-way selector over every solver in these results files instead")
+parser.add_argument("--update", nargs="+", metavar="CSV",
+                    help="fold a new batch of results into the saved N-way selector")
+parser.add_argument("--refit", action="store_true", help="with --update: refit on the whole table instead of adding trees")
+parser.add_argument("--add-trees", type=int, default=UPDATE_TREES, help="trees grown per --update batch")
+parser.add_argument("--search", action="store_true",
+                    help="with --results: choose the forest's hyperparameters by cross-validated search")
+parser.add_argument("--folds", type=int, default=5)
+parser.add_argument("--search-iter", type=int, default=20, help="settings sampled by --search")
+parser.add_argument("--jobs", type=int, default=-1, help="processes / threads for search and fitting (-1 = all cores)")
+parser.add_argument("--structural-features", metavar="FOLDER",
+                    help="with --results / --update: train on features.py's features of the instances in FOLDER")
+parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="result rows read at a time")
+parser.add_argument("--metrics", default=TRAINING_METRICS, help="training time and memory report (JSON)")
+args = parser.parse_args()
+
+
+if args.update:
+    update_selector(args.update, args.timeout, args.chunksize, args.add_trees, args.refit, args.jobs, args.metrics,
+                    feature_folder=args.structural_features)
+    exit()
+if args.results:
+    train_selector(args.results, args.timeout, args.chunksize, args.search, args.folds, args.search_iter,
+                   args.jobs, args.metrics, args.structural_features)
+    exit()
+
+# --- Default DPLL vs WalkSAT classifier ---
+# Merges both results files in memory; large histories go through --results / --update.
 print("Loading solver results...")
 
 # --- Load both solver result files ---
 try:
-    dpll_df = pd.read_csv("results_dpll.csv")
-    walksat_df = pd.read_csv("results_walksat.csv")
+    dpll_df = read_results("results_dpll.csv")
+    walksat_df = read_results("results_walksat.csv")
 except FileNotFoundError:
     print("Error: Ensure 'results_dpll.csv' and 'results_walksat.csv' are present.")
     exit()
@@ -50,22 +88,14 @@ merged["is_sudoku"] = merged["instance"].str.contains("sudoku", case=False, na=F
 merged["is_random3sat"] = merged["instance"].str.contains("random", case=False, na=False).astype(int)
 
 
-def get_best_solver(row):
- 
-    runtime_dpll = row["runtime_seconds_dpll"]
-    runtime_walksat = row["runtime_seconds_walksat"]
-    
-
-    if runtime_dpll < runtime_walksat - 1e-6:
-        return 0 
-  
-    elif runtime_walksat < runtime_dpll - 1e-6:
-        return 1
-   
-    else:
-        return 0 
-
-merged["best_solver_actual"] = merged.apply(get_best_solver, axis=1)
+# WalkSAT (1) is best only when it found a model, and either DPLL did not
+# decide the instance or WalkSAT was strictly faster; ties go to DPLL (0).
+# Local search UNKNOWN (and "UNSAT" in older results files) means it ran out
+# of budget.
+walksat_solved = merged["result_walksat"].eq("SAT")
+dpll_decided = merged["result_dpll"].isin(("SAT", "UNSAT"))
+walksat_faster = merged["runtime_seconds_walksat"] < merged["runtime_seconds_dpll"] - 1e-6
+merged["best_solver_actual"] = (walksat_solved & (~dpll_decided | walksat_faster)).astype(int)
 
 
 merged = merged.dropna(subset=["num_vars_dpll"]) 
@@ -100,12 +130,17 @@ X_train, X_test, y_train, y_test = train_test_split(
 )
 
 
-model = RandomForestClassifier(n_estimators=150, random_state=42)
+model = RandomForestClassifier(n_estimators=150, random_state=42, n_jobs=args.jobs)
 model.fit(X_train, y_train)
+# The saved model predicts one instance at a time; no worker pool for that.
+model.set_params(n_jobs=None)
 
 
 joblib.dump(model, "best_solver_predictor.pkl")
 print("Trained model saved as 'best_solver_predictor.pkl'")
+# Flat NumPy copy used by the selector and portfolio (no sklearn at inference).
+export_forest(model, forest_path_for("best_solver_predictor.pkl"), feature_cols)
+print("Forest exported as 'best_solver_predictor.rf'")
 
 
 
@@ -140,5 +175,58 @@ importances = pd.Series(model.feature_importances_, index=feature_cols).sort_val
 print(importances.to_string())
 
 
+
+if args.cost_sensitive:
+    print("\n" + "="*50)
+    print(" COST-SENSITIVE SELECTION (log-runtime regression, PAR10)")
+    print("="*50)
+    penalty = PAR_FACTOR * args.timeout
+    merged["par10_dpll"] = par10_runtime(merged, "dpll", ("SAT", "UNSAT"), args.timeout)
+    merged["par10_walksat"] = par10_runtime(merged, "walksat", ("SAT",), args.timeout)
+    cost_cols = ["par10_dpll", "par10_walksat"]
+
+    # Split by instance (before any oversampling) so every selector is scored
+    # on the same unseen instances.
+    train_idx, test_idx = train_test_split(merged.index, test_size=0.2, random_state=42, stratify=y)
+    X_tr, X_te = X.loc[train_idx], X.loc[test_idx]
+
+    regressors = {}
+    for col in cost_cols:
+        reg = RandomForestRegressor(n_estimators=150, random_state=42, n_jobs=args.jobs)
+        reg.fit(X_tr, np.log(np.maximum(merged.loc[train_idx, col], RUNTIME_FLOOR)))
+        regressors[col] = reg
+    predicted_log_runtime = np.column_stack([regressors[col].predict(X_te) for col in cost_cols])
+
+    # The current recipe (oversampled classifier), retrained on the same instances.
+    X_bal, y_bal = RandomOverSampler(random_state=42).fit_resample(X_tr, y.loc[train_idx])
+    baseline = RandomForestClassifier(n_estimators=150, random_state=42, n_jobs=args.jobs).fit(X_bal, y_bal)
+
+    costs = merged.loc[test_idx, cost_cols].to_numpy()
+    single_best = int(merged.loc[train_idx, cost_cols].sum().to_numpy().argmin())
+    selectors = {
+        "Virtual best solver": costs.min(axis=1),
+        f"Single best ({['DPLL', 'WalkSAT'][single_best]})": costs[:, single_best],
+        "Classifier (accuracy)": portfolio_time(costs, baseline.predict(X_te)),
+        "Runtime regression": portfolio_time(costs, predicted_log_runtime.argmin(axis=1)),
+    }
+    vbs_total = selectors["Virtual best solver"].sum()
+    print(f"{len(test_idx)} held-out instances, cutoff {args.timeout}s, failures charged {penalty}s\n")
+    print(f"{'Selector':28s} {'total s':>10s} {'mean s':>9s} {'solved':>7s} {'x VBS':>7s}")
+    for name, times in selectors.items():
+        print(f"{name:28s} {times.sum():10.3f} {times.mean():9.4f} "
+              f"{int((times < penalty).sum()):7d} {times.sum() / max(vbs_total, 1e-12):7.2f}")
+
+    joblib.dump({
+        "feature_cols": feature_cols,
+        "solvers": ["DPLL", "WalkSAT"],
+        "timeout": args.timeout,
+        "regressors": [regressors[col] for col in cost_cols],
+    }, "runtime_regressors.pkl")
+    for solver, col in zip(["dpll", "walksat"], cost_cols):
+        export_forest(regressors[col], f"runtime_regressor_{solver}.rf", feature_cols)
+    print("\nRuntime regressors saved as 'runtime_regressors.pkl' and runtime_regressor_<solver>.rf"
+          " (pick the argmin of predicted log-runtime)")
+
+
 merged.to_csv("merged_results_enhanced.csv", index=False)
 print("\n Final dataset saved as 'merged_results_enhanced.csv'")
\ No newline at end of file
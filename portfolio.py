@@ -0,0 +1,269 @@
+# portfolio.py
+import os
+import csv
+import time
+import queue
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from cnf_loader import load_clauses
+from batch_utils import imap_bounded
+from results_sink import ResultsSink
+from results_store import ResultsStore, DEFAULT_STORE, RunPlan
+from run_dpll import solve_clauses
+from run_walksat import SOLVERS, solution_result
+
+RESULT_SCHEMA = [
+    ("instance", "string"),
+    ("solver", "string"),
+    ("num_vars", "int64"),
+    ("num_clauses", "int64"),
+    ("result", "string"),
+    ("runtime_seconds", "float64"),
+    ("winner", "string"),
+    ("overhead_seconds", "float64"),
+    ("dpll_result", "string"),
+    ("dpll_seconds", "float64"),
+    ("walksat_result", "string"),
+    ("walksat_seconds", "float64"),
+    ("predicted_solver", "string"),
+    ("predicted_seconds", "float64"),
+    ("vbs_solver", "string"),
+    ("vbs_seconds", "float64"),
+    ("instance_hash", "string"),
+    ("alias_of", "string"),
+]
+
+DEFAULT_WALKSAT = "WalkSAT_Incremental"
+# Wall time allowed past the DPLL timeout before both racers are killed.
+RACE_GRACE = 1.0
+# Outcome of a racer that was still running when the race was decided.
+CANCELLED = "CANCELLED"
+
+
+def is_definitive(solver, result):
+    """SAT from anyone, UNSAT only from DPLL: WalkSAT's UNSAT means it gave up."""
+    return result == "SAT" or (solver == "DPLL" and result == "UNSAT")
+
+
+def _dpll_racer(clauses, timeout, answers):
+    result, runtime = solve_clauses(clauses, timeout)
+    answers.put(("DPLL", result, runtime))
+
+
+def _walksat_racer(solver, clauses, num_vars, answers):
+    start = time.perf_counter()
+    result = solution_result(clauses, SOLVERS[solver](clauses, num_vars))
+    answers.put((solver, result, time.perf_counter() - start))
+
+
+def _context():
+    # Forked racers inherit the parsed clauses and the imported solvers, so
+    # starting them costs a few milliseconds instead of a pickle and import.
+    return mp.get_context("fork" if "fork" in mp.get_all_start_methods() else None)
+
+
+def race(clauses, num_vars, timeout, walksat=DEFAULT_WALKSAT):
+    """Run DPLL and a WalkSAT engine on the same formula; first definitive answer wins.
+
+    Returns (winner, result, race_seconds, outcomes) where outcomes maps each
+    racer to its (result, runtime_seconds). The loser is killed as soon as the
+    race is decided and reported as CANCELLED. Without a definitive answer
+    winner is "" and result is DPLL's (TIMEOUT) or UNKNOWN.
+    """
+    ctx = _context()
+    answers = ctx.Queue()
+    racers = {
+        "DPLL": ctx.Process(target=_dpll_racer, args=(clauses, timeout, answers), daemon=True),
+        walksat: ctx.Process(target=_walksat_racer, args=(walksat, clauses, num_vars, answers), daemon=True),
+    }
+    start = time.perf_counter()
+    for process in racers.values():
+        process.start()
+
+    deadline = start + timeout + RACE_GRACE if timeout else None
+    outcomes = {}
+    winner = ""
+    while len(outcomes) < len(racers):
+        remaining = deadline - time.perf_counter() if deadline else None
+        try:
+            solver, result, runtime = answers.get(timeout=max(remaining, 0) if deadline else None)
+        except queue.Empty:
+            break
+        outcomes[solver] = (result, runtime)
+        if is_definitive(solver, result):
+            winner = solver
+            break
+    race_seconds = time.perf_counter() - start
+
+    for solver, process in racers.items():
+        if process.is_alive():
+            process.kill()
+        process.join()
+        outcomes.setdefault(solver, (CANCELLED if winner else "TIMEOUT", None))
+    answers.close()
+
+    if winner:
+        result = outcomes[winner][0]
+    else:
+        result = outcomes["DPLL"][0] if outcomes["DPLL"][1] is not None else "TIMEOUT"
+    return winner, result, race_seconds, outcomes
+
+
+def race_instance(file_info):
+    idx, file, folder, timeout, walksat, formula = file_info
+    path = os.path.join(folder, file)
+
+    row = {
+        "instance": file,
+        "solver": "Portfolio",
+        "num_vars": 0,
+        "num_clauses": 0,
+        "result": "UNKNOWN",
+        "runtime_seconds": None,
+    }
+    try:
+        clauses, num_vars = load_clauses(path, formula=formula)
+        row["num_vars"] = num_vars
+        row["num_clauses"] = len(clauses)
+
+        winner, result, race_seconds, outcomes = race(clauses, num_vars, timeout, walksat)
+        dpll_result, dpll_seconds = outcomes["DPLL"]
+        walksat_result, walksat_seconds = outcomes[walksat]
+        row.update({
+            "result": result,
+            "runtime_seconds": round(race_seconds, 4),
+            "winner": winner,
+            # Process start-up and result hand-off on top of the winner's own solve time.
+            "overhead_seconds": round(race_seconds - outcomes[winner][1], 4) if winner else None,
+            "dpll_result": dpll_result,
+            "dpll_seconds": round(dpll_seconds, 4) if dpll_seconds is not None else None,
+            "walksat_result": walksat_result,
+            "walksat_seconds": round(walksat_seconds, 4) if walksat_seconds is not None else None,
+        })
+    except Exception as e:
+        row["result"] = "ERROR"
+        print(f" Error on {file}: {e}")
+
+    print(f"[{idx}] {file} -> {row['result']} by {row.get('winner') or '-'} ({row['runtime_seconds']}s)")
+    return row
+
+
+# --- Comparison against the predictor and the virtual best solver ---
+
+def _read_reference(csv_path):
+    """instance -> (solver, result, runtime) from a runner's results CSV."""
+    if not csv_path or not os.path.exists(csv_path):
+        return {}
+    with open(csv_path, newline="") as fh:
+        return {
+            row["instance"]: (row["solver"], row["result"], float(row["runtime_seconds"]))
+            for row in csv.DictReader(fh)
+            if row.get("runtime_seconds")
+        }
+
+
+class RaceComparison:
+    """Annotate race rows with the predictor's choice and the virtual best solver.
+
+    Reference runtimes come from the standalone runners' results CSVs; the
+    predicted solver is what best_solver_predictor.pkl would have routed the
+    instance to, and predicted_seconds is that solver's reference runtime.
+    """
+
+    def __init__(self, dpll_csv, walksat_csv, model_path=None, folder="instances/"):
+        self.reference = {"DPLL": _read_reference(dpll_csv), "WalkSAT": _read_reference(walksat_csv)}
+        self.model = None
+        if model_path and os.path.exists(model_path):
+            from forest_model import load_predictor
+            self.model = load_predictor(model_path)
+        self.folder = folder
+        self.totals = {"race": 0.0, "predicted": 0.0, "vbs": 0.0}
+        self.compared = 0
+        self.agree = 0
+        self.wins = {}
+
+    def _predict(self, row):
+        from features import predictor_features
+        x = [predictor_features(self.model, row["instance"], os.path.join(self.folder, row["instance"]))]
+        return "DPLL" if int(self.model.predict(x)[0]) == 0 else "WalkSAT"
+
+    def annotate(self, row):
+        name = row["instance"]
+        runs = {}
+        for family, reference in self.reference.items():
+            if name in reference:
+                solver, result, runtime = reference[name]
+                runs[family] = (result, runtime)
+        definitive = {family: runtime for family, (result, runtime) in runs.items()
+                      if is_definitive(family, result)}
+        if definitive:
+            row["vbs_solver"] = min(definitive, key=definitive.get)
+            row["vbs_seconds"] = definitive[row["vbs_solver"]]
+        if self.model is not None and row.get("num_vars"):
+            row["predicted_solver"] = self._predict(row)
+            if row["predicted_solver"] in runs:
+                row["predicted_seconds"] = runs[row["predicted_solver"]][1]
+
+        if row.get("winner"):
+            family = "DPLL" if row["winner"] == "DPLL" else "WalkSAT"
+            self.wins[family] = self.wins.get(family, 0) + 1
+            if row.get("predicted_solver"):
+                self.agree += family == row["predicted_solver"]
+        if row.get("runtime_seconds") is not None and row.get("vbs_seconds") is not None \
+                and row.get("predicted_seconds") is not None:
+            self.compared += 1
+            self.totals["race"] += row["runtime_seconds"]
+            self.totals["predicted"] += row["predicted_seconds"]
+            self.totals["vbs"] += row["vbs_seconds"]
+        return row
+
+    def summary(self):
+        lines = [" Races won: " + ", ".join(f"{k} {v}" for k, v in sorted(self.wins.items()))]
+        if self.model is not None:
+            decided = sum(self.wins.values())
+            lines.append(f" Winner matched the predictor on {self.agree}/{decided} decided races")
+        if self.compared:
+            lines.append(
+                f" Total time over {self.compared} instances: race {self.totals['race']:.2f}s, "
+                f"predicted solver {self.totals['predicted']:.2f}s, VBS {self.totals['vbs']:.2f}s"
+            )
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Race DPLL against WalkSAT on every instance.")
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--output", default="results_portfolio.csv")
+    parser.add_argument("--timeout", type=float, default=5, help="DPLL wall-clock limit per instance (seconds)")
+    parser.add_argument("--walksat", default=DEFAULT_WALKSAT, choices=sorted(SOLVERS))
+    parser.add_argument("--races", type=int, help="concurrent races (default: half the cores)")
+    parser.add_argument("--model", default="best_solver_predictor.pkl")
+    parser.add_argument("--dpll-results", default="results_dpll.csv")
+    parser.add_argument("--walksat-results", default="results_walksat.csv")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="persistent results store used to resume runs")
+    parser.add_argument("--fresh", action="store_true", help="re-race instances already in the store")
+    args = parser.parse_args()
+
+    folder = args.folder
+    params = {"timeout": args.timeout, "walksat": args.walksat}
+    store = ResultsStore(args.store)
+    # Each race occupies two cores, one per solver.
+    max_workers = args.races or max(1, min(8, os.cpu_count() or 4) // 2)
+    comparison = RaceComparison(args.dpll_results, args.walksat_results, args.model, folder)
+
+    with ResultsSink(args.output, RESULT_SCHEMA, truncate=True,
+                     store_path=args.store, store_params=params) as sink:
+        plan = RunPlan(folder, store, "Portfolio", params, sink, fresh=args.fresh)
+        file_info_iter = (
+            (i+1, name, folder, args.timeout, args.walksat, formula)
+            for i, (name, formula) in enumerate(plan)
+        )
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for row in imap_bounded(executor, race_instance, file_info_iter):
+                plan.complete(comparison.annotate(row))
+    store.close()
+
+    print(f"\n {plan.aliases} duplicate formulas found")
+    print(comparison.summary())
+    print(f"\n Portfolio results saved to '{args.output}'")
@@ -0,0 +1,343 @@
+# preprocess.py
+import os
+import json
+import time
+import argparse
+import numpy as np
+from cnf_loader import iter_instances, load_cnf, to_clause_lists, formula_fingerprint
+
+PREPROCESS_VERSION = 2
+PREPROCESS_CACHE = "preprocess_cache"
+
+# Bounded variable elimination only tries variables with at most this many
+# occurrences, and only eliminates when the formula does not grow.
+BVE_MAX_OCCURRENCES = 16
+BVE_MAX_RESOLVENT_LEN = 20
+
+# Extra result columns for runners that preprocess.
+PREPROCESS_SCHEMA = [
+    ("simplified_vars", "int64"),
+    ("simplified_clauses", "int64"),
+]
+
+
+def add_preprocess_arguments(parser):
+    parser.add_argument("--preprocess", choices=("none", "basic", "bve"), default="none",
+                        help="simplify each instance before solving (bve adds bounded variable elimination)")
+    parser.add_argument("--preprocess-cache", default=PREPROCESS_CACHE)
+
+
+def preprocess_options(args):
+    """Options for preprocess_instance from the CLI, or None when disabled."""
+    if args.preprocess == "none":
+        return None
+    return {"bve": args.preprocess == "bve", "cache_dir": args.preprocess_cache}
+
+
+class Preprocessed:
+    """Result of preprocess(): the simplified formula plus reconstruction data.
+
+    clauses keeps the original variable numbering (num_vars is unchanged;
+    removed variables simply no longer occur). status is "UNSAT" when a
+    conflict was derived, "SAT" when no clauses remain, else None. stack holds
+    (witness literal, clause) pairs for extend_model.
+    """
+
+    def __init__(self, clauses, num_vars, status, stack, stats):
+        self.clauses = clauses
+        self.num_vars = num_vars
+        self.status = status
+        self.stack = stack
+        self.stats = stats
+
+    def extend_model(self, assignment):
+        return extend_model(assignment, self.stack)
+
+    def columns(self):
+        """PREPROCESS_SCHEMA values for a result row."""
+        return {"simplified_vars": self.stats["vars_after"], "simplified_clauses": self.stats["clauses_after"]}
+
+
+class _Simplifier:
+    def __init__(self, num_vars, stats, max_work=None):
+        self.num_vars = num_vars
+        self.stats = stats
+        # Clause comparisons made by subsume and eliminate, capped by max_work.
+        self.work = 0
+        self.max_work = max_work
+        self.clauses = {}
+        self.occ = {}
+        self.next_id = 0
+        self.units = []
+        self.stack = []
+        self.conflict = False
+        # Clauses added since the last subsumption pass; only these can
+        # subsume clauses that survived the previous pass.
+        self.touched = set()
+
+    def add(self, clause):
+        """Add a normalized clause (frozenset); returns its id or None."""
+        if not clause:
+            self.conflict = True
+            return None
+        cid = self.next_id
+        self.next_id += 1
+        self.clauses[cid] = clause
+        self.touched.add(cid)
+        for lit in clause:
+            self.occ.setdefault(lit, set()).add(cid)
+        if len(clause) == 1:
+            self.units.append(next(iter(clause)))
+        return cid
+
+    def remove(self, cid):
+        clause = self.clauses.pop(cid)
+        for lit in clause:
+            self.occ[lit].discard(cid)
+        return clause
+
+    def occurrences(self, lit):
+        return len(self.occ.get(lit, ()))
+
+    def out_of_work(self):
+        return self.max_work is not None and self.work >= self.max_work
+
+    def assign(self, lit):
+        """Make lit true: drop satisfied clauses, shorten clauses with -lit."""
+        self.stack.append((lit, (lit,)))
+        for cid in list(self.occ.get(lit, ())):
+            self.remove(cid)
+        for cid in list(self.occ.get(-lit, ())):
+            clause = self.remove(cid) - {-lit}
+            self.add(clause)
+
+    def propagate(self):
+        while self.units and not self.conflict:
+            lit = self.units.pop()
+            if not self.occ.get(lit) and not self.occ.get(-lit):
+                continue  # already assigned
+            if any(len(self.clauses[cid]) == 1 for cid in self.occ.get(-lit, ())):
+                self.conflict = True
+                return
+            self.stats["units"] += 1
+            self.assign(lit)
+
+    def pure_literals(self):
+        found = 0
+        for var in range(1, self.num_vars + 1):
+            pos, neg = self.occurrences(var), self.occurrences(-var)
+            if (pos == 0) != (neg == 0):
+                lit = var if pos else -var
+                self.stack.append((lit, (lit,)))
+                for cid in list(self.occ[lit]):
+                    self.remove(cid)
+                found += 1
+        self.stats["pure_literals"] += found
+        return found
+
+    def subsume(self):
+        removed = 0
+        clauses = self.clauses
+        candidates = sorted((cid for cid in self.touched if cid in clauses), key=lambda c: len(clauses[c]))
+        self.touched = set()
+        for i, cid in enumerate(candidates):
+            if self.out_of_work():
+                # Unchecked candidates stay queued for a later pass.
+                self.touched.update(candidates[i:])
+                break
+            clause = clauses.get(cid)
+            if clause is None:
+                continue
+            size = len(clause)
+            pivot = min(clause, key=self.occurrences)
+            others = [o for o in self.occ[pivot] if o != cid and len(clauses[o]) >= size]
+            self.work += len(others)
+            for other in others:
+                if clause <= clauses[other]:
+                    self.remove(other)
+                    removed += 1
+        self.stats["subsumed"] += removed
+        return removed
+
+    def eliminate(self):
+        eliminated = 0
+        order = sorted(range(1, self.num_vars + 1), key=lambda v: self.occurrences(v) * self.occurrences(-v))
+        for var in order:
+            if self.conflict or self.out_of_work():
+                break
+            pos, neg = list(self.occ.get(var, ())), list(self.occ.get(-var, ()))
+            if not pos or not neg or len(pos) + len(neg) > BVE_MAX_OCCURRENCES:
+                continue
+            self.work += len(pos) * len(neg)
+            resolvents = set()
+            too_big = False
+            for p in pos:
+                for n in neg:
+                    resolvent = (self.clauses[p] - {var}) | (self.clauses[n] - {-var})
+                    if any(-lit in resolvent for lit in resolvent):
+                        continue
+                    if len(resolvent) > BVE_MAX_RESOLVENT_LEN:
+                        too_big = True
+                        break
+                    resolvents.add(frozenset(resolvent))
+                if too_big or len(resolvents) > len(pos) + len(neg):
+                    break
+            if too_big or len(resolvents) > len(pos) + len(neg):
+                continue
+            for cid in pos:
+                self.stack.append((var, tuple(self.remove(cid))))
+            for cid in neg:
+                self.stack.append((-var, tuple(self.remove(cid))))
+            for resolvent in resolvents:
+                self.add(resolvent)
+            eliminated += 1
+            self.propagate()
+        self.stats["eliminated_vars"] += eliminated
+        return eliminated
+
+
+def preprocess(clauses, num_vars, bve=False, max_work=None):
+    """Simplify a clause list; returns a Preprocessed.
+
+    Removes duplicate literals, tautologies and duplicate clauses, then runs
+    unit propagation, pure-literal elimination and subsumption to a fixpoint,
+    plus bounded variable elimination with bve. max_work (clause comparisons)
+    stops the expensive passes early, at the same point on every machine; the
+    result is still equivalent.
+    """
+    start = time.perf_counter()
+    stats = {"clauses_before": len(clauses), "duplicate_literals": 0, "tautologies": 0,
+             "duplicate_clauses": 0, "units": 0, "pure_literals": 0, "subsumed": 0,
+             "eliminated_vars": 0}
+    simplifier = _Simplifier(num_vars, stats, max_work)
+
+    seen = set()
+    for clause in clauses:
+        lits = frozenset(clause)
+        stats["duplicate_literals"] += len(clause) - len(lits)
+        if any(-lit in lits for lit in lits):
+            stats["tautologies"] += 1
+            continue
+        if lits in seen:
+            stats["duplicate_clauses"] += 1
+            continue
+        seen.add(lits)
+        simplifier.add(lits)
+
+    while not simplifier.conflict:
+        before = len(simplifier.clauses)
+        simplifier.propagate()
+        if simplifier.conflict:
+            break
+        changed = simplifier.pure_literals()
+        changed += simplifier.subsume()
+        if bve and not simplifier.conflict:
+            changed += simplifier.eliminate()
+        if not changed and len(simplifier.clauses) == before and not simplifier.units:
+            break
+        if simplifier.out_of_work():
+            simplifier.propagate()
+            break
+
+    if simplifier.conflict:
+        status, result = "UNSAT", [[]]
+    else:
+        result = [sorted(clause, key=abs) for clause in simplifier.clauses.values()]
+        status = "SAT" if not result else None
+    used = {abs(lit) for clause in result for lit in clause}
+    stats.update({
+        "clauses_after": len(result) if status != "UNSAT" else 0,
+        "vars_after": len(used),
+        "seconds": round(time.perf_counter() - start, 6),
+    })
+    return Preprocessed(result, num_vars, status, simplifier.stack, stats)
+
+
+def extend_model(assignment, stack):
+    """Extend a model of the simplified formula to the original variables.
+
+    assignment is a bool list indexed by variable (index 0 unused); variables
+    that no longer occur may hold any value. The reconstruction stack is
+    replayed newest first: whenever a removed clause is falsified, its witness
+    literal is made true.
+    """
+    model = list(assignment)
+    for witness, clause in reversed(stack):
+        if not any(model[lit] if lit > 0 else not model[-lit] for lit in clause):
+            model[abs(witness)] = witness > 0
+    return model
+
+
+def model_from_literals(literals, num_vars):
+    """Bool assignment list from a list of true literals (pysat's get_model())."""
+    model = [False] * (num_vars + 1)
+    for lit in literals or ():
+        if abs(lit) <= num_vars:
+            model[abs(lit)] = lit > 0
+    return model
+
+
+# --- Per-instance cache ---
+
+def _pack_clauses(clauses):
+    lengths = [len(c) for c in clauses]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int32)
+    lits = np.array([lit for c in clauses for lit in c], dtype=np.int32)
+    return lits, offsets
+
+
+def preprocess_instance(path, formula=None, bve=False, cache_dir=PREPROCESS_CACHE):
+    """Preprocess one instance, cached by formula fingerprint in cache_dir.
+
+    Both runners (and the feature extractor) call this, so an instance is
+    simplified once no matter how many solvers run on it.
+    """
+    lits, offsets, num_vars = formula if formula is not None else load_cnf(path)
+    cache_file = None
+    if cache_dir:
+        fingerprint = formula_fingerprint(lits, offsets, num_vars)
+        cache_file = os.path.join(cache_dir, f"{fingerprint}{'-bve' if bve else ''}.npz")
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta["version"] == PREPROCESS_VERSION:
+                    clauses = to_clause_lists(data["lits"], data["offsets"])
+                    stack_clauses = to_clause_lists(data["stack_lits"], data["stack_offsets"])
+                    stack = list(zip(data["witnesses"].tolist(), stack_clauses))
+                    return Preprocessed(clauses, num_vars, meta["status"], stack, meta["stats"])
+
+    pre = preprocess(to_clause_lists(lits, offsets), num_vars, bve=bve)
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        # An UNSAT result is stored as its single empty clause, as returned.
+        out_lits, out_offsets = _pack_clauses(pre.clauses)
+        stack_lits, stack_offsets = _pack_clauses([clause for _, clause in pre.stack])
+        meta = {"version": PREPROCESS_VERSION, "status": pre.status, "stats": pre.stats}
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file, lits=out_lits, offsets=out_offsets,
+                 witnesses=np.array([w for w, _ in pre.stack], dtype=np.int32),
+                 stack_lits=stack_lits, stack_offsets=stack_offsets, meta=json.dumps(meta))
+        os.replace(tmp_file, cache_file)
+    return pre
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess every instance and report the reductions.")
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--bve", action="store_true", help="also run bounded variable elimination")
+    parser.add_argument("--cache-dir", default=PREPROCESS_CACHE)
+    args = parser.parse_args()
+
+    totals = {}
+    count = 0
+    for name, formula in iter_instances(args.folder):
+        pre = preprocess_instance(os.path.join(args.folder, name), formula, args.bve, args.cache_dir)
+        count += 1
+        for key, value in pre.stats.items():
+            totals[key] = totals.get(key, 0) + value
+        if pre.status:
+            totals[f"decided_{pre.status}"] = totals.get(f"decided_{pre.status}", 0) + 1
+
+    print(f"Preprocessed {count} instances:")
+    for key, value in totals.items():
+        print(f"  {key:20s} {value:12.3f}" if isinstance(value, float) else f"  {key:20s} {value:12d}")
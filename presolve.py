@@ -0,0 +1,216 @@
+# presolve.py
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+DEFAULT_CONFIG = "presolve.json"
+DEFAULT_ENGINE = "WalkSAT_Optimized"
+# Selection cost an instance pays when presolving fails: feature extraction
+# plus one prediction (selector_service reports it as selection_overhead).
+SELECTION_OVERHEAD_MS = 1.0
+# Budgets tried by the tuner per stage.
+MAX_CANDIDATES = 64
+# Instances sampled to measure flips/second when the CSV has no flips column.
+CALIBRATION_SAMPLE = 10
+# The Glucose burst is killed after SLACK times the seconds its conflict
+# budget takes at the median conflict rate: Glucose only checks the budget
+# at restarts, which can be thousands of conflicts apart.
+GLUCOSE_SLACK = 2.0
+
+
+class Presolver:
+    """Cheap first pass of the selection pipeline.
+
+    A single local-search try of max_flips flips, then (optionally) Glucose
+    with a conflict budget. The Glucose burst runs in a child that is killed
+    after glucose_seconds. Instances either stage decides never reach
+    feature extraction or the predictor. A zero budget disables its stage.
+    """
+
+    def __init__(self, engine=DEFAULT_ENGINE, max_flips=0, conflicts=0, glucose_seconds=0.0):
+        self.engine = engine
+        self.max_flips = int(max_flips)
+        self.conflicts = int(conflicts)
+        self.glucose_seconds = float(glucose_seconds)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CONFIG):
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.get("engine", DEFAULT_ENGINE), config.get("max_flips", 0), config.get("conflicts", 0),
+                   config.get("glucose_seconds", 0.0))
+
+    def run(self, clauses, num_vars, timeout=None):
+        """(result, solver) when a stage decides the instance, else (None, None).
+
+        The Glucose burst is also cut at timeout. Without either limit (a
+        config from before glucose_seconds) it is skipped.
+        """
+        if self.max_flips:
+            from run_walksat import SOLVERS, solution_result
+            assignment = SOLVERS[self.engine](clauses, num_vars, max_flips=self.max_flips, max_tries=1)
+            if solution_result(clauses, assignment) == "SAT":
+                return "SAT", self.engine
+        caps = [limit for limit in (self.glucose_seconds, timeout) if limit]
+        if self.conflicts and caps:
+            from run_dpll import solve_clauses
+            result, _ = solve_clauses(clauses, min(caps), {"conflicts": self.conflicts}, kill=True, grace=0.0)
+            if result in ("SAT", "UNSAT"):
+                return result, "DPLL"
+        return None, None
+
+
+# --- Tuning from results CSVs ---
+
+def _candidates(values):
+    """Zero plus up to MAX_CANDIDATES budgets spread over the observed values."""
+    values = np.unique(values[np.isfinite(values)])
+    if len(values) > MAX_CANDIDATES:
+        values = np.unique(np.quantile(values, np.linspace(0, 1, MAX_CANDIDATES)))
+    return np.concatenate(([0.0], values))
+
+
+def calibrate_flips_per_sec(engine, folder, instances, sample=CALIBRATION_SAMPLE, seed=0):
+    """Measure the engine's flip rate on a few of the instances."""
+    from cnf_loader import load_clauses
+    from run_walksat import SOLVERS
+    rng = np.random.default_rng(seed)
+    names = [name for name in instances if os.path.exists(os.path.join(folder, name))]
+    rates = []
+    for name in rng.permutation(names)[:sample]:
+        clauses, num_vars = load_clauses(os.path.join(folder, name))
+        stats = {}
+        SOLVERS[engine](clauses, num_vars, max_flips=2000, max_tries=1, stats=stats)
+        if stats.get("flips_per_sec"):
+            rates.append(stats["flips_per_sec"])
+    if not rates:
+        raise ValueError(f"no instances from the results found in '{folder}' to calibrate {engine}")
+    return float(np.median(rates))
+
+
+def calibrate_child_seconds(repeat=CALIBRATION_SAMPLE):
+    """Median cost of starting the Glucose burst's child process, in seconds."""
+    from run_dpll import solve_clauses
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        solve_clauses([[1]], 1.0, kill=True, grace=0.0)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def tune(dpll_csv, walksat_csv, engine=DEFAULT_ENGINE, overhead_ms=SELECTION_OVERHEAD_MS,
+         folder="instances/", use_glucose=True):
+    """Choose the flip and conflict budgets that minimize total time over past results.
+
+    Each instance costs: the local-search time if it was solved within the
+    flip budget; otherwise the budget spent, then the Glucose burst. The
+    burst decides an instance whose conflict count fits the conflict budget
+    and whose runtime fits the burst's time cap; otherwise it costs the whole
+    cap, plus the selection overhead and the DPLL runtime.
+    """
+    dpll = pd.read_csv(dpll_csv).drop_duplicates("instance", keep="last")
+    walksat = pd.read_csv(walksat_csv)
+    walksat = walksat[walksat["solver"] == engine] if "solver" in walksat else walksat
+    walksat = walksat.drop_duplicates("instance", keep="last")
+    # Counters are optional: older CSVs only have result and runtime.
+    dpll = dpll[["instance", "result", "runtime_seconds"] + (["conflicts"] if "conflicts" in dpll else [])]
+    walksat = walksat[["instance", "result", "runtime_seconds"]
+                      + [name for name in ("flips", "flips_per_sec") if name in walksat]]
+    merged = dpll.merge(walksat, on="instance", suffixes=("_dpll", "_walksat"))
+    if merged.empty:
+        raise ValueError(f"no instances in both '{dpll_csv}' and '{walksat_csv}' for {engine}")
+
+    dpll_seconds = pd.to_numeric(merged["runtime_seconds_dpll"], errors="coerce").fillna(0).to_numpy()
+    ws_seconds = pd.to_numeric(merged["runtime_seconds_walksat"], errors="coerce").to_numpy()
+    ws_solved = (merged["result_walksat"] == "SAT").to_numpy()
+    if "flips_per_sec" in merged and merged["flips_per_sec"].gt(0).any():
+        flips_per_sec = float(merged.loc[merged["flips_per_sec"] > 0, "flips_per_sec"].median())
+    else:
+        flips_per_sec = calibrate_flips_per_sec(engine, folder, merged["instance"])
+    if "flips" in merged:
+        # Flips are what the budget is set in; the runtime includes setup.
+        ws_seconds = merged["flips"].to_numpy(dtype=np.float64) / flips_per_sec
+    ws_seconds = np.where(ws_solved, ws_seconds, np.inf)
+
+    # Glucose stage: a budget of C conflicts gets a time cap of C at the
+    # median conflict rate, times GLUCOSE_SLACK. Glucose only stops for the
+    # budget at a restart, so a failed burst is charged the whole cap, which
+    # is where it is killed. Every burst also pays for starting its child.
+    decided = merged["result_dpll"].isin(("SAT", "UNSAT")).to_numpy()
+    conflicts = np.full(len(merged), np.inf)
+    rate = None
+    if use_glucose and "conflicts" in merged:
+        counted = merged["conflicts"].to_numpy(dtype=np.float64)
+        busy = decided & (counted > 0) & (dpll_seconds > 0)
+        if busy.any():
+            rate = float(np.median(counted[busy] / dpll_seconds[busy]))
+            conflicts = np.where(decided & np.isfinite(counted), counted, np.inf)
+    child_seconds = calibrate_child_seconds() if rate else 0.0
+    overhead = overhead_ms / 1000.0
+    fallback = overhead + dpll_seconds
+
+    best = None
+    for budget_seconds in _candidates(ws_seconds):
+        after_ws = ~(ws_seconds <= budget_seconds)
+        ws_cost = np.where(after_ws, budget_seconds, ws_seconds)
+        for budget_conflicts in _candidates(conflicts):
+            if budget_conflicts:
+                cap = GLUCOSE_SLACK * budget_conflicts / rate
+                in_glucose = (conflicts <= budget_conflicts) & (dpll_seconds <= cap)
+                rest = child_seconds + np.where(in_glucose, dpll_seconds, cap + fallback)
+            else:
+                cap, in_glucose, rest = 0.0, np.zeros(len(merged), bool), fallback
+            total = float(np.sum(ws_cost + np.where(after_ws, rest, 0.0)))
+            if best is None or total < best[0]:
+                best = (total, budget_seconds, budget_conflicts, cap, int((~after_ws).sum()),
+                        int((after_ws & in_glucose).sum()))
+
+    total, budget_seconds, budget_conflicts, cap, by_walksat, by_glucose = best
+    baseline = float(np.sum(fallback))
+    return {
+        "engine": engine,
+        "max_flips": int(round(budget_seconds * flips_per_sec)),
+        "conflicts": int(budget_conflicts),
+        "glucose_seconds": round(cap, 6),
+        "tuned_on": {
+            "instances": int(len(merged)),
+            "presolved_walksat": by_walksat,
+            "presolved_glucose": by_glucose,
+            "flips_per_sec": round(flips_per_sec, 1),
+            "conflicts_per_sec": round(rate, 1) if rate else None,
+            "glucose_child_ms": round(child_seconds * 1000, 3),
+            "selection_overhead_ms": overhead_ms,
+            "expected_seconds": round(total, 4),
+            "without_presolve_seconds": round(baseline, 4),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the presolver budgets from past results.")
+    parser.add_argument("--dpll", default="results_dpll.csv")
+    parser.add_argument("--walksat", default="results_walksat.csv")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE)
+    parser.add_argument("--folder", default="instances/", help="instances used to measure flips/second if needed")
+    parser.add_argument("--overhead-ms", type=float, default=SELECTION_OVERHEAD_MS,
+                        help="selection overhead per instance that reaches the predictor")
+    parser.add_argument("--no-glucose", action="store_true", help="local-search stage only")
+    parser.add_argument("--output", default=DEFAULT_CONFIG)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    config = tune(args.dpll, args.walksat, args.engine, args.overhead_ms, args.folder, not args.no_glucose)
+    with open(args.output, "w") as f:
+        json.dump(config, f, indent=2)
+    tuned = config["tuned_on"]
+    print(f"Presolver: {config['max_flips']} flips of {config['engine']}, "
+          f"{config['conflicts'] or 'no'} Glucose conflicts"
+          + (f" within {config['glucose_seconds'] * 1000:.1f}ms" if config["conflicts"] else ""))
+    print(f"On {tuned['instances']} past instances: {tuned['presolved_walksat']} decided by local search, "
+          f"{tuned['presolved_glucose']} by Glucose; {tuned['expected_seconds']:.3f}s instead of "
+          f"{tuned['without_presolve_seconds']:.3f}s")
+    print(f"Saved to '{args.output}' in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,144 @@
+# results_sink.py
+import os
+import csv
+import time
+import queue
+import multiprocessing as mp
+
+# Column types understood by the Parquet writer.
+ARROW_TYPES = ("string", "int64", "float64", "bool")
+
+
+def parquet_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def _arrow_schema(schema):
+    import pyarrow as pa
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in schema])
+
+
+def _writer_loop(rows, csv_path, parquet_path, schema, batch_size, flush_interval, fsync_interval,
+                 store_path, store_params):
+    fieldnames = [name for name, _ in schema]
+    write_header = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    csv_file = open(csv_path, "a", newline="")
+    writer = csv.DictWriter(csv_file, fieldnames=fieldnames, extrasaction="ignore")
+    if write_header:
+        writer.writeheader()
+
+    parquet_writer = None
+    if parquet_path:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            arrow_schema = _arrow_schema(schema)
+            parquet_writer = pq.ParquetWriter(parquet_path, arrow_schema)
+        except ImportError:
+            print("pyarrow not installed: writing CSV results only.")
+
+    store = None
+    if store_path:
+        from results_store import ResultsStore
+        store = ResultsStore(store_path)
+
+    batch = []
+    to_record = []
+    last_flush = last_fsync = time.monotonic()
+
+    def flush():
+        if to_record:
+            store.record_many(to_record, store_params)
+            to_record.clear()
+        if batch:
+            writer.writerows(batch)
+            if parquet_writer is not None:
+                table = pa.Table.from_pylist(
+                    [{name: row.get(name) for name in fieldnames} for row in batch],
+                    schema=arrow_schema
+                )
+                parquet_writer.write_table(table)
+            batch.clear()
+        csv_file.flush()
+
+    try:
+        while True:
+            try:
+                row = rows.get(timeout=flush_interval)
+            except queue.Empty:
+                row = ()
+            if row is None:
+                break
+            if row:
+                row, record = row
+                batch.append(row)
+                if record and store is not None:
+                    to_record.append(row)
+            now = time.monotonic()
+            if len(batch) >= batch_size or now - last_flush >= flush_interval:
+                flush()
+                last_flush = now
+            if now - last_fsync >= fsync_interval:
+                os.fsync(csv_file.fileno())
+                last_fsync = now
+        flush()
+        os.fsync(csv_file.fileno())
+    finally:
+        csv_file.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+        if store is not None:
+            store.close()
+
+
+class ResultsSink:
+    """Single writer process that batches result rows to CSV and Parquet.
+
+    The main process collects rows from the solver workers and put()s them on
+    a queue; only the writer process touches the output files, so rows never
+    interleave and the header is written exactly once. schema is a list of
+    (column, type) pairs with types from ARROW_TYPES.
+
+    With store_path, every recorded row is also written to the ResultsStore
+    under store_params, which is what makes interrupted runs resumable.
+    """
+
+    def __init__(self, csv_path, schema, parquet=True, truncate=False,
+                 batch_size=256, flush_interval=1.0, fsync_interval=5.0,
+                 store_path=None, store_params=None):
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path_for(csv_path) if parquet else None
+        self.schema = schema
+        self._rows = mp.Queue()
+        self._process = mp.Process(
+            target=_writer_loop,
+            args=(self._rows, csv_path, self.parquet_path, schema,
+                  batch_size, flush_interval, fsync_interval,
+                  store_path, store_params),
+            daemon=True
+        )
+        if truncate:
+            for path in (self.csv_path, self.parquet_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def put(self, row, record=True):
+        """Queue a row for output; record=False skips the results store."""
+        if row is not None:
+            self._rows.put((row, record))
+
+    def close(self):
+        self._rows.put(None)
+        self._process.join()
+        if self._process.exitcode != 0:
+            raise RuntimeError(f"results writer for '{self.csv_path}' exited with code {self._process.exitcode}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
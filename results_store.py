@@ -0,0 +1,161 @@
+# results_store.py
+import os
+import json
+import time
+import random
+import sqlite3
+from cnf_loader import iter_instances, load_cnf, formula_fingerprint
+
+DEFAULT_STORE = "results_store.sqlite"
+
+# Rows with these outcomes are not treated as measurements, so a resumed run
+# schedules the instance again.
+RETRY_RESULTS = ("ERROR",)
+
+
+def params_key(params):
+    return json.dumps(params or {}, sort_keys=True)
+
+
+def _load_row(solver, row):
+    """A stored row as it would be recorded today.
+
+    Local-search engines used to record UNSAT when their budget ran out,
+    which proves nothing; they now report UNKNOWN, and so do their old rows.
+    Only preprocessing can prove UNSAT for them, and it leaves no clauses.
+    """
+    row = json.loads(row)
+    if row.get("result") == "UNSAT" and row.get("simplified_clauses") != 0:
+        # solvers imports the runners, which import this module.
+        from solvers import is_complete
+        if not is_complete(solver):
+            row["result"] = "UNKNOWN"
+    return row
+
+
+class ResultsStore:
+    """Persistent results keyed by (formula fingerprint, solver, solver params).
+
+    Backed by SQLite in WAL mode, so the single results writer can record rows
+    while the main process reads which combinations were already measured.
+    """
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " instance_hash TEXT NOT NULL,"
+            " solver TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " row TEXT NOT NULL,"
+            " recorded_at REAL NOT NULL,"
+            " PRIMARY KEY (instance_hash, solver, params))"
+        )
+        self.conn.commit()
+
+    def completed(self, solver, params):
+        """Map instance hash -> stored row for one solver configuration."""
+        cur = self.conn.execute(
+            "SELECT instance_hash, row FROM results WHERE solver = ? AND params = ?",
+            (solver, params_key(params))
+        )
+        return {instance_hash: _load_row(solver, row) for instance_hash, row in cur}
+
+    def latest(self, solver):
+        """Map instance hash -> most recent stored row of solver under any parameters."""
+        cur = self.conn.execute(
+            "SELECT instance_hash, row FROM results WHERE solver = ? ORDER BY recorded_at",
+            (solver,)
+        )
+        return {instance_hash: _load_row(solver, row) for instance_hash, row in cur}
+
+    def record_many(self, rows, params):
+        entries = [
+            (row["instance_hash"], row["solver"], params_key(params), json.dumps(row), time.time())
+            for row in rows
+            if row.get("instance_hash") and row.get("result") not in RETRY_RESULTS
+        ]
+        if entries:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO results (instance_hash, solver, params, row, recorded_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class RunPlan:
+    """Decide which instances of a folder a run has to solve.
+
+    Instances are identified by their canonical formula fingerprint. Each
+    distinct formula is solved once: later files with the same fingerprint are
+    aliases that receive a copy of the solved row (alias_of names the instance
+    that was actually solved). Formulas already measured for this solver
+    configuration are replayed from the store instead of being scheduled.
+    retime_fraction re-solves that share of aliases anyway to sample runtime
+    variance; those rows go to the output but not to the store.
+    """
+
+    def __init__(self, folder, store, solver, params, sink, fresh=False,
+                 retime_fraction=0.0, seed=None):
+        self.folder = folder
+        self.sink = sink
+        self.completed = {} if fresh else store.completed(solver, params)
+        self.retime_fraction = retime_fraction
+        self.rng = random.Random(seed)
+        self.fingerprints = {}
+        self.representative = {}
+        self.waiting_aliases = {}
+        self.retimed = set()
+        self.solved = {}
+        self.aliases = 0
+
+    def __iter__(self):
+        """Yield (name, formula) for every instance that must be solved."""
+        for name, formula in iter_instances(self.folder):
+            lits, offsets, num_vars = formula if formula is not None else load_cnf(os.path.join(self.folder, name))
+            fingerprint = formula_fingerprint(lits, offsets, num_vars)
+            self.fingerprints[name] = fingerprint
+
+            row = self.completed.get(fingerprint)
+            if row is not None:
+                self._emit_alias(row, name)
+                continue
+            if fingerprint not in self.representative:
+                self.representative[fingerprint] = name
+                self.waiting_aliases[fingerprint] = []
+                yield name, formula
+                continue
+
+            self.aliases += 1
+            if self.retime_fraction and self.rng.random() < self.retime_fraction:
+                self.retimed.add(name)
+                yield name, formula
+            elif fingerprint in self.solved:
+                self._emit_alias(self.solved[fingerprint], name)
+            else:
+                self.waiting_aliases[fingerprint].append(name)
+
+    def complete(self, row):
+        """Record a solved row and fan it out to the aliases seen so far."""
+        if row is None:
+            return
+        name = row["instance"]
+        fingerprint = self.fingerprints[name]
+        row["instance_hash"] = fingerprint
+        row["alias_of"] = ""
+        self.sink.put(row, record=name not in self.retimed)
+        if name in self.retimed:
+            return
+        self.solved[fingerprint] = row
+        for alias in self.waiting_aliases.pop(fingerprint, []):
+            self._emit_alias(row, alias)
+
+    def _emit_alias(self, row, name):
+        alias_of = row["instance"] if row["instance"] != name else row.get("alias_of", "")
+        self.sink.put(dict(row, instance=name, alias_of=alias_of), record=False)
@@ -1,16 +1,284 @@
 import os
-import csv
 import time
+import hashlib
+import argparse
 from pysat.solvers import Glucose3
-from pysat.formula import CNF
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures import ProcessPoolExecutor
 import threading
+import multiprocessing as mp
+from collections import OrderedDict
+import numpy as np
+from cnf_loader import load_cnf, load_clauses, to_clause_lists
+from batch_utils import imap_bounded
+from results_sink import ResultsSink
+from results_store import ResultsStore, DEFAULT_STORE, RunPlan
+from telemetry import Telemetry, TELEMETRY_SCHEMA, ChildUsage, peak_rss_mb
+from preprocess import PREPROCESS_SCHEMA, add_preprocess_arguments, preprocess_options, preprocess_instance
+
+RESULT_SCHEMA = [
+    ("instance", "string"),
+    ("solver", "string"),
+    ("num_vars", "int64"),
+    ("num_clauses", "int64"),
+    ("runtime_seconds", "float64"),
+    ("result", "string"),
+    ("decisions", "int64"),
+    ("conflicts", "int64"),
+    ("propagations", "int64"),
+    ("restarts", "int64"),
+] + TELEMETRY_SCHEMA + PREPROCESS_SCHEMA + [
+    ("family", "string"),
+    ("instance_hash", "string"),
+    ("alias_of", "string"),
+]
+
+# How often the watchdog checks the wall-clock deadline and memory use.
+WATCHDOG_INTERVAL = 0.05
+# Wall time a search run in a child gets past the timeout before it is killed.
+KILL_GRACE = 0.5
+# Search counters reported by Glucose's accum_stats().
+GLUCOSE_STATS = ("decisions", "conflicts", "propagations", "restarts")
+# Base formulas each worker keeps loaded in family mode.
+FAMILY_CACHE_SIZE = 4
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _watchdog(solver, deadline, memory_mb, done, reason):
+    """Interrupt the solver once the deadline passes or memory exceeds the cap."""
+    while True:
+        remaining = deadline - time.perf_counter() if deadline else WATCHDOG_INTERVAL
+        if done.wait(min(WATCHDOG_INTERVAL, max(remaining, 0))):
+            return
+        if deadline and time.perf_counter() >= deadline:
+            reason.append("TIMEOUT")
+        elif memory_mb and _current_rss_mb() > memory_mb:
+            reason.append("MEMOUT")
+        else:
+            continue
+        solver.interrupt()
+        return
+
+
+def _search(solver, timeout, limits, assumptions):
+    """One solve_limited call under the limits: (sat, reason, counters, runtime_seconds)."""
+    # Glucose accumulates its counters over the solver's lifetime.
+    before = solver.accum_stats()
+    # Budgets are enforced inside the solver: solve_limited() returns
+    # None once a budget is spent or interrupt() is called. Glucose
+    # checks both at its restart points, so the solve (and its CPU use)
+    # ends shortly after the limit instead of running to completion.
+    # A budget of -1 switches off both budgets (pysat calls budgetOff()),
+    # so it clears any left over from an earlier call and must come before
+    # the positive ones are set.
+    solver.conf_budget(-1)
+    if limits.get("conflicts"):
+        solver.conf_budget(limits["conflicts"])
+    if limits.get("propagations"):
+        solver.prop_budget(limits["propagations"])
+
+    done = threading.Event()
+    reason = []
+    deadline = time.perf_counter() + timeout if timeout else None
+    watchdog = threading.Thread(
+        target=_watchdog,
+        args=(solver, deadline, limits.get("memory_mb"), done, reason),
+        daemon=True
+    )
+    watchdog.start()
+    # The clock starts once the watchdog thread is up, so its start-up is
+    # not billed to the search.
+    start_time = time.perf_counter()
+    try:
+        sat = solver.solve_limited(assumptions=list(assumptions), expect_interrupt=True)
+    finally:
+        end_time = time.perf_counter()
+        done.set()
+        watchdog.join()
+    if reason:
+        # The interrupt flag outlives the call; a reused solver needs it cleared.
+        solver.clear_interrupt()
+
+    after = solver.accum_stats()
+    counters = {name: after.get(name, 0) - before.get(name, 0) for name in GLUCOSE_STATS}
+    return sat, reason[:1], counters, end_time - start_time
+
+
+def _search_child(solver, timeout, limits, assumptions, conn):
+    conn.send((_search(solver, timeout, limits, assumptions), peak_rss_mb()))
+    conn.close()
+
+
+def _search_in_child(solver, timeout, limits, assumptions, grace=KILL_GRACE, usage=None):
+    """_search in a forked child that is killed grace seconds past the timeout.
+
+    The child gets a copy of the loaded solver, so nothing is pickled on the
+    way in; only the outcome and counters come back. With usage (a dict),
+    the child's CPU time and peak RSS are stored in it (see ChildUsage).
+    """
+    receiver, sender = mp.Pipe(duplex=False)
+    process = mp.get_context("fork").Process(
+        target=_search_child, args=(solver, timeout, limits, assumptions, sender), daemon=True
+    )
+    child = ChildUsage()
+    start_time = time.perf_counter()
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout + grace):
+            outcome, child.peak_rss_mb = receiver.recv()
+            return outcome
+        return None, ["TIMEOUT"], {}, time.perf_counter() - start_time
+    except EOFError:
+        raise RuntimeError("solver process died without a result")
+    finally:
+        if process.is_alive():
+            child.before_kill(process.pid)
+            process.kill()
+        process.join()
+        receiver.close()
+        if usage is not None:
+            usage.update(child.stats())
+
+
+def run_limited(solver, timeout, limits=None, assumptions=(), stats=None, kill=False, grace=KILL_GRACE):
+    """Run solver.solve_limited under the wall-clock, budget and memory limits.
+
+    Returns (result, runtime_seconds) where result is SAT, UNSAT, TIMEOUT,
+    MEMOUT, CONFLICT_LIMIT or PROPAGATION_LIMIT. runtime_seconds covers the
+    search only, and is capped at the timeout for TIMEOUT. With stats, the
+    GLUCOSE_STATS counters of this call are stored in it (plus the child's
+    CPU time and peak RSS with kill); the solver may be reused for further
+    calls.
+
+    interrupt() only takes effect at a restart, and Glucose can go tens of
+    thousands of conflicts between restarts, so a search can run seconds
+    past the deadline. With kill, the search runs in a forked child that is
+    killed grace seconds past the timeout and cannot stall the worker.
+    The fork costs a few milliseconds per call, and what the child learns is
+    lost, so kill is for solvers that are not reused.
+    """
+    limits = limits or {}
+    if kill and timeout and "fork" in mp.get_all_start_methods():
+        usage = {}
+        sat, reason, counters, runtime = _search_in_child(solver, timeout, limits, assumptions, grace, usage)
+        if stats is not None:
+            stats.update(usage)
+    else:
+        sat, reason, counters, runtime = _search(solver, timeout, limits, assumptions)
+    if stats is not None:
+        stats.update({name: counters.get(name, 0) for name in GLUCOSE_STATS})
+    if sat is not None:
+        result = "SAT" if sat else "UNSAT"
+    elif reason:
+        result = reason[0]
+    else:
+        if limits.get("conflicts") and counters.get("conflicts", 0) >= limits["conflicts"]:
+            result = "CONFLICT_LIMIT"
+        else:
+            result = "PROPAGATION_LIMIT"
+    if result == "TIMEOUT":
+        # The overshoot past the cutoff is enforcement lag, not search; it
+        # stays visible in the search_seconds telemetry column.
+        runtime = min(runtime, timeout)
+    return result, runtime
+
+
+def solve_clauses(clauses, timeout, limits=None, stats=None, kill=False, grace=KILL_GRACE):
+    """Solve a clause list with a fresh Glucose3; returns (result, runtime_seconds).
+
+    With stats, setup_seconds (solver construction and clause loading) and the
+    Glucose search counters are stored in it. kill and grace are passed to
+    run_limited.
+    """
+    start_time = time.perf_counter()
+    solver = Glucose3()
+    try:
+        for clause in clauses:
+            solver.add_clause(clause)
+        if stats is not None:
+            stats["setup_seconds"] = round(time.perf_counter() - start_time, 6)
+        return run_limited(solver, timeout, limits, stats=stats, kill=kill, grace=grace)
+    finally:
+        solver.delete()
+
+
+# --- Family mode ---
+# Instances that differ only in their unit clauses (Sudoku puzzles over one
+# grid, say) share a base formula. Each worker keeps that base loaded in a
+# long-lived solver and passes the units as assumptions, so the clauses are
+# added once per worker and learned clauses carry over between members.
+_family_solvers = OrderedDict()
+
+
+def split_units(lits, offsets):
+    """Split CSR arrays into the non-unit base (lits, offsets) and the unit literals."""
+    lits, offsets = np.asarray(lits), np.asarray(offsets)
+    lengths = np.diff(offsets)
+    unit = lengths == 1
+    base_lits = lits[np.repeat(~unit, lengths)]
+    base_offsets = np.concatenate(([0], np.cumsum(lengths[~unit])))
+    return base_lits, base_offsets, lits[offsets[:-1][unit]]
+
+
+def family_solver(base_lits, base_offsets, num_vars):
+    """The worker's solver for this base formula: (solver, key, built)."""
+    # A plain digest of the arrays: members of one family are written by the
+    # same generator, and the canonical fingerprint costs more than the load.
+    h = hashlib.sha1(str(int(num_vars)).encode())
+    h.update(np.ascontiguousarray(base_lits, dtype="<i4").tobytes())
+    h.update(np.ascontiguousarray(base_offsets, dtype="<i4").tobytes())
+    key = h.hexdigest()
+    if key in _family_solvers:
+        _family_solvers.move_to_end(key)
+        return _family_solvers[key], key, False
+    solver = Glucose3()
+    for clause in to_clause_lists(base_lits, base_offsets):
+        solver.add_clause(clause)
+    _family_solvers[key] = solver
+    if len(_family_solvers) > FAMILY_CACHE_SIZE:
+        _family_solvers.popitem(last=False)[1].delete()
+    return solver, key, True
+
+
+def solve_family_member(lits, offsets, num_vars, timeout, limits=None, stats=None):
+    """Solve a CSR formula as units over a shared base; returns (result, runtime_seconds).
+
+    Formulas without unit clauses have nothing to share and get a fresh
+    solver, killed past the timeout. The shared solver cannot run in a child
+    (what it learns would be lost), so a member may overrun the timeout until
+    Glucose's next restart. With stats, setup_seconds (the split, and loading
+    the base when this worker has not seen it yet), the family key and the
+    Glucose search counters are stored in it.
+    """
+    start_time = time.perf_counter()
+    base_lits, base_offsets, units = split_units(lits, offsets)
+    if not len(units):
+        return solve_clauses(to_clause_lists(lits, offsets), timeout, limits, stats, kill=True)
+    solver, key, _ = family_solver(base_lits, base_offsets, num_vars)
+    if stats is not None:
+        stats["setup_seconds"] = round(time.perf_counter() - start_time, 6)
+        stats["family"] = key[:16]
+    return run_limited(solver, timeout, limits, assumptions=units.tolist(), stats=stats)
 
-lock = threading.Lock()
 
 def solve_instance(file_info):
-    idx, file, folder, output_file, timeout = file_info
+    idx, file, folder, timeout = file_info[:4]
+    limits = file_info[4] if len(file_info) > 4 else {}
+    formula = file_info[5] if len(file_info) > 5 else None
+    profile = file_info[6] if len(file_info) > 6 else {}
+    preprocessing = file_info[7] if len(file_info) > 7 else None
+    family = file_info[8] if len(file_info) > 8 else False
     path = os.path.join(folder, file)
+    telemetry = Telemetry(file, **profile)
 
     result_entry = {
         "instance": file,
@@ -22,61 +290,164 @@ def solve_instance(file_info):
     }
 
     try:
-        formula = CNF(from_file=path)
-        result_entry["num_vars"] = formula.nv
-        result_entry["num_clauses"] = len(formula.clauses)
-
-        solver = Glucose3()
-        for clause in formula.clauses:
-            solver.add_clause(clause)
-
-        def run_solver():
-            return solver.solve()
+        with telemetry.phase("load"):
+            if family:
+                # Members stay in CSR form; only the base is ever expanded.
+                lits, offsets, num_vars = formula if formula is not None else load_cnf(path)
+                num_clauses = len(offsets) - 1
+            else:
+                clauses, num_vars = load_clauses(path, formula=formula)
+                num_clauses = len(clauses)
+        result_entry["num_vars"] = num_vars
+        result_entry["num_clauses"] = num_clauses
 
-        start_time = time.time()
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            future = ex.submit(run_solver)
-            try:
-                sat = future.result(timeout=timeout)
-                result_entry["result"] = "SAT" if sat else "UNSAT"
-            except TimeoutError:
-                result_entry["result"] = "TIMEOUT"
-            except Exception as e:
-                result_entry["result"] = "ERROR"
-                print(f" Error on {file}: {e}")
-        end_time = time.time()
+        pre = None
+        if preprocessing is not None:
+            with telemetry.phase("preprocess"):
+                pre = preprocess_instance(path, formula, **preprocessing)
+            clauses = pre.clauses
+            result_entry.update(pre.columns())
 
-        result_entry["runtime_seconds"] = round(end_time - start_time, 4)
+        stats = {}
+        if pre is not None and pre.status:
+            # Decided by preprocessing alone; no solver is started.
+            result, runtime = pre.status, 0.0
+        else:
+            with telemetry.phase("solve", profile=True):
+                if family:
+                    result, runtime = solve_family_member(lits, offsets, num_vars, timeout, limits, stats)
+                else:
+                    result, runtime = solve_clauses(clauses, timeout, limits, stats, kill=True)
+        result_entry["result"] = result
+        result_entry["runtime_seconds"] = round(runtime, 4)
+        result_entry.update({name: stats.get(name, 0) for name in GLUCOSE_STATS})
+        result_entry.update(telemetry.columns(stats))
+        result_entry["family"] = stats.get("family", "")
 
     except Exception as e:
         result_entry["result"] = "ERROR"
         print(f" Error on {file}: {e}")
 
-    with lock:
-        write_header = not os.path.exists(output_file)
-        with open(output_file, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=result_entry.keys())
-            if write_header:
-                writer.writeheader()
-            writer.writerow(result_entry)
-
     print(f"[{idx}] {file} -> {result_entry['result']} ({result_entry['runtime_seconds']}s)")
     return result_entry
 
 
-if __name__ == "__main__":
-    folder = "instances/"
-    output_file = "results_dpll.csv"
-    timeout_seconds = 5
+# --- Limit regression check ---
+
+def pigeonhole(pigeons, holes):
+    """Clauses putting each pigeon in a hole, at most one pigeon per hole.
 
-    if os.path.exists(output_file):
-        os.remove(output_file)
+    UNSAT whenever pigeons > holes, and hard for CDCL: a deterministic
+    formula that no small budget can decide.
+    """
+    var = lambda i, j: i * holes + j + 1
+    clauses = [[var(i, j) for j in range(holes)] for i in range(pigeons)]
+    clauses += [[-var(i, j), -var(k, j)] for j in range(holes)
+                for i in range(pigeons) for k in range(i + 1, pigeons)]
+    return clauses, pigeons * holes
+
+
+def check_limits(timeout=30):
+    """Check that a conflicts-only budget stops Glucose; returns the failures.
+
+    Covers a fresh solver and a reused family solver, which carries the
+    budgets of its earlier calls. Without the budget each call would run
+    into the timeout instead.
+    """
+    clauses, num_vars = pigeonhole(10, 9)
+    limits = {"conflicts": 10}
+    outcomes = {"fresh": solve_clauses(clauses, timeout, limits)[0]}
+    lits = np.array([lit for clause in clauses for lit in clause] + [1], dtype=np.int32)
+    offsets = np.concatenate(([0], np.cumsum([len(clause) for clause in clauses] + [1]))).astype(np.int32)
+    for call, call_limits in enumerate(({"propagations": 1000}, limits, limits)):
+        outcome = solve_family_member(lits, offsets, num_vars, timeout, call_limits)[0]
+        if call:
+            outcomes[f"family call {call + 1}"] = outcome
+    return [f"{name}: {outcome} instead of CONFLICT_LIMIT"
+            for name, outcome in outcomes.items() if outcome != "CONFLICT_LIMIT"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run Glucose3 over a folder of CNF instances.")
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--output", default="results_dpll.csv")
+    parser.add_argument("--timeout", type=float, default=5, help="wall-clock limit per instance (seconds)")
+    parser.add_argument("--conflicts", type=int, default=0, help="conflict budget per instance (0 = none)")
+    parser.add_argument("--propagations", type=int, default=0, help="propagation budget per instance (0 = none)")
+    parser.add_argument("--memory-mb", type=float, default=0, help="resident memory cap per worker in MB (0 = none)")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="persistent results store used to resume runs")
+    parser.add_argument("--fresh", action="store_true", help="re-solve instances already in the store")
+    parser.add_argument("--retime-fraction", type=float, default=0.0,
+                        help="share of duplicate formulas to re-solve anyway for runtime variance")
+    parser.add_argument("--profile-dir", help="run each solve under cProfile and keep dumps of slow instances here")
+    parser.add_argument("--profile-threshold", type=float, default=1.0,
+                        help="keep a profile only when the solve took at least this many seconds")
+    parser.add_argument("--family", action="store_true",
+                        help="solve instances that differ only in unit clauses against one shared base solver per worker")
+    parser.add_argument("--check-limits", action="store_true",
+                        help="check that the conflict budget stops Glucose, then exit")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.family and args.preprocess != "none":
+        parser.error("--family solves members unsimplified; it cannot be combined with --preprocess")
+    return args
+
+
+def run_setup(args):
+    """(solver name, store params, task factory) for parsed runner arguments.
+
+    The task factory turns (index, instance name, formula) into the file_info
+    tuple solve_instance takes; cluster.py uses it with formula=None so that
+    workers load the instance from the shared folder themselves.
+    """
+    limits = {
+        "conflicts": args.conflicts,
+        "propagations": args.propagations,
+        "memory_mb": args.memory_mb
+    }
+    profile = {"profile_dir": args.profile_dir, "profile_threshold": args.profile_threshold}
+    preprocessing = preprocess_options(args)
+
+    # Results are keyed by formula fingerprint and these parameters, so a
+    # rerun only schedules instances that are new, changed or not yet solved,
+    # and identical formulas are solved once per run.
+    params = dict(limits, timeout=args.timeout)
+    if preprocessing is not None:
+        params["preprocess"] = args.preprocess
+    if args.family:
+        # Member runtimes depend on what the shared solver learned before.
+        params["family"] = True
+
+    def make_task(idx, name, formula):
+        return (idx, name, args.folder, args.timeout, limits, formula, profile, preprocessing, args.family)
+    return "DPLL", params, make_task
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.check_limits:
+        failures = check_limits()
+        print("\n".join(failures) or "Conflict budgets stop fresh and reused solvers.")
+        raise SystemExit(1 if failures else 0)
 
-    cnf_files = [f for f in os.listdir(folder) if f.endswith(".cnf")]
-    file_info_list = [(i+1, f, folder, output_file, timeout_seconds) for i, f in enumerate(cnf_files)]
+    folder = args.folder
+    output_file = args.output
+    solver_name, params, make_task = run_setup(args)
+    store = ResultsStore(args.store)
     max_workers = min(8, os.cpu_count() or 4)
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(solve_instance, file_info_list)
+    # Workers only return rows; a single writer process owns the output files.
+    with ResultsSink(output_file, RESULT_SCHEMA, truncate=True,
+                     store_path=args.store, store_params=params) as sink:
+        # Instances (including compressed files and archive members) are
+        # enumerated lazily and fed to the pool as workers free up.
+        plan = RunPlan(folder, store, solver_name, params, sink, fresh=args.fresh,
+                       retime_fraction=args.retime_fraction)
+        file_info_iter = (make_task(i + 1, name, formula) for i, (name, formula) in enumerate(plan))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for row in imap_bounded(executor, solve_instance, file_info_iter):
+                plan.complete(row)
+    store.close()
+    print(f"\n {plan.aliases} duplicate formulas found ({len(plan.retimed)} re-timed)")
 
     print(f"\n DPLL results saved to '{output_file}'")
@@ -0,0 +1,142 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from cnf_loader import load_clauses
+from batch_utils import imap_bounded
+from results_sink import ResultsSink
+from results_store import ResultsStore, DEFAULT_STORE, RunPlan
+from telemetry import Telemetry, TELEMETRY_SCHEMA
+from preprocess import PREPROCESS_SCHEMA, add_preprocess_arguments, preprocess_options, preprocess_instance
+from solvers import BACKENDS
+
+# One schema for every backend; counters a backend does not report stay empty.
+RESULT_SCHEMA = [
+    ("instance", "string"),
+    ("solver", "string"),
+    ("num_vars", "int64"),
+    ("num_clauses", "int64"),
+    ("runtime_seconds", "float64"),
+    ("result", "string"),
+    ("decisions", "int64"),
+    ("conflicts", "int64"),
+    ("propagations", "int64"),
+    ("restarts", "int64"),
+    ("flips", "int64"),
+    ("flips_per_sec", "float64"),
+    ("best_unsat", "int64"),
+] + TELEMETRY_SCHEMA + PREPROCESS_SCHEMA + [
+    ("instance_hash", "string"),
+    ("alias_of", "string"),
+]
+
+
+def solve_task(file_info):
+    idx, file, folder, solver_name, params, formula, profile, preprocessing = file_info
+    backend = BACKENDS[solver_name]
+    path = os.path.join(folder, file)
+    telemetry = Telemetry(file, **profile)
+
+    result_entry = {
+        "instance": file,
+        "solver": solver_name,
+        "num_vars": 0,
+        "num_clauses": 0,
+        "runtime_seconds": None,
+        "result": "UNKNOWN"
+    }
+
+    try:
+        with telemetry.phase("load"):
+            clauses, num_vars = load_clauses(path, formula=formula)
+        result_entry["num_vars"] = num_vars
+        result_entry["num_clauses"] = len(clauses)
+
+        pre = None
+        if preprocessing is not None:
+            with telemetry.phase("preprocess"):
+                pre = preprocess_instance(path, formula, **preprocessing)
+            clauses = pre.clauses
+            result_entry.update(pre.columns())
+
+        stats = {}
+        if pre is not None and pre.status:
+            # Decided by preprocessing alone; no solver is started.
+            result = pre.status
+        else:
+            with telemetry.phase("solve", profile=True):
+                result = backend.solve(clauses, num_vars, params, stats)
+        columns = telemetry.columns(stats)
+        result_entry["result"] = result
+        result_entry["runtime_seconds"] = columns["search_seconds"]
+        result_entry.update({name: stats.get(name) for name in backend.STATS})
+        result_entry.update(columns)
+
+    except Exception as e:
+        result_entry["result"] = "ERROR"
+        print(f" Error on {file}: {e}")
+
+    print(f"[{idx}] {file} -> {result_entry['result']} ({result_entry['runtime_seconds']}s)")
+    return result_entry
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run any registered solver over a folder of CNF instances.")
+    parser.add_argument("--solver", choices=sorted(BACKENDS), required=True)
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--output", help="results CSV (default results_<solver>.csv)")
+    parser.add_argument("--timeout", type=float, default=5, help="wall-clock limit per instance (seconds)")
+    parser.add_argument("--conflicts", type=int, default=0, help="conflict budget per instance (0 = none)")
+    parser.add_argument("--propagations", type=int, default=0, help="propagation budget per instance (0 = none)")
+    parser.add_argument("--memory-mb", type=float, default=0, help="resident memory cap per worker in MB (0 = none)")
+    parser.add_argument("--max-flips", type=int, help="local search: flips per try (engine default if omitted)")
+    parser.add_argument("--max-tries", type=int, help="local search: restarts / walkers (engine default if omitted)")
+    parser.add_argument("--p", type=float, help="local search: noise probability (engine default if omitted)")
+    parser.add_argument("--cb", type=float, help="ProbSAT: break exponent (engine default if omitted)")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="persistent results store used to resume runs")
+    parser.add_argument("--fresh", action="store_true", help="re-solve instances already in the store")
+    parser.add_argument("--retime-fraction", type=float, default=0.0,
+                        help="share of duplicate formulas to re-solve anyway for runtime variance")
+    parser.add_argument("--profile-dir", help="run each solve under cProfile and keep dumps of slow instances here")
+    parser.add_argument("--profile-threshold", type=float, default=1.0,
+                        help="keep a profile only when the solve took at least this many seconds")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args(argv)
+    args.output = args.output or f"results_{args.solver.lower()}.csv"
+    try:
+        BACKENDS[args.solver].params(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def run_setup(args):
+    """(solver name, store params, task factory) for parsed runner arguments (see run_dpll.run_setup)."""
+    profile = {"profile_dir": args.profile_dir, "profile_threshold": args.profile_threshold}
+    preprocessing = preprocess_options(args)
+    params = BACKENDS[args.solver].params(args)
+    store_params = dict(params, preprocess=args.preprocess) if preprocessing is not None else params
+
+    def make_task(idx, name, formula):
+        return (idx, name, args.folder, args.solver, params, formula, profile, preprocessing)
+    return args.solver, store_params, make_task
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    solver_name, store_params, make_task = run_setup(args)
+    store = ResultsStore(args.store)
+    max_workers = min(8, os.cpu_count() or 4)
+    print(f"Starting {solver_name} {store_params} with {max_workers} worker processes...")
+
+    # Workers only return rows; a single writer process owns the output files.
+    with ResultsSink(args.output, RESULT_SCHEMA, truncate=True,
+                     store_path=args.store, store_params=store_params) as sink:
+        plan = RunPlan(args.folder, store, solver_name, store_params, sink, fresh=args.fresh,
+                       retime_fraction=args.retime_fraction)
+        file_info_iter = (make_task(i + 1, name, formula) for i, (name, formula) in enumerate(plan))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for row in imap_bounded(executor, solve_task, file_info_iter):
+                plan.complete(row)
+    store.close()
+    print(f"\n {plan.aliases} duplicate formulas found ({len(plan.retimed)} re-timed)")
+    print(f"\n {solver_name} results saved to '{args.output}'")
@@ -1,11 +1,36 @@
 import os
-import csv
 import random
-import threading
+import inspect
+import argparse
 from concurrent.futures import ProcessPoolExecutor
 import time 
+import numpy as np
+from cnf_loader import load_clauses
+from batch_utils import imap_bounded
+from results_sink import ResultsSink
+from results_store import ResultsStore, DEFAULT_STORE, RunPlan
+from telemetry import Telemetry, TELEMETRY_SCHEMA
+from preprocess import PREPROCESS_SCHEMA, add_preprocess_arguments, preprocess_options, preprocess_instance
 
-lock = threading.Lock()
+RESULT_SCHEMA = [
+    ("instance", "string"),
+    ("solver", "string"),
+    ("num_vars", "int64"),
+    ("num_clauses", "int64"),
+    ("result", "string"),
+    ("runtime_seconds", "float64"),
+    ("flips", "int64"),
+    ("flips_per_sec", "float64"),
+    ("restarts", "int64"),
+    ("best_unsat", "int64"),
+] + TELEMETRY_SCHEMA + PREPROCESS_SCHEMA + [
+    ("instance_hash", "string"),
+    ("alias_of", "string"),
+]
+
+# Search parameters that identify a WalkSAT configuration in the results store
+# (each engine takes the subset in its signature).
+SEARCH_PARAMS = ("max_flips", "max_tries", "p", "cb", "max_seconds")
 
 def parse_cnf(file_path):
     clauses = []
@@ -53,19 +78,28 @@ def calculate_break_count(var, assignment, clauses, var_to_clauses_map):
     return break_count
 
 
-def walksat_optimized(clauses, num_vars, max_flips=500, max_tries=5, p=0.3):
+def walksat_optimized(clauses, num_vars, max_flips=500, max_tries=5, p=0.3, stats=None):
+    start_time = time.perf_counter()
+    if _has_empty_clause(clauses, stats, start_time):
+        return None
+    flips = 0
     var_to_clauses_map = {i: [] for i in range(1, num_vars + 1)}
     for clause in clauses:
         for lit in clause:
             var_to_clauses_map[abs(lit)].append(clause)
+    setup_time = time.perf_counter()
+    best_unsat = len(clauses)
 
     for _try in range(max_tries):
         assignment = [random.choice([True, False]) for _ in range(num_vars + 1)]
         unsat_clauses = [c for c in clauses if not check_clause(c, assignment)]
 
         for _ in range(max_flips):
+            if len(unsat_clauses) < best_unsat:
+                best_unsat = len(unsat_clauses)
             if not unsat_clauses:
-                return True
+                _fill_stats(stats, flips, _try + 1, start_time, setup_time, best_unsat)
+                return assignment
 
             clause = random.choice(unsat_clauses)
 
@@ -86,6 +120,7 @@ def walksat_optimized(clauses, num_vars, max_flips=500, max_tries=5, p=0.3):
                 var_to_flip = best_var
 
             assignment[var_to_flip] = not assignment[var_to_flip]
+            flips += 1
             affected_clauses = var_to_clauses_map.get(var_to_flip, [])
 
             for c in affected_clauses:
@@ -97,64 +132,675 @@ def walksat_optimized(clauses, num_vars, max_flips=500, max_tries=5, p=0.3):
                     if c not in unsat_clauses:
                         unsat_clauses.append(c)
 
-    return False
+        best_unsat = min(best_unsat, len(unsat_clauses))
+        if not unsat_clauses:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, best_unsat)
+            return assignment
 
+    _fill_stats(stats, flips, max_tries, start_time, setup_time, best_unsat)
+    return None
 
-def process_file(file_info):
-    idx, file, folder, output_file = file_info
-    path = os.path.join(folder, file)
 
-    try:
-        clauses, num_vars = parse_cnf(path)
-    except Exception as e:
-        print(f"Error parsing {file}: {e}")
+def _fill_stats(stats, flips, tries, start_time, setup_time=None, best_unsat=0):
+    if stats is None:
+        return
+    now = time.perf_counter()
+    setup_time = setup_time or start_time
+    stats["flips"] = flips
+    stats["tries"] = tries
+    stats["restarts"] = max(tries - 1, 0)
+    # Fewest unsatisfied clauses any assignment reached (0 when solved).
+    stats["best_unsat"] = best_unsat
+    stats["setup_seconds"] = round(setup_time - start_time, 6)
+    # Rate over the search only, so setup cost does not dilute it.
+    search = now - setup_time
+    stats["flips_per_sec"] = round(flips / search, 1) if search > 0 else 0.0
+
+
+def _has_empty_clause(clauses, stats, start_time):
+    """Whether an empty clause (a bare "0" line) rules out every assignment.
+
+    Local search has nothing to flip in such a clause, so the engines give up
+    at once; stats are filled as for a search that made no flips.
+    """
+    empty = sum(1 for clause in clauses if not clause)
+    if empty:
+        _fill_stats(stats, 0, 0, start_time, best_unsat=empty)
+    return empty > 0
+
+
+def _normalize_clauses(clauses):
+    # Duplicate literals are merged and tautologies dropped, so every clause
+    # holds each variable at most once and the incremental counters stay exact.
+    norm_clauses = []
+    for clause in clauses:
+        lits = set(clause)
+        if any(-lit in lits for lit in lits):
+            continue
+        norm_clauses.append(list(lits))
+    return norm_clauses
+
+
+def walksat_incremental(clauses, num_vars, max_flips=10000, max_tries=5, p=0.3, stats=None, rng=None):
+    """WalkSAT with incrementally maintained true-literal counts and break counts.
+
+    Same move policy as walksat_optimized, but a flip only touches the clauses
+    containing the flipped variable and never re-evaluates a clause from scratch.
+    rng (a random.Random) makes the walk reproducible; by default the global
+    generator is used.
+    """
+    start_time = time.perf_counter()
+    if _has_empty_clause(clauses, stats, start_time):
+        return None
+    flips = 0
+
+    norm_clauses = _normalize_clauses(clauses)
+    clause_vars, pos_occ, neg_occ = _occurrences(norm_clauses, num_vars)
+    setup_time = time.perf_counter()
+    best_unsat = len(norm_clauses) + 1
+
+    rand = (rng or random).random
+    for _try in range(max_tries):
+        state = _FlipState(norm_clauses, clause_vars, pos_occ, neg_occ,
+                           [rand() < 0.5 for _ in range(num_vars + 1)])
+        assignment, true_count, true_sum = state.assignment, state.true_count, state.true_sum
+        break_count, unsat, unsat_pos = state.break_count, state.unsat, state.unsat_pos
+
+        for _ in range(max_flips):
+            if len(unsat) < best_unsat:
+                best_unsat = len(unsat)
+                if not unsat:
+                    _fill_stats(stats, flips, _try + 1, start_time, setup_time, 0)
+                    return assignment
+
+            vars_ = clause_vars[unsat[int(rand() * len(unsat))]]
+
+            if rand() < p:
+                var = vars_[int(rand() * len(vars_))]
+            else:
+                var = vars_[0]
+                min_breaks = break_count[var]
+                for v in vars_:
+                    if break_count[v] < min_breaks:
+                        min_breaks = break_count[v]
+                        var = v
+                        if min_breaks == 0:
+                            break
+
+            # _FlipState.flip inlined: this is the benchmarked engine, and the
+            # method call and attribute lookups cost about 6% of its flips/sec.
+            if assignment[var]:
+                made, broken = neg_occ[var], pos_occ[var]
+            else:
+                made, broken = pos_occ[var], neg_occ[var]
+            assignment[var] = not assignment[var]
+            flips += 1
+
+            for ci in made:
+                cnt = true_count[ci]
+                if cnt == 0:
+                    # O(1) removal: move the last unsat clause into the hole
+                    pos = unsat_pos[ci]
+                    last = unsat.pop()
+                    if last != ci:
+                        unsat[pos] = last
+                        unsat_pos[last] = pos
+                    unsat_pos[ci] = -1
+                    break_count[var] += 1
+                elif cnt == 1:
+                    break_count[true_sum[ci]] -= 1
+                true_count[ci] = cnt + 1
+                true_sum[ci] += var
+
+            for ci in broken:
+                cnt = true_count[ci] - 1
+                true_count[ci] = cnt
+                true_sum[ci] -= var
+                if cnt == 0:
+                    unsat_pos[ci] = len(unsat)
+                    unsat.append(ci)
+                    break_count[var] -= 1
+                elif cnt == 1:
+                    break_count[true_sum[ci]] += 1
+
+        best_unsat = min(best_unsat, len(unsat))
+        if not unsat:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, 0)
+            return assignment
+
+    _fill_stats(stats, flips, max_tries, start_time, setup_time, best_unsat)
+    return None
+
+
+def walksat_batched(clauses, num_vars, max_flips=10000, max_tries=16, p=0.3, stats=None):
+    """Run max_tries WalkSAT walkers in lockstep on one shared clause array.
+
+    Assignments are a (walkers x vars) boolean matrix; clause selection, break
+    counts and flips are computed for all walkers at once with NumPy, and the
+    search stops as soon as any walker satisfies every clause.
+    """
+    start_time = time.perf_counter()
+    if _has_empty_clause(clauses, stats, start_time):
+        return None
+    rng = np.random.default_rng(random.getrandbits(32))
+    norm_clauses = _normalize_clauses(clauses)
+    num_clauses = len(norm_clauses)
+    walkers = max_tries
+    if num_clauses == 0:
+        _fill_stats(stats, 0, 1, start_time)
+        return [False] * (num_vars + 1)
+
+    # Clause -> variable table padded with variable 0 (never true).
+    width = max(len(c) for c in norm_clauses)
+    clause_vars = np.zeros((num_clauses, width), dtype=np.int32)
+    clause_pos = np.zeros((num_clauses, width), dtype=bool)
+    for ci, clause in enumerate(norm_clauses):
+        clause_vars[ci, :len(clause)] = np.abs(clause)
+        clause_pos[ci, :len(clause)] = np.array(clause) > 0
+
+    # Variable -> clause occurrence table padded with a dummy clause index
+    # num_clauses whose counter is never read as 0 or 1.
+    degree = np.bincount(clause_vars[clause_vars > 0], minlength=num_vars + 1)
+    depth = max(int(degree.max()), 1)
+    occ_clause = np.full((num_vars + 1, depth), num_clauses, dtype=np.int32)
+    occ_pos = np.zeros((num_vars + 1, depth), dtype=bool)
+    fill = np.zeros(num_vars + 1, dtype=np.int64)
+    for ci, clause in enumerate(norm_clauses):
+        for lit in clause:
+            v = abs(lit)
+            occ_clause[v, fill[v]] = ci
+            occ_pos[v, fill[v]] = lit > 0
+            fill[v] += 1
+
+    rows = np.arange(walkers)
+    assignment = rng.random((walkers, num_vars + 1)) < 0.5
+    assignment[:, 0] = False
+    truth = (assignment[:, clause_vars] == clause_pos) & (clause_vars > 0)
+    true_count = np.empty((walkers, num_clauses + 1), dtype=np.int32)
+    true_count[:, :num_clauses] = truth.sum(axis=2)
+    true_count[:, num_clauses] = 1 << 20
+    setup_time = time.perf_counter()
+    best_unsat = num_clauses
+
+    steps = 0
+    winner = None
+    for steps in range(max_flips + 1):
+        unsat = true_count[:, :num_clauses] == 0
+        n_unsat = unsat.sum(axis=1)
+        best_unsat = min(best_unsat, int(n_unsat.min()))
+        if (n_unsat == 0).any() or steps == max_flips:
+            if (n_unsat == 0).any():
+                winner = int((n_unsat == 0).argmax())
+            break
+
+        # One uniformly random unsat clause per walker.
+        pick = (rng.random(walkers) * n_unsat).astype(np.int64)
+        chosen = (np.cumsum(unsat, axis=1) > pick[:, None]).argmax(axis=1)
+        cand = clause_vars[chosen]
+        valid = cand > 0
+
+        # Break count of each candidate: clauses where it is the only true literal.
+        occ = occ_clause[cand]
+        lit_true = occ_pos[cand] == assignment[rows[:, None], cand][:, :, None]
+        critical = (true_count[rows[:, None, None], occ] == 1) & lit_true
+        breaks = np.where(valid, critical.sum(axis=2), np.iinfo(np.int32).max)
+
+        greedy = breaks.argmin(axis=1)
+        noisy = (rng.random(cand.shape) * valid).argmax(axis=1)
+        slot = np.where(rng.random(walkers) < p, noisy, greedy)
+        var = cand[rows, slot]
+
+        new_val = ~assignment[rows, var]
+        assignment[rows, var] = new_val
+        delta = np.where(occ_pos[var] == new_val[:, None], 1, -1).astype(np.int32)
+        np.add.at(true_count, (rows[:, None], occ_clause[var]), delta)
+
+    _fill_stats(stats, steps * walkers, walkers, start_time, setup_time, best_unsat)
+    if stats is not None:
+        # Walkers run side by side rather than as restarts; tries counts walkers.
+        stats["restarts"] = 0
+    return assignment[winner].tolist() if winner is not None else None
+
+
+class _FlipState:
+    """Incrementally maintained counters of one local-search try.
+
+    true_count[c]: number of true literals in clause c
+    true_sum[c]: sum of the variables of those literals, which is the
+      critical (only true) variable whenever true_count[c] == 1
+    break_count[v]: clauses that would become unsat if v were flipped
+    unsat / unsat_pos: the unsat clauses and each one's index in that list
+
+    walksat_incremental starts from these counters but inlines flip. With
+    track_make, also
+    make_count[v]: the number of unsat clauses containing v (every literal
+    of an unsat clause is false, so flipping v satisfies all of them).
+    """
+
+    def __init__(self, norm_clauses, clause_vars, pos_occ, neg_occ, assignment, track_make=False):
+        self.clause_vars = clause_vars
+        self.pos_occ = pos_occ
+        self.neg_occ = neg_occ
+        self.assignment = assignment
+        num_clauses = len(norm_clauses)
+        self.true_count = [0] * num_clauses
+        self.true_sum = [0] * num_clauses
+        self.break_count = [0] * len(assignment)
+        self.make_count = [0] * len(assignment) if track_make else None
+        self.unsat = []
+        self.unsat_pos = [-1] * num_clauses
+        for ci, clause in enumerate(norm_clauses):
+            cnt = 0
+            total = 0
+            for lit in clause:
+                if assignment[lit] if lit > 0 else not assignment[-lit]:
+                    cnt += 1
+                    total += abs(lit)
+            self.true_count[ci] = cnt
+            self.true_sum[ci] = total
+            if cnt == 0:
+                self.unsat_pos[ci] = len(self.unsat)
+                self.unsat.append(ci)
+                if track_make:
+                    for v in clause_vars[ci]:
+                        self.make_count[v] += 1
+            elif cnt == 1:
+                self.break_count[total] += 1
+
+    def flip(self, var):
+        assignment, true_count, true_sum = self.assignment, self.true_count, self.true_sum
+        break_count, make_count, unsat, unsat_pos = self.break_count, self.make_count, self.unsat, self.unsat_pos
+        if assignment[var]:
+            made, broken = self.neg_occ[var], self.pos_occ[var]
+        else:
+            made, broken = self.pos_occ[var], self.neg_occ[var]
+        assignment[var] = not assignment[var]
+
+        for ci in made:
+            cnt = true_count[ci]
+            if cnt == 0:
+                pos = unsat_pos[ci]
+                last = unsat.pop()
+                if last != ci:
+                    unsat[pos] = last
+                    unsat_pos[last] = pos
+                unsat_pos[ci] = -1
+                break_count[var] += 1
+                if make_count is not None:
+                    for v in self.clause_vars[ci]:
+                        make_count[v] -= 1
+            elif cnt == 1:
+                break_count[true_sum[ci]] -= 1
+            true_count[ci] = cnt + 1
+            true_sum[ci] += var
+
+        for ci in broken:
+            cnt = true_count[ci] - 1
+            true_count[ci] = cnt
+            true_sum[ci] -= var
+            if cnt == 0:
+                unsat_pos[ci] = len(unsat)
+                unsat.append(ci)
+                break_count[var] -= 1
+                if make_count is not None:
+                    for v in self.clause_vars[ci]:
+                        make_count[v] += 1
+            elif cnt == 1:
+                break_count[true_sum[ci]] += 1
+
+
+def _occurrences(norm_clauses, num_vars):
+    """(clause variables, positive occurrences, negative occurrences) per clause / variable."""
+    pos_occ = [[] for _ in range(num_vars + 1)]
+    neg_occ = [[] for _ in range(num_vars + 1)]
+    for ci, clause in enumerate(norm_clauses):
+        for lit in clause:
+            if lit > 0:
+                pos_occ[lit].append(ci)
+            else:
+                neg_occ[-lit].append(ci)
+    return [[abs(lit) for lit in clause] for clause in norm_clauses], pos_occ, neg_occ
+
+
+# Flips between wall-clock checks when a max_seconds budget is set.
+CLOCK_CHECK_FLIPS = 1024
+
+
+def probsat(clauses, num_vars, max_flips=100000, max_tries=10, cb=2.38, max_seconds=None, stats=None,
+            rng=None):
+    """ProbSAT (Balint & Schoening): pick a variable of a random unsat clause
+    with probability proportional to (1 + break)^-cb.
+
+    No greedy step and no noise parameter; cb=2.38 is the published setting
+    for random 3-SAT. max_seconds caps the whole search on top of the flips.
+    rng (a random.Random) makes the walk reproducible, as in walksat_incremental.
+    """
+    start_time = time.perf_counter()
+    if _has_empty_clause(clauses, stats, start_time):
         return None
+    deadline = start_time + max_seconds if max_seconds else None
+    norm_clauses = _normalize_clauses(clauses)
+    clause_vars, pos_occ, neg_occ = _occurrences(norm_clauses, num_vars)
+    # weight[b] for every break count a variable can have.
+    max_degree = max((len(pos_occ[v]) + len(neg_occ[v]) for v in range(num_vars + 1)), default=0)
+    weight = [(1.0 + b) ** -cb for b in range(max_degree + 1)]
+    setup_time = time.perf_counter()
+    best_unsat = len(norm_clauses)
+    flips = 0
+
+    rand = (rng or random).random
+    for _try in range(max_tries):
+        state = _FlipState(norm_clauses, clause_vars, pos_occ, neg_occ,
+                           [rand() < 0.5 for _ in range(num_vars + 1)])
+        unsat, break_count = state.unsat, state.break_count
+        for _ in range(max_flips):
+            best_unsat = min(best_unsat, len(unsat))
+            if not unsat:
+                break
+            if deadline and flips % CLOCK_CHECK_FLIPS == 0 and time.perf_counter() > deadline:
+                break
+            vars_ = clause_vars[unsat[int(rand() * len(unsat))]]
+            weights = [weight[break_count[v]] for v in vars_]
+            r = rand() * sum(weights)
+            var = vars_[-1]
+            for v, w in zip(vars_, weights):
+                r -= w
+                if r < 0:
+                    var = v
+                    break
+            state.flip(var)
+            flips += 1
+
+        best_unsat = min(best_unsat, len(unsat))
+        if not unsat:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, 0)
+            return state.assignment
+        if deadline and time.perf_counter() > deadline:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, best_unsat)
+            return None
 
+    _fill_stats(stats, flips, max_tries, start_time, setup_time, best_unsat)
+    return None
+
+
+# Adaptive noise (Hoos 2002): raise the noise by PHI when the number of unsat
+# clauses has not improved for THETA * num_clauses flips, lower it by PHI / 2
+# on every improvement.
+NOISE_PHI = 0.2
+NOISE_THETA = 1 / 6
+# Novelty+ random-walk probability.
+NOVELTY_WALK = 0.01
+
+
+def novelty_plus(clauses, num_vars, max_flips=100000, max_tries=10, p=None, max_seconds=None, stats=None,
+                 rng=None):
+    """Novelty+ with adaptive noise.
+
+    From a random unsat clause, take the variable with the best make - break
+    score (ties to the least recently flipped) unless it is the clause's most
+    recently flipped one; then the second best is taken with probability p.
+    With probability NOVELTY_WALK a random variable of the clause is flipped
+    instead. p=None adapts the noise during the search, starting from 0.
+    rng (a random.Random) makes the walk reproducible, as in walksat_incremental.
+    """
     start_time = time.perf_counter()
-    sat = walksat_optimized(clauses, num_vars)
-    end_time = time.perf_counter()
-    runtime = end_time - start_time
+    if _has_empty_clause(clauses, stats, start_time):
+        return None
+    deadline = start_time + max_seconds if max_seconds else None
+    norm_clauses = _normalize_clauses(clauses)
+    clause_vars, pos_occ, neg_occ = _occurrences(norm_clauses, num_vars)
+    stall_limit = max(int(NOISE_THETA * len(norm_clauses)), 1)
+    setup_time = time.perf_counter()
+    best_unsat = len(norm_clauses)
+    flips = 0
+
+    rand = (rng or random).random
+    for _try in range(max_tries):
+        state = _FlipState(norm_clauses, clause_vars, pos_occ, neg_occ,
+                           [rand() < 0.5 for _ in range(num_vars + 1)], track_make=True)
+        unsat, break_count, make_count = state.unsat, state.break_count, state.make_count
+        last_flip = [-1] * (num_vars + 1)
+        noise = p if p is not None else 0.0
+        adapted_at, adapted_unsat = 0, len(unsat)
+        for step in range(max_flips):
+            best_unsat = min(best_unsat, len(unsat))
+            if not unsat:
+                break
+            if deadline and flips % CLOCK_CHECK_FLIPS == 0 and time.perf_counter() > deadline:
+                break
+            if p is None:
+                if len(unsat) < adapted_unsat:
+                    noise -= noise * NOISE_PHI / 2
+                    adapted_at, adapted_unsat = step, len(unsat)
+                elif step - adapted_at > stall_limit:
+                    noise += (1 - noise) * NOISE_PHI
+                    adapted_at, adapted_unsat = step, len(unsat)
+
+            vars_ = clause_vars[unsat[int(rand() * len(unsat))]]
+            if rand() < NOVELTY_WALK:
+                var = vars_[int(rand() * len(vars_))]
+            else:
+                best = second = None
+                best_key = second_key = None
+                youngest = max(vars_, key=last_flip.__getitem__)
+                if last_flip[youngest] < 0:
+                    youngest = None
+                for v in vars_:
+                    # Higher score first, then older (smaller last_flip).
+                    key = (make_count[v] - break_count[v], -last_flip[v])
+                    if best_key is None or key > best_key:
+                        second, second_key = best, best_key
+                        best, best_key = v, key
+                    elif second_key is None or key > second_key:
+                        second, second_key = v, key
+                var = best
+                if best == youngest and second is not None and rand() < noise:
+                    var = second
+            state.flip(var)
+            last_flip[var] = step
+            flips += 1
+
+        best_unsat = min(best_unsat, len(unsat))
+        if not unsat:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, 0)
+            return state.assignment
+        if deadline and time.perf_counter() > deadline:
+            _fill_stats(stats, flips, _try + 1, start_time, setup_time, best_unsat)
+            return None
+
+    _fill_stats(stats, flips, max_tries, start_time, setup_time, best_unsat)
+    return None
+
+
+def verify_assignment(clauses, assignment):
+    """Whether assignment (bools indexed by variable) satisfies every clause."""
+    return assignment is not None and all(check_clause(clause, assignment) for clause in clauses)
+
+
+# Every engine returns its satisfying assignment (bools indexed by variable)
+# or None when its budget ran out, which proves nothing.
+SOLVERS = {
+    "WalkSAT_Optimized": walksat_optimized,
+    "WalkSAT_Incremental": walksat_incremental,
+    "WalkSAT_Batched": walksat_batched,
+    "ProbSAT": probsat,
+    "NoveltyPlus": novelty_plus,
+}
+
+
+def solver_params(solver_name, **overrides):
+    """Resolve the engine's default search parameters plus any overrides.
+
+    Unset parameters (None) are left out so they do not change the engine's
+    key in the results store. Setting one the engine does not take raises
+    ValueError rather than being silently ignored.
+    """
+    signature = inspect.signature(SOLVERS[solver_name])
+    unused = [name for name, value in overrides.items() if value is not None and name not in signature.parameters]
+    if unused:
+        flags = ", ".join("--" + name.replace("_", "-") for name in unused)
+        raise ValueError(f"{solver_name} does not take {flags}")
+    params = {name: signature.parameters[name].default for name in SEARCH_PARAMS if name in signature.parameters}
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def solution_result(clauses, assignment, pre=None):
+    """Row result of a local-search run on the original clauses.
+
+    An exhausted budget proves nothing, so it is UNKNOWN rather than UNSAT.
+    A model of the preprocessed formula is extended back first; one that
+    does not satisfy the original clauses is an engine bug and reported as
+    ERROR instead of SAT.
+    """
+    if assignment is None:
+        return "UNKNOWN"
+    if pre is not None:
+        assignment = pre.extend_model(assignment)
+    return "SAT" if verify_assignment(clauses, assignment) else "ERROR"
+
+
+def process_file(file_info):
+    idx, file, folder = file_info[:3]
+    solver_name = file_info[3] if len(file_info) > 3 else "WalkSAT_Optimized"
+    formula = file_info[4] if len(file_info) > 4 else None
+    params = file_info[5] if len(file_info) > 5 else {}
+    profile = file_info[6] if len(file_info) > 6 else {}
+    preprocessing = file_info[7] if len(file_info) > 7 else None
+    path = os.path.join(folder, file)
+    telemetry = Telemetry(file, **profile)
 
     result_entry = {
         "instance": file,
-        "solver": "WalkSAT_Optimized",
-        "num_vars": num_vars,
-        "num_clauses": len(clauses),
-        "result": "SAT" if sat else "UNSAT",
-        "runtime_seconds": round(runtime, 4)
+        "solver": solver_name,
+        "num_vars": 0,
+        "num_clauses": 0,
+        "result": "UNKNOWN",
+        "runtime_seconds": None,
     }
 
-    with lock:
-        write_header = not os.path.exists(output_file)
-        with open(output_file, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=result_entry.keys())
-            if write_header:
-                writer.writeheader()
-            writer.writerow(result_entry)
+    try:
+        with telemetry.phase("load"):
+            clauses, num_vars = load_clauses(path, formula=formula)
+    except Exception as e:
+        # Still a row, so that duplicates of this file get one too.
+        result_entry["result"] = "ERROR"
+        print(f"Error parsing {file}: {e}")
+        return result_entry
+
+    num_clauses = len(clauses)
+    original = clauses
+    pre = None
+    if preprocessing is not None:
+        with telemetry.phase("preprocess"):
+            pre = preprocess_instance(path, formula, **preprocessing)
+        clauses = pre.clauses
+
+    stats = {}
+    if pre is not None and pre.status:
+        # Decided by preprocessing alone; the engine is not started.
+        result = pre.status
+    else:
+        with telemetry.phase("solve", profile=True):
+            assignment = SOLVERS[solver_name](clauses, num_vars, stats=stats, **params)
+        result = solution_result(original, assignment, pre)
+    runtime = telemetry.wall.get("solve", 0.0)
+
+    result_entry.update({
+        "num_vars": num_vars,
+        "num_clauses": num_clauses,
+        "result": result,
+        "runtime_seconds": round(runtime, 4),
+        "flips": stats.get("flips", 0),
+        "flips_per_sec": stats.get("flips_per_sec", 0.0),
+        "restarts": stats.get("restarts", 0),
+        "best_unsat": stats.get("best_unsat", 0),
+    })
+    result_entry.update(telemetry.columns(stats))
+    if pre is not None:
+        result_entry.update(pre.columns())
 
     print(f"[{idx}] {file} -> {result_entry['result']} ({runtime:.3f}s)")
     return result_entry
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run WalkSAT over a folder of CNF instances.")
+    parser.add_argument("--solver", choices=sorted(SOLVERS), default="WalkSAT_Optimized")
+    parser.add_argument("--folder", default="instances/")
+    parser.add_argument("--output", default="results_walksat.csv")
+    parser.add_argument("--max-flips", type=int, help="flips per try (engine default if omitted)")
+    parser.add_argument("--max-tries", type=int, help="restarts / walkers (engine default if omitted)")
+    parser.add_argument("--p", type=float, help="noise probability (engine default if omitted; NoveltyPlus adapts it)")
+    parser.add_argument("--cb", type=float, help="ProbSAT break exponent (engine default if omitted)")
+    parser.add_argument("--max-seconds", type=float, help="time budget per instance for engines that take one")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="persistent results store used to resume runs")
+    parser.add_argument("--fresh", action="store_true", help="re-solve instances already in the store")
+    parser.add_argument("--retime-fraction", type=float, default=0.0,
+                        help="share of duplicate formulas to re-solve anyway for runtime variance")
+    parser.add_argument("--profile-dir", help="run each solve under cProfile and keep dumps of slow instances here")
+    parser.add_argument("--profile-threshold", type=float, default=1.0,
+                        help="keep a profile only when the solve took at least this many seconds")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        solver_params(args.solver, max_flips=args.max_flips, max_tries=args.max_tries, p=args.p, cb=args.cb,
+                      max_seconds=args.max_seconds)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def run_setup(args):
+    """(solver name, store params, task factory) for parsed runner arguments.
+
+    The task factory turns (index, instance name, formula) into the file_info
+    tuple process_file takes (see run_dpll.run_setup).
+    """
+    profile = {"profile_dir": args.profile_dir, "profile_threshold": args.profile_threshold}
+    preprocessing = preprocess_options(args)
+    params = solver_params(args.solver, max_flips=args.max_flips, max_tries=args.max_tries, p=args.p,
+                           cb=args.cb, max_seconds=args.max_seconds)
+    # Engine parameters plus the preprocessing mode identify a configuration in the store.
+    store_params = dict(params, preprocess=args.preprocess) if preprocessing is not None else params
+
+    def make_task(idx, name, formula):
+        return (idx, name, args.folder, args.solver, formula, params, profile, preprocessing)
+    return args.solver, store_params, make_task
+
+
 if __name__ == "__main__":
-    folder = "instances/"
-    output_file = "results_walksat.csv"
+    args = parse_args()
 
-    if os.path.exists(output_file):
-        os.remove(output_file)
+    folder = args.folder
+    output_file = args.output
+    solver_name, store_params, make_task = run_setup(args)
 
     if not os.path.isdir(folder):
         print(f"Error: Instance folder '{folder}' not found.")
     else:
-        cnf_files = [f for f in os.listdir(folder) if f.endswith(".cnf")]
-        if not cnf_files:
-            print(f"No .cnf files found in '{folder}'. Nothing to process.")
-        else:
-            file_info_list = [(i + 1, f, folder, output_file) for i, f in enumerate(cnf_files)]
-            max_workers = min(8, os.cpu_count() or 4)
-            print(f"Starting processing with {max_workers} worker processes...")
+        # Results are keyed by formula fingerprint, solver and params, so a
+        # rerun only schedules instances that are new, changed or not yet
+        # solved, and identical formulas are solved once per run.
+        store = ResultsStore(args.store)
+        max_workers = min(8, os.cpu_count() or 4)
+        print(f"Starting {solver_name} {store_params} with {max_workers} worker processes...")
 
+        # Workers only return rows; a single writer process owns the output files.
+        processed = 0
+        with ResultsSink(output_file, RESULT_SCHEMA, truncate=True,
+                         store_path=args.store, store_params=store_params) as sink:
+            # Instances (including compressed files and archive members) are
+            # enumerated lazily and fed to the pool as workers free up.
+            plan = RunPlan(folder, store, solver_name, store_params, sink, fresh=args.fresh,
+                           retime_fraction=args.retime_fraction)
+            file_info_iter = (make_task(i + 1, name, formula) for i, (name, formula) in enumerate(plan))
             with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                executor.map(process_file, file_info_list)
+                for row in imap_bounded(executor, process_file, file_info_iter):
+                    plan.complete(row)
+                    processed += 1
+        store.close()
 
-            print(f"\n WalkSAT results saved to '{output_file}'")
+        print(f"\n {processed} instances solved, {plan.aliases} duplicate formulas found "
+              f"({len(plan.retimed)} re-timed)")
+        print(f" WalkSAT results saved to '{output_file}'")
@@ -0,0 +1,249 @@
+# scheduler.py
+import os
+import sys
+import time
+import asyncio
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from cnf_loader import load_cnf, cache_member
+from cluster import RUNNERS, task_function
+from results_sink import ResultsSink
+from results_store import ResultsStore, RunPlan
+
+ORDERS = ("lpt", "spt", "fifo")
+# Runtime model written by merge_and_train.py --cost-sensitive, per runner.
+RUNTIME_MODEL = "runtime_regressor_{runner}.rf"
+# Fallbacks when an instance has no history: seconds and MB per literal, plus
+# the resident size of an idle worker. Only the order matters for the
+# runtime guess; the ETA is rescaled by the observed/predicted ratio.
+SECONDS_PER_LITERAL = 2e-6
+MB_PER_LITERAL = 2e-4
+WORKER_BASE_MB = 60.0
+PROGRESS_INTERVAL = 5.0
+
+
+class Job:
+    """One instance to solve, with its predicted runtime and memory."""
+
+    def __init__(self, index, name, task, seconds, memory_mb, source):
+        self.index = index
+        self.name = name
+        self.task = task
+        self.seconds = seconds
+        self.memory_mb = memory_mb
+        self.source = source
+
+
+class Estimator:
+    """Predict runtime and peak memory of an instance.
+
+    Past rows of the same solver (under any parameters) come first, then the
+    runtime regressor from merge_and_train.py --cost-sensitive, then a guess
+    from the formula size. Predictions are capped at the run's time limit.
+    """
+
+    def __init__(self, runner, solver, store, timeout=None, model_dir="."):
+        self.history = store.latest(solver)
+        self.timeout = timeout
+        self.model = None
+        model_path = os.path.join(model_dir, RUNTIME_MODEL.format(runner=runner))
+        if os.path.exists(model_path):
+            from forest_model import load_forest
+            self.model = load_forest(model_path)
+
+    def estimate(self, name, fingerprint, formula, path=None):
+        row = self.history.get(fingerprint)
+        num_lits = len(formula[0])
+        memory_mb = WORKER_BASE_MB + MB_PER_LITERAL * num_lits
+        if row is not None:
+            seconds = row.get("wall_seconds") or row.get("runtime_seconds") or 0.0
+            memory_mb = row.get("peak_rss_mb") or memory_mb
+            source = "history"
+        elif self.model is not None:
+            import numpy as np
+            from features import predictor_features
+            # The regressors predict log PAR10 runtime.
+            seconds = float(np.exp(self.model.predict([predictor_features(self.model, name, path, formula)])[0]))
+            source = "model"
+        else:
+            seconds = SECONDS_PER_LITERAL * num_lits
+            source = "size"
+        if self.timeout:
+            seconds = min(seconds, self.timeout)
+        return float(seconds), float(memory_mb), source
+
+
+def order_jobs(jobs, order):
+    """lpt: longest predicted first (makespan); spt: shortest first (mean completion)."""
+    if order == "lpt":
+        return sorted(jobs, key=lambda job: (-job.seconds, job.index))
+    if order == "spt":
+        return sorted(jobs, key=lambda job: (job.seconds, job.index))
+    return list(jobs)
+
+
+class Progress:
+    """Completed jobs, elapsed time and an ETA from the remaining predicted work.
+
+    Predictions are rescaled by the ratio of measured to predicted time of
+    the jobs finished so far, so a biased model still gives a usable ETA.
+    """
+
+    def __init__(self, jobs, workers):
+        self.total = len(jobs)
+        self.workers = workers
+        self.pending_predicted = sum(job.seconds for job in jobs)
+        self.running = {}
+        self.done = 0
+        self.predicted_done = 0.0
+        self.measured_done = 0.0
+        self.memory_mb = 0.0
+        self.start = time.perf_counter()
+
+    def begin(self, job):
+        self.pending_predicted -= job.seconds
+        self.memory_mb += job.memory_mb
+        self.running[job] = time.perf_counter()
+
+    def finish(self, job):
+        """Record a finished job; returns its measured seconds."""
+        seconds = time.perf_counter() - self.running.pop(job)
+        self.memory_mb -= job.memory_mb
+        self.done += 1
+        self.predicted_done += job.seconds
+        self.measured_done += seconds
+        return seconds
+
+    def eta(self):
+        scale = self.measured_done / self.predicted_done if self.predicted_done > 0 else 1.0
+        now = time.perf_counter()
+        running_left = [max(job.seconds * scale - (now - started), 0.0) for job, started in self.running.items()]
+        # All remaining work spread over the workers, but never less than
+        # the longest job still running.
+        spread = (max(self.pending_predicted, 0.0) * scale + sum(running_left)) / self.workers
+        return max([spread] + running_left)
+
+    def line(self):
+        elapsed = time.perf_counter() - self.start
+        percent = 100.0 * self.done / max(self.total, 1)
+        return (f"[{self.done}/{self.total}] {percent:5.1f}%  elapsed {elapsed:7.1f}s  "
+                f"ETA {self.eta():7.1f}s  running {len(self.running)}  memory {self.memory_mb:.0f} MB")
+
+
+async def _report(progress, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(progress.line(), flush=True)
+
+
+async def run_jobs(jobs, fn, workers, memory_mb=0, on_result=None, progress_interval=PROGRESS_INTERVAL):
+    """Run jobs in the given order on a process pool; returns the utilization stats.
+
+    A job is admitted when a worker is free and its memory estimate fits in
+    what is left of memory_mb (0 = no cap). When the next job in order does
+    not fit, the first later one that does is started instead, and a job
+    larger than the whole cap runs alone.
+    """
+    loop = asyncio.get_running_loop()
+    pending = list(jobs)
+    running = {}
+    progress = Progress(jobs, workers)
+    busy = 0.0
+    reporter = asyncio.ensure_future(_report(progress, progress_interval))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    free = memory_mb - progress.memory_mb
+                    job = next((j for j in pending if not memory_mb or j.memory_mb <= free or not running), None)
+                    if job is None:
+                        break
+                    pending.remove(job)
+                    running[loop.run_in_executor(executor, fn, job.task)] = job
+                    progress.begin(job)
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    busy += progress.finish(job)
+                    if on_result is not None:
+                        on_result(job, future.result())
+        finally:
+            reporter.cancel()
+
+    makespan = time.perf_counter() - progress.start
+    return {"jobs": len(jobs), "makespan": makespan, "busy": busy,
+            "utilization": busy / max(workers * makespan, 1e-9)}
+
+
+def plan_jobs(plan, folder, make_task, estimator):
+    """Materialize the plan into Jobs; ordering needs every estimate up front."""
+    jobs = []
+    for i, (name, formula) in enumerate(plan):
+        path = os.path.join(folder, name)
+        if formula is not None:
+            # Archive member: cache it now, or each worker would scan the
+            # archive up to its member again.
+            cache_member(path, formula)
+        seconds, memory_mb, source = estimator.estimate(name, plan.fingerprints[name],
+                                                        formula if formula is not None else load_cnf(path), path)
+        # formula=None: workers load the instance themselves instead of
+        # receiving the arrays through the pool.
+        jobs.append(Job(i + 1, name, make_task(i + 1, name, None), seconds, memory_mb, source))
+    return jobs
+
+
+def schedule(runner, runner_argv, order="lpt", workers=None, memory_mb=0, model_dir=".",
+             progress_interval=PROGRESS_INTERVAL):
+    """Run one runner sweep with predicted-runtime ordering and memory admission."""
+    module = importlib.import_module(RUNNERS[runner][0])
+    args = module.parse_args(runner_argv)
+    solver, params, make_task = module.run_setup(args)
+    workers = workers or min(8, os.cpu_count() or 4)
+    store = ResultsStore(args.store)
+
+    with ResultsSink(args.output, module.RESULT_SCHEMA, truncate=True,
+                     store_path=args.store, store_params=params) as sink:
+        plan = RunPlan(args.folder, store, solver, params, sink, fresh=args.fresh,
+                       retime_fraction=args.retime_fraction)
+        estimator = Estimator(runner, solver, store, getattr(args, "timeout", None), model_dir)
+        jobs = order_jobs(plan_jobs(plan, args.folder, make_task, estimator), order)
+        sources = {}
+        for job in jobs:
+            sources[job.source] = sources.get(job.source, 0) + 1
+        print(f"Scheduling {len(jobs)} {solver} jobs ({order}) on {workers} workers; "
+              f"{sum(job.seconds for job in jobs):.1f}s predicted work, estimates from {sources}")
+        stats = asyncio.run(run_jobs(jobs, task_function(runner), workers, memory_mb,
+                                     lambda job, row: plan.complete(row), progress_interval))
+    store.close()
+
+    print(f"\n {stats['jobs']} jobs in {stats['makespan']:.1f}s, worker utilization "
+          f"{100 * stats['utilization']:.1f}% (idle {stats['makespan'] * workers - stats['busy']:.1f} worker-s), "
+          f"{plan.aliases} duplicate formulas found")
+    print(f" Results saved to '{args.output}'")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a run_dpll / run_walksat sweep ordered by predicted runtime.",
+        epilog="Arguments after -- are passed to the runner, e.g. "
+               "scheduler.py dpll --order lpt -- --folder instances/ --timeout 5"
+    )
+    parser.add_argument("runner", choices=sorted(RUNNERS))
+    parser.add_argument("--order", choices=ORDERS, default="lpt",
+                        help="lpt: longest first (shortest makespan); spt: shortest first (mean completion time)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--memory-mb", type=float, default=0, help="admit jobs while their estimates fit (0 = no cap)")
+    parser.add_argument("--model-dir", default=".", help="where runtime_regressor_<runner>.rf is looked up")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL)
+
+    argv = sys.argv[1:]
+    runner_argv = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, runner_argv = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    schedule(args.runner, runner_argv, args.order, args.workers, args.memory_mb, args.model_dir,
+             args.progress_interval)
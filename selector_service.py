@@ -0,0 +1,253 @@
+# selector_service.py
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, wait
+
+DEFAULT_MODEL = "best_solver_predictor.pkl"
+DEFAULT_TIMEOUT = 5
+# Class labels of best_solver_predictor.pkl (see merge_and_train.py). N-way
+# selectors (merge_and_train.py --results) carry their own solver_labels.
+SOLVER_LABELS = {0: "DPLL", 1: "WalkSAT_Optimized"}
+
+# Per-worker state, loaded once by _init_worker.
+_model = None
+_presolver = None
+
+
+def _init_worker(model_path, presolve_path=None):
+    global _model, _presolver
+    from forest_model import load_predictor
+    # Ctrl-C is handled by the service process, which shuts the pool down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Pay the solver imports and model loading once per worker. The flat .rf
+    # export is used when present, so workers do not import sklearn at all.
+    import solvers
+    _model = load_predictor(model_path)
+    if presolve_path:
+        from presolve import Presolver
+        _presolver = Presolver.from_file(presolve_path)
+
+
+def _warmup():
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _select_and_solve(request):
+    import numpy as np
+    from cnf_loader import load_cnf, to_clause_lists
+    from features import predictor_features
+    from solvers import solve
+
+    path, timeout = request
+    timings = {}
+    start = time.perf_counter()
+    lits, offsets, num_vars = load_cnf(path)
+    num_clauses = len(offsets) - 1
+    t_loaded = time.perf_counter()
+    timings["load"] = t_loaded - start
+
+    clauses = None
+    if _presolver is not None:
+        # Easy instances are decided here, before any features are built.
+        clauses = to_clause_lists(lits, offsets)
+        result, solver = _presolver.run(clauses, num_vars, timeout)
+        t_presolved = time.perf_counter()
+        timings["presolve"] = t_presolved - t_loaded
+        if result is not None:
+            # No selection happened; these requests stay out of the overhead stats.
+            return {
+                "instance": path,
+                "solver": f"presolve:{solver}",
+                "num_vars": num_vars,
+                "num_clauses": num_clauses,
+                "result": result,
+                "timings_ms": {k: round(v * 1000, 3) for k, v in timings.items()},
+            }
+        t_loaded = t_presolved
+
+    x = np.array([predictor_features(_model, os.path.basename(path), path, (lits, offsets, num_vars))],
+                 dtype=np.float64)
+    t_features = time.perf_counter()
+    labels = getattr(_model, "solver_labels", None) or SOLVER_LABELS
+    solver = labels[int(_model.predict(x)[0])]
+    t_predicted = time.perf_counter()
+
+    # Any registered backend; local search reports UNKNOWN when it gives up.
+    if clauses is None:
+        clauses = to_clause_lists(lits, offsets)
+    result = solve(solver, clauses, num_vars, timeout)
+    end = time.perf_counter()
+
+    timings["features"] = t_features - t_loaded
+    timings["predict"] = t_predicted - t_features
+    timings["solve"] = end - t_predicted
+    timings["selection_overhead"] = timings["features"] + timings["predict"]
+    return {
+        "instance": path,
+        "solver": solver,
+        "num_vars": num_vars,
+        "num_clauses": num_clauses,
+        "result": result,
+        "timings_ms": {k: round(v * 1000, 3) for k, v in timings.items()},
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class SolverSelector:
+    """Route instances to the predicted best solver using warm worker processes.
+
+    Each worker loads the model and imports the solvers once at start-up, so
+    a request only pays for loading the instance, building its features,
+    one prediction and the solve itself. With a presolve config (see
+    presolve.py), a short local-search and Glucose burst runs first and the
+    instances it decides skip selection altogether.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL, workers=None, timeout=DEFAULT_TIMEOUT, presolve=None):
+        self.timeout = timeout
+        self.workers = workers or min(8, os.cpu_count() or 4)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(model_path, presolve)
+        )
+        self._lock = threading.Lock()
+        self._overheads = []
+        self._totals = []
+        self._presolved = 0
+        # Start every worker now rather than on the first requests.
+        wait([self.executor.submit(_warmup) for _ in range(self.workers)])
+
+    def select(self, path, timeout=None):
+        """Select a solver for path, run it and return result plus timings."""
+        start = time.perf_counter()
+        response = self.executor.submit(_select_and_solve, (path, timeout or self.timeout)).result()
+        total_ms = (time.perf_counter() - start) * 1000
+        response["timings_ms"]["total"] = round(total_ms, 3)
+        with self._lock:
+            if "selection_overhead" in response["timings_ms"]:
+                self._overheads.append(response["timings_ms"]["selection_overhead"])
+            else:
+                self._presolved += 1
+            self._totals.append(total_ms)
+        return response
+
+    def latency_summary(self):
+        with self._lock:
+            overheads, totals, presolved = list(self._overheads), list(self._totals), self._presolved
+        # Overhead percentiles cover the requests that went through selection.
+        return {
+            "requests": len(totals),
+            "presolved": presolved,
+            "selection_overhead_p50_ms": round(_percentile(overheads, 50), 3),
+            "selection_overhead_p99_ms": round(_percentile(overheads, 99), 3),
+            "total_p50_ms": round(_percentile(totals, 50), 3),
+            "total_p99_ms": round(_percentile(totals, 99), 3),
+        }
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def handle_line(selector, line):
+    """Answer one request line: a path, {"instance": path, "timeout": s} or {"command": "stats"}."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        request = json.loads(line) if line.startswith("{") else {"instance": line}
+        if request.get("command") == "stats":
+            return selector.latency_summary()
+        return selector.select(request["instance"], request.get("timeout"))
+    except Exception as e:
+        return {"error": str(e), "request": line}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            response = handle_line(self.server.selector, raw.decode())
+            if response is not None:
+                self.wfile.write((json.dumps(response) + "\n").encode())
+                self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def query(instance, socket_path=None, port=None, timeout=None):
+    """Send one request to a running service and return its JSON response."""
+    if socket_path:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path)
+    else:
+        conn = socket.create_connection(("127.0.0.1", port))
+    with conn, conn.makefile("rw") as stream:
+        stream.write(json.dumps({"instance": instance, "timeout": timeout}) + "\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solver selection service.")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="per-instance DPLL time limit")
+    parser.add_argument("--presolve", nargs="?", const="presolve.json",
+                        help="run the presolver tuned by presolve.py first (default presolve.json)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--socket", help="serve on this Unix socket path")
+    group.add_argument("--port", type=int, help="serve on this TCP port (localhost only)")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    with SolverSelector(args.model, args.workers, args.timeout, args.presolve) as selector:
+        print(f"Selector ready with {selector.workers} warm workers.", file=sys.stderr)
+        try:
+            if args.socket or args.port:
+                if args.socket:
+                    if os.path.exists(args.socket):
+                        os.remove(args.socket)
+                    server = _UnixServer(args.socket, _RequestHandler)
+                else:
+                    server = _TCPServer(("127.0.0.1", args.port), _RequestHandler)
+                server.selector = selector
+                print(f"Listening on {args.socket or f'127.0.0.1:{args.port}'}", file=sys.stderr)
+                with server:
+                    server.serve_forever()
+            else:
+                # One request per line on stdin, one JSON response per line on stdout.
+                for line in sys.stdin:
+                    response = handle_line(selector, line)
+                    if response is not None:
+                        print(json.dumps(response), flush=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(json.dumps(selector.latency_summary()), file=sys.stderr)
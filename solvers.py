@@ -0,0 +1,187 @@
+# solvers.py
+import time
+import inspect
+import multiprocessing as mp
+from pysat.solvers import Solver
+from run_dpll import run_limited, GLUCOSE_STATS
+import run_walksat
+from telemetry import ChildUsage, peak_rss_mb
+
+# Wall time allowed past the timeout for a solver run in a child process to
+# report back before it is killed.
+CHILD_GRACE = 0.5
+
+
+def _child_solve(backend, clauses, num_vars, params, conn):
+    stats = {}
+    try:
+        result = backend.solve_direct(clauses, num_vars, params, stats)
+    except Exception as e:
+        result = "ERROR"
+        stats["error"] = str(e)
+    conn.send((result, stats, peak_rss_mb()))
+    conn.close()
+
+
+def _solve_in_child(backend, clauses, num_vars, params, stats):
+    """Run backend.solve_direct in a forked child and kill it at the timeout.
+
+    For engines that cannot be interrupted from another thread. Fork shares
+    the clause list with the child, so nothing is pickled on the way in. The
+    child's CPU time and peak RSS go into stats (see telemetry.ChildUsage).
+    """
+    timeout = params.get("timeout")
+    receiver, sender = mp.Pipe(duplex=False)
+    process = mp.get_context("fork").Process(
+        target=_child_solve, args=(backend, clauses, num_vars, params, sender), daemon=True
+    )
+    child = ChildUsage()
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout + CHILD_GRACE if timeout else None):
+            result, child_stats, child.peak_rss_mb = receiver.recv()
+            stats.update(child_stats)
+            return result
+        return "TIMEOUT"
+    except EOFError:
+        # The child died without answering (killed, out of memory).
+        return "ERROR"
+    finally:
+        if process.is_alive():
+            child.before_kill(process.pid)
+            process.kill()
+        process.join()
+        receiver.close()
+        stats.update(child.stats())
+
+
+class Backend:
+    """A solver the generic runner can use.
+
+    complete is True for solvers that can prove UNSAT; local search only ever
+    answers SAT, and reports UNKNOWN when its budget runs out. params() maps
+    the runner's arguments to the backend's parameters (they also key the
+    results store), solve() fills stats with the backend's STATS counters
+    plus setup_seconds and returns SAT, UNSAT or a limit outcome.
+    """
+
+    complete = True
+    interruptible = True
+    STATS = ()
+
+    def __init__(self, name):
+        self.name = name
+
+    def params(self, args):
+        return {"timeout": args.timeout}
+
+    def solve(self, clauses, num_vars, params, stats):
+        """Solve under params["timeout"]; engines that cannot be stopped run in a child."""
+        if self.interruptible or not params.get("timeout"):
+            return self.solve_direct(clauses, num_vars, params, stats)
+        return _solve_in_child(self, clauses, num_vars, params, stats)
+
+    def solve_direct(self, clauses, num_vars, params, stats):
+        raise NotImplementedError
+
+
+class PysatBackend(Backend):
+    """A CDCL engine from pysat, limited through solve_limited() when it supports it."""
+
+    STATS = GLUCOSE_STATS
+
+    def __init__(self, name, engine, interruptible=True):
+        super().__init__(name)
+        self.engine = engine
+        self.interruptible = interruptible
+
+    def params(self, args):
+        params = {"timeout": args.timeout}
+        if self.interruptible:
+            # Budgets and the memory cap need solve_limited().
+            params.update(conflicts=args.conflicts, propagations=args.propagations, memory_mb=args.memory_mb)
+        return params
+
+    def solve_direct(self, clauses, num_vars, params, stats):
+        start_time = time.perf_counter()
+        solver = Solver(name=self.engine)
+        try:
+            for clause in clauses:
+                solver.add_clause(clause)
+            stats["setup_seconds"] = round(time.perf_counter() - start_time, 6)
+            if self.interruptible:
+                result, _ = run_limited(solver, params.get("timeout"), params, stats=stats, kill=True)
+                return result
+            sat = solver.solve()
+            counters = solver.accum_stats() or {}
+            stats.update({name: counters.get(name, 0) for name in self.STATS})
+            return "SAT" if sat else "UNSAT"
+        finally:
+            solver.delete()
+
+
+class LocalSearchBackend(Backend):
+    """An in-repo local-search engine from run_walksat.SOLVERS.
+
+    Engines with a max_seconds budget stop themselves at the timeout; the
+    others run in a child process that is killed at it. A model is checked
+    against the clauses before SAT is reported.
+    """
+
+    complete = False
+    STATS = ("flips", "flips_per_sec", "restarts", "best_unsat")
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.interruptible = "max_seconds" in inspect.signature(run_walksat.SOLVERS[name]).parameters
+
+    def params(self, args):
+        params = run_walksat.solver_params(self.name, max_flips=args.max_flips, max_tries=args.max_tries, p=args.p,
+                                           cb=args.cb)
+        params["timeout"] = args.timeout
+        return params
+
+    def solve_direct(self, clauses, num_vars, params, stats):
+        search = {name: params[name] for name in run_walksat.SEARCH_PARAMS if name in params}
+        if self.interruptible and params.get("timeout") and "max_seconds" not in search:
+            search["max_seconds"] = params["timeout"]
+        assignment = run_walksat.SOLVERS[self.name](clauses, num_vars, stats=stats, **search)
+        return run_walksat.solution_result(clauses, assignment)
+
+
+BACKENDS = {}
+
+
+def register(backend):
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+# "DPLL" is the name run_dpll.py has always recorded for Glucose3.
+register(PysatBackend("DPLL", "glucose3"))
+register(PysatBackend("Glucose4", "glucose4"))
+register(PysatBackend("MapleChrono", "maplechrono"))
+register(PysatBackend("Minisat22", "minisat22"))
+# pysat cannot interrupt or budget these two; they are killed at the timeout.
+register(PysatBackend("CaDiCaL153", "cadical153", interruptible=False))
+register(PysatBackend("Lingeling", "lingeling", interruptible=False))
+for _name in run_walksat.SOLVERS:
+    register(LocalSearchBackend(_name))
+
+
+def is_complete(solver_name):
+    """Whether UNSAT from this solver is a proof (unknown names count as complete)."""
+    backend = BACKENDS.get(solver_name)
+    return backend is None or backend.complete
+
+
+def solve(solver_name, clauses, num_vars, timeout=None, stats=None, **overrides):
+    """Solve a clause list with a registered backend at its default parameters."""
+    backend = BACKENDS[solver_name]
+    if isinstance(backend, LocalSearchBackend):
+        params = run_walksat.solver_params(solver_name)
+    else:
+        params = {}
+    params.update(overrides, timeout=timeout)
+    return backend.solve(clauses, num_vars, params, stats if stats is not None else {})
@@ -0,0 +1,142 @@
+# telemetry.py
+import os
+import re
+import time
+import cProfile
+import resource
+import contextlib
+
+# Extra result columns shared by the runners.
+TELEMETRY_SCHEMA = [
+    ("load_seconds", "float64"),
+    ("preprocess_seconds", "float64"),
+    ("setup_seconds", "float64"),
+    ("search_seconds", "float64"),
+    ("wall_seconds", "float64"),
+    ("cpu_seconds", "float64"),
+    ("peak_rss_mb", "float64"),
+    ("profile_path", "string"),
+]
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS mark so the next reading covers one instance.
+
+    Pool workers solve many instances; without the reset the peak would be
+    the worst instance the worker has seen so far. Linux only, else a no-op.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid=None):
+    """Peak RSS of this process, or of the live process pid (None if unreadable)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def children_cpu_seconds():
+    """CPU time of this process's finished (and waited for) children."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class ChildUsage:
+    """CPU time and peak RSS of one forked solver child, for the parent's telemetry.
+
+    Created in the parent just before the fork. A child that reports back
+    sends its own peak RSS; one that is about to be killed is read through
+    /proc first. CPU time comes from RUSAGE_CHILDREN once the child has been
+    joined, so a killed child is billed too.
+    """
+
+    def __init__(self):
+        self.cpu_before = children_cpu_seconds()
+        self.peak_rss_mb = None
+
+    def before_kill(self, pid):
+        self.peak_rss_mb = peak_rss_mb(pid)
+
+    def stats(self):
+        """child_cpu_seconds / child_peak_rss_mb entries for a solver's stats dict."""
+        stats = {"child_cpu_seconds": round(children_cpu_seconds() - self.cpu_before, 6)}
+        if self.peak_rss_mb is not None:
+            stats["child_peak_rss_mb"] = round(self.peak_rss_mb, 1)
+        return stats
+
+
+class Telemetry:
+    """Wall time, CPU time and peak RSS of one instance, split into phases.
+
+    Runners wrap loading and solving in phase() blocks; the solver reports the
+    part of the solve spent building its data structures as setup_seconds in
+    its stats dict, the rest counts as search. A solver that ran in a forked
+    child reports the child's child_cpu_seconds and child_peak_rss_mb there
+    too; they are added to the worker's own. With profile_dir, the solve
+    runs under cProfile and the pstats file is kept when the instance took at
+    least profile_threshold seconds.
+    """
+
+    def __init__(self, instance, profile_dir=None, profile_threshold=0.0):
+        self.instance = instance
+        self.profile_dir = profile_dir
+        self.profile_threshold = profile_threshold
+        self.wall = {}
+        self.cpu = 0.0
+        self.profile_path = ""
+        reset_peak_rss()
+
+    @contextlib.contextmanager
+    def phase(self, name, profile=False):
+        profiler = cProfile.Profile() if profile and self.profile_dir else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - wall_start
+            self.wall[name] = self.wall.get(name, 0.0) + elapsed
+            self.cpu += time.process_time() - cpu_start
+            if profiler is not None and elapsed >= self.profile_threshold:
+                self.profile_path = self._dump(profiler, name)
+
+    def _dump(self, profiler, phase):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        safe_name = re.sub(r"[^\w.-]+", "_", self.instance)
+        path = os.path.join(self.profile_dir, f"{safe_name}.{phase}.pstats")
+        profiler.dump_stats(path)
+        return path
+
+    def columns(self, stats=None):
+        """TELEMETRY_SCHEMA values from the solver's stats dict.
+
+        Its setup_seconds is carved out of the solve phase; a forked child's
+        CPU time and peak RSS are merged with the worker's.
+        """
+        stats = stats or {}
+        solve = self.wall.get("solve", 0.0)
+        setup = min(stats.get("setup_seconds") or 0.0, solve)
+        return {
+            "load_seconds": round(self.wall.get("load", 0.0), 4),
+            "preprocess_seconds": round(self.wall.get("preprocess", 0.0), 4),
+            "setup_seconds": round(setup, 4),
+            "search_seconds": round(solve - setup, 4),
+            "wall_seconds": round(sum(self.wall.values()), 4),
+            "cpu_seconds": round(self.cpu + stats.get("child_cpu_seconds", 0.0), 4),
+            "peak_rss_mb": round(max(peak_rss_mb(), stats.get("child_peak_rss_mb", 0.0)), 1),
+            "profile_path": self.profile_path,
+        }
@@ -0,0 +1,485 @@
+# training.py
+import os
+import json
+import time
+import contextlib
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from imblearn.over_sampling import RandomOverSampler
+from forest_model import export_forest, forest_path_for
+from telemetry import peak_rss_mb
+
+# Failed runs are charged PAR10 (10x the cutoff); log-runtimes are floored at this.
+PAR_FACTOR = 10
+RUNTIME_FLOOR = 1e-4
+
+# Columns read from results files, and rows read per chunk.
+RESULT_COLUMNS = ("instance", "solver", "num_vars", "num_clauses", "result", "runtime_seconds")
+CHUNK_ROWS = 250_000
+# Reduced rows kept before duplicates across chunks are collapsed.
+COMPACT_ROWS = 2_000_000
+
+# N-way selector (class i runs solver_labels[i]), the per-instance cost table
+# it was trained on (so updates do not re-read old results) and the metrics
+# of the last training run.
+SELECTOR_MODEL = "solver_selector.pkl"
+TRAINING_TABLE = "solver_selector_table.parquet"
+TRAINING_METRICS = "training_metrics.json"
+
+FOREST_PARAMS = {"n_estimators": 150, "random_state": 42}
+# Randomized search space of the selector forest.
+SEARCH_SPACE = {
+    "n_estimators": [100, 150, 300],
+    "max_depth": [None, 8, 16, 32],
+    "min_samples_leaf": [1, 2, 5, 10],
+    "max_features": ["sqrt", 0.5, 1.0],
+    # How the training rows are balanced (see recipe_sample).
+    "resample": ["none", "oversample"],
+    "weighting": ["regret", "none"],
+}
+# Trees added per result batch by update_selector, fitted on the new
+# instances plus as many replayed ones from the table.
+UPDATE_TREES = 50
+
+
+def read_results(csv_path):
+    """Prefer the columnar copy written by the results sink, fall back to CSV."""
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path)
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Could not read '{parquet_path}' ({e}), using CSV.")
+    return pd.read_csv(csv_path)
+
+
+def iter_results(csv_path, chunksize=CHUNK_ROWS):
+    """Yield the RESULT_COLUMNS of a results file chunk by chunk.
+
+    The parquet copy is read batch by batch when it exists, else the CSV is
+    streamed (by pyarrow's block reader when available), so memory does not
+    grow with the file.
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    batches = None
+    try:
+        if os.path.exists(parquet_path):
+            import pyarrow.parquet as pq
+            source = pq.ParquetFile(parquet_path)
+            columns = [name for name in RESULT_COLUMNS if name in source.schema_arrow.names]
+            batches = source.iter_batches(batch_size=chunksize, columns=columns)
+        else:
+            import pyarrow.csv as pa_csv
+            with open(csv_path) as f:
+                header = f.readline().strip().split(",")
+            # Blocks of roughly chunksize rows at ~100 bytes per row.
+            batches = pa_csv.open_csv(
+                csv_path,
+                read_options=pa_csv.ReadOptions(block_size=max(chunksize * 100, 1 << 20)),
+                # Torn lines from interrupted writers; pandas reads them as rows without a solver.
+                parse_options=pa_csv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=[name for name in RESULT_COLUMNS if name in header],
+                    column_types={"instance": "string", "solver": "string", "result": "string"}),
+            )
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Could not stream '{csv_path}' with pyarrow ({e}), using pandas.")
+    if batches is not None:
+        for batch in batches:
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(csv_path, usecols=lambda name: name in RESULT_COLUMNS, chunksize=chunksize)
+
+
+def par10_runtime(frame, suffix, solved_results, cutoff):
+    """Runtime of one solver per instance, with failures charged PAR_FACTOR x cutoff.
+
+    Only results in solved_results count as solved, so a WalkSAT UNKNOWN
+    (or "UNSAT" in older files: it gave up) is penalised like a timeout, as
+    is any run past the cutoff. suffix picks the merged columns of one
+    solver; None reads a single solver's runtime_seconds / result.
+    """
+    column = (lambda name: f"{name}_{suffix}") if suffix else (lambda name: name)
+    runtime = pd.to_numeric(frame[column("runtime_seconds")], errors="coerce")
+    solved = frame[column("result")].isin(solved_results) & (runtime <= cutoff)
+    return runtime.where(solved, PAR_FACTOR * cutoff)
+
+
+def portfolio_time(costs, choice):
+    """Per-instance PAR10 time when solver column choice[i] runs instance i."""
+    return costs[np.arange(len(costs)), np.asarray(choice, dtype=int)]
+
+
+class TrainingMetrics:
+    """Wall and CPU seconds per training phase plus peak memory, saved as JSON.
+
+    CPU seconds cover this process only; search and fitting with n_jobs also
+    run in worker processes or threads.
+    """
+
+    def __init__(self, mode):
+        self.info = {"mode": mode}
+        self.phases = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.phases[name] = {"wall_seconds": round(time.perf_counter() - wall_start, 4),
+                                 "cpu_seconds": round(time.process_time() - cpu_start, 4)}
+
+    def write(self, path):
+        metrics = dict(self.info, phases=self.phases,
+                       total_wall_seconds=round(time.perf_counter() - self.start, 4),
+                       peak_rss_mb=round(peak_rss_mb(), 1))
+        with open(path, "w") as f:
+            json.dump(metrics, f, indent=2, default=str)
+        print(f"Training metrics saved to '{path}' ({metrics['total_wall_seconds']:.1f}s, "
+              f"peak RSS {metrics['peak_rss_mb']:.0f} MB)")
+
+
+# --- Streaming results into a cost table ---
+
+def load_costs(csv_paths, cutoff, chunksize=CHUNK_ROWS):
+    """Stream results files into one PAR10 cost per (instance, solver); the last row wins.
+
+    Returns (costs, sizes, rows read): costs has one column per solver in order
+    of first appearance, sizes holds num_vars / num_clauses per instance. Each
+    chunk is reduced to five columns right away, and repeated (instance,
+    solver) rows are collapsed whenever COMPACT_ROWS accumulate, so memory
+    follows the distinct pairs rather than the rows read.
+    """
+    from solvers import is_complete
+
+    complete, parts, kept, rows = {}, [], 0, 0
+    for path in csv_paths:
+        for chunk in iter_results(path, chunksize):
+            if "solver" not in chunk:
+                raise ValueError(f"'{path}' has no solver column")
+            rows += len(chunk)
+            # Rows without a solver or instance name (failed writes) carry no cost.
+            chunk = chunk.dropna(subset=["instance", "solver"])
+            solver = chunk["solver"].astype(str)
+            for name in solver.unique():
+                complete.setdefault(name, is_complete(name))
+            # Local search never proves UNSAT, so only its SAT answers count.
+            result = chunk["result"]
+            runtime = pd.to_numeric(chunk["runtime_seconds"], errors="coerce")
+            solved = result.eq("SAT") | (result.eq("UNSAT") & solver.map(complete).astype(bool))
+            part = pd.DataFrame({
+                "instance": chunk["instance"].astype(str),
+                "solver": solver,
+                "num_vars": pd.to_numeric(chunk["num_vars"], errors="coerce"),
+                "num_clauses": pd.to_numeric(chunk["num_clauses"], errors="coerce"),
+                "cost": runtime.where(solved & (runtime <= cutoff), PAR_FACTOR * cutoff),
+            })
+            parts.append(part)
+            kept += len(part)
+            if kept > COMPACT_ROWS:
+                parts = [pd.concat(parts, ignore_index=True).drop_duplicates(["instance", "solver"], keep="last")]
+                kept = len(parts[0])
+
+    if not parts:
+        raise ValueError("no result rows found")
+    reduced = pd.concat(parts, ignore_index=True).drop_duplicates(["instance", "solver"], keep="last")
+    costs = reduced.pivot(index="instance", columns="solver", values="cost")[list(complete)]
+    costs.columns.name = None
+    sizes = reduced.drop_duplicates("instance").set_index("instance")[["num_vars", "num_clauses"]]
+    return costs, sizes, rows
+
+
+def feature_frame(table, folder=None, columns=None):
+    """Features of the table's instances, indexed by instance.
+
+    Without folder these are the MODEL_FEATURE_COLS built from the sizes in
+    the results. With folder, each instance is read from it and described by
+    features.instance_features (cached in feature_cache/); columns fixes their
+    order, e.g. to match a saved selector.
+    """
+    from features import MODEL_FEATURE_COLS, model_feature_matrix, instance_features, structural_row
+    if folder is None:
+        return pd.DataFrame(model_feature_matrix(table.index, table["num_vars"], table["num_clauses"]),
+                            columns=MODEL_FEATURE_COLS, index=table.index)
+    rows = [instance_features(os.path.join(folder, name))[0] for name in table.index]
+    if columns is None:
+        columns = []
+        for row in rows:
+            columns.extend(name for name in row if name not in columns)
+    return pd.DataFrame([structural_row(row, columns) for row in rows], columns=list(columns), index=table.index)
+
+
+def save_table(table, solver_names, path=TRAINING_TABLE):
+    table[["num_vars", "num_clauses"] + list(solver_names)].rename_axis("instance").to_parquet(path)
+
+
+# --- Fitting ---
+
+def regret_weights(costs):
+    """Sample weight per instance: the mean PAR10 seconds lost by not picking its best solver.
+
+    Instances every solver handles about equally weigh next to nothing, so the
+    forest spends its splits where a wrong choice is expensive. Balancing the
+    classes instead (oversampling) made a rare solver as important as the
+    one that wins nearly everything, and the selector lost to always running
+    the single best solver.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    return (costs - costs.min(axis=1, keepdims=True)).mean(axis=1) + RUNTIME_FLOOR
+
+
+def recipe_sample(X, y, params, weights=None):
+    """Apply the balancing in params to the training rows; returns (X, y, weights, forest params).
+
+    params may carry the SEARCH_SPACE choices resample ("none" by default, or
+    "oversample" to balance the classes) and weighting ("regret" by default:
+    keep weights, "none": drop them); the rest are forest parameters.
+    """
+    params = dict(params)
+    resample = params.pop("resample", "none")
+    if params.pop("weighting", "regret") == "none":
+        weights = None
+    if resample == "oversample" and pd.Series(y).nunique() > 1:
+        sampler = RandomOverSampler(random_state=42)
+        sampler.fit_resample(X, y)
+        rows = sampler.sample_indices_
+        X, y = X.iloc[rows], y.iloc[rows]
+        weights = None if weights is None else np.asarray(weights)[rows]
+    return X, y, weights, params
+
+
+def fit_forest(X, y, params, jobs=None, weights=None):
+    """The selector recipe: a random forest, balanced as params say (see recipe_sample)."""
+    X, y, weights, params = recipe_sample(X, y, params, weights)
+    forest = RandomForestClassifier(**params, n_jobs=jobs).fit(X, y, sample_weight=weights)
+    # Saved models predict one instance at a time; no worker pool for that.
+    return forest.set_params(n_jobs=None)
+
+
+class _RecipeForest(ClassifierMixin, BaseEstimator):
+    """fit_forest as an estimator, so a search can tune its balancing too."""
+
+    def __init__(self, resample="none", weighting="regret", n_estimators=150, max_depth=None,
+                 min_samples_leaf=1, max_features="sqrt", random_state=42):
+        self.resample = resample
+        self.weighting = weighting
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.random_state = random_state
+
+    def fit(self, X, y, sample_weight=None):
+        self.forest_ = fit_forest(X, y, self.get_params(), weights=sample_weight)
+        self.classes_ = self.forest_.classes_
+        return self
+
+    def predict(self, X):
+        return self.forest_.predict(X)
+
+
+def portfolio_scorer(costs):
+    """CV score of a selector: minus the mean PAR10 time of its choices.
+
+    Fold rows are looked up in costs by instance (the feature frame's index),
+    so the search optimizes portfolio time rather than label accuracy.
+    """
+    def score(estimator, X, y):
+        return -float(portfolio_time(costs.loc[X.index].to_numpy(), estimator.predict(X)).mean())
+    return score
+
+
+def search_forest(X, y, costs, jobs=-1, folds=5, iterations=20, seed=42):
+    """Cross-validated randomized search over SEARCH_SPACE; returns (params, mean PAR10 s).
+
+    Resampling and regret weights (from the costs) are part of the space and
+    only touch the training folds, so validation folds keep the real class
+    balance. Folds are stratified when every class has enough rows.
+    """
+    from sklearn.model_selection import KFold, ParameterGrid, RandomizedSearchCV, StratifiedKFold
+
+    counts = y.value_counts()
+    cv = (StratifiedKFold(folds, shuffle=True, random_state=seed) if counts.min() >= folds
+          else KFold(folds, shuffle=True, random_state=seed))
+    search = RandomizedSearchCV(_RecipeForest(), SEARCH_SPACE,
+                                n_iter=min(iterations, len(ParameterGrid(SEARCH_SPACE))),
+                                scoring=portfolio_scorer(costs), cv=cv, n_jobs=jobs, random_state=seed,
+                                refit=False)
+    search.fit(X, y, sample_weight=regret_weights(costs.loc[X.index]))
+
+    results = pd.DataFrame(search.cv_results_).sort_values("rank_test_score").head(5)
+    print(f"\n{folds}-fold search over {len(search.cv_results_['params'])} settings (mean PAR10 s per instance):")
+    for _, row in results.iterrows():
+        print(f"  {-row['mean_test_score']:9.4f} +- {row['std_test_score']:.4f}  {row['params']}")
+    return dict(FOREST_PARAMS, **search.best_params_), -float(search.best_score_)
+
+
+# --- Training and updating the N-way selector ---
+
+def train_selector(csv_paths, cutoff, chunksize=CHUNK_ROWS, search=False, folds=5, iterations=20, jobs=-1,
+                   metrics_path=TRAINING_METRICS, feature_folder=None):
+    """Train an N-way selector: each instance is labelled with its fastest solver (PAR10).
+
+    Every solver found in the results files becomes a class. Only instances
+    that every solver ran are used. Features are the MODEL_FEATURE_COLS, or
+    the structural features of the instances in feature_folder; the selector
+    service computes the same ones at request time. With search, the forest's
+    hyperparameters are chosen by cross-validation on the training split.
+    """
+    metrics = TrainingMetrics("full")
+    with metrics.phase("load"):
+        costs, sizes, rows = load_costs(csv_paths, cutoff, chunksize)
+        solver_names = list(costs.columns)
+        table = costs.dropna().join(sizes)
+    print(f"{rows} result rows, {len(table)} instances run by all of {len(solver_names)} solvers: "
+          f"{', '.join(solver_names)}")
+
+    with metrics.phase("features"):
+        X = feature_frame(table, feature_folder)
+        cost_table = table[solver_names]
+        cost_matrix = cost_table.to_numpy()
+        y = pd.Series(cost_matrix.argmin(axis=1), index=table.index)
+    print("\n Fastest-solver distribution:")
+    print(y.map(dict(enumerate(solver_names))).value_counts().to_string())
+
+    counts = y.value_counts()
+    stratify = y if len(counts) > 1 and counts.min() >= 2 else None
+    positions = np.arange(len(y))
+    train_pos, test_pos = train_test_split(positions, test_size=0.2, random_state=42, stratify=stratify)
+
+    params = dict(FOREST_PARAMS)
+    if search and y.iloc[train_pos].nunique() > 1:
+        with metrics.phase("search"):
+            params, cv_time = search_forest(X.iloc[train_pos], y.iloc[train_pos], cost_table, jobs, folds, iterations)
+        metrics.info.update(cv_mean_par10=round(cv_time, 6), folds=folds)
+        print(f"Best setting: {params}")
+
+    weights = regret_weights(cost_matrix)
+    with metrics.phase("holdout"):
+        selector = fit_forest(X.iloc[train_pos], y.iloc[train_pos], params, jobs, weights[train_pos])
+        choice = selector.predict(X.iloc[test_pos])
+    test_costs = cost_matrix[test_pos]
+    single_best = int(cost_matrix[train_pos].sum(axis=0).argmin())
+    penalty = PAR_FACTOR * cutoff
+    accuracy = accuracy_score(y.iloc[test_pos], choice)
+    print(f"\nHeld-out accuracy: {accuracy:.3f} on {len(test_pos)} instances")
+    print(f"{'Selector':28s} {'total s':>10s} {'mean s':>9s} {'solved':>7s}")
+    report = [("Virtual best solver", test_costs.min(axis=1)),
+              (f"Single best ({solver_names[single_best]})", test_costs[:, single_best]),
+              ("Selector", portfolio_time(test_costs, choice))]
+    report += [(f"  always {name}", test_costs[:, i]) for i, name in enumerate(solver_names)]
+    for name, times in report:
+        print(f"{name:28s} {times.sum():10.3f} {times.mean():9.4f} {int((times < penalty).sum()):7d}")
+
+    # A selector that loses to the single best solver on the held-out split
+    # is not worth its selection overhead: save one that always picks that
+    # solver instead.
+    selector_total = float(portfolio_time(test_costs, choice).sum())
+    single_best_total = float(test_costs[:, single_best].sum())
+    fallback = selector_total > single_best_total
+    if fallback:
+        print(f"\nThe selector ({selector_total:.3f}s) is slower than always running {solver_names[single_best]} "
+              f"({single_best_total:.3f}s); saving a selector that always picks {solver_names[single_best]}.")
+        y = pd.Series(single_best, index=y.index)
+
+    # The saved selector is refit on every instance.
+    with metrics.phase("fit"):
+        selector = fit_forest(X, y, params, jobs, weights)
+        # Hyperparameters a later full refit (update_selector) starts from.
+        selector.training_params = params
+    with metrics.phase("save"):
+        save_selector(selector, solver_names)
+        save_table(table, solver_names)
+    metrics.info.update(rows_read=rows, instances=len(table), solvers=solver_names, params=params, jobs=jobs,
+                        structural_features=feature_folder is not None, holdout_accuracy=round(accuracy, 4),
+                        holdout_par10_seconds=round(selector_total, 4),
+                        single_best_par10_seconds=round(single_best_total, 4),
+                        fallback_to_single_best=solver_names[single_best] if fallback else None)
+    metrics.write(metrics_path)
+
+
+def save_selector(selector, solver_names):
+    selector.solver_labels = list(solver_names)
+    joblib.dump(selector, SELECTOR_MODEL)
+    export_forest(selector, forest_path_for(SELECTOR_MODEL), list(selector.feature_names_in_), solver_names)
+    print(f"\nSelector saved as '{SELECTOR_MODEL}' and '{forest_path_for(SELECTOR_MODEL)}'")
+
+
+def update_selector(csv_paths, cutoff, chunksize=CHUNK_ROWS, add_trees=UPDATE_TREES, refit=False, jobs=-1,
+                    metrics_path=TRAINING_METRICS, seed=42, feature_folder=None):
+    """Fold a new batch of results into the saved selector without re-reading old ones.
+
+    New rows replace the table's costs for the same instance and solver.
+    Unless refit is set, add_trees trees are grown on the new instances plus
+    as many replayed from the table (warm start), keeping the existing trees.
+    The forest is refit on the whole table instead when refit is set or the
+    sample misses a class the forest knows. Solvers the selector was not
+    trained with are ignored. A selector trained on structural features
+    needs feature_folder to read the instances from.
+    """
+    from features import structural_columns
+
+    if not (os.path.exists(SELECTOR_MODEL) and os.path.exists(TRAINING_TABLE)):
+        raise SystemExit(f"No '{SELECTOR_MODEL}' / '{TRAINING_TABLE}' to update; train with --results first.")
+    metrics = TrainingMetrics("refit" if refit else "update")
+    with metrics.phase("load"):
+        selector = joblib.load(SELECTOR_MODEL)
+        solver_names = list(selector.solver_labels)
+        columns = structural_columns(selector)
+        if (columns is None) != (feature_folder is None):
+            raise SystemExit(f"'{SELECTOR_MODEL}' was trained "
+                             + ("with" if columns is not None else "without")
+                             + " --structural-features; update it the same way.")
+        table = pd.read_parquet(TRAINING_TABLE)
+        costs, sizes, rows = load_costs(csv_paths, cutoff, chunksize)
+        ignored = [name for name in costs.columns if name not in solver_names]
+        if ignored:
+            print(f"Ignoring solvers the selector was not trained with: {', '.join(ignored)}")
+        batch = costs.reindex(columns=solver_names).join(sizes)
+        # New values win; solvers missing from the batch keep their old costs.
+        table = batch.combine_first(table)[table.columns].dropna()
+        changed = table.index.intersection(batch.index)
+    print(f"{rows} new result rows: {len(changed)} instances added or changed, {len(table)} in the table")
+    if len(changed) == 0:
+        print("Nothing to update.")
+        return
+
+    with metrics.phase("features"):
+        X = feature_frame(table, feature_folder, columns)
+        cost_matrix = table[solver_names].to_numpy()
+        y = pd.Series(cost_matrix.argmin(axis=1), index=table.index)
+        weights = pd.Series(regret_weights(cost_matrix), index=table.index)
+        rest = table.index.difference(changed)
+        replay = rest.to_series().sample(n=min(len(rest), len(changed)), random_state=seed).index
+        sample = changed.append(replay)
+    grow = not refit and set(y.loc[sample].unique()) == set(selector.classes_)
+    with metrics.phase("fit"):
+        if grow:
+            # The new trees see the rows balanced the way the selector was trained.
+            X_grow, y_grow, w_grow, _ = recipe_sample(X.loc[sample], y.loc[sample],
+                                                      getattr(selector, "training_params", FOREST_PARAMS),
+                                                      weights.loc[sample].to_numpy())
+            selector.set_params(warm_start=True, n_estimators=len(selector.estimators_) + add_trees, n_jobs=jobs)
+            selector.fit(X_grow, y_grow, sample_weight=w_grow)
+            selector.set_params(warm_start=False, n_jobs=None)
+            print(f"Added {add_trees} trees ({len(selector.estimators_)} in total) "
+                  f"fitted on {len(changed)} new and {len(replay)} replayed instances")
+        else:
+            params = getattr(selector, "training_params", FOREST_PARAMS)
+            selector = fit_forest(X, y, params, jobs, weights.to_numpy())
+            selector.training_params = params
+            print(f"Refit on all {len(table)} instances"
+                  + ("" if refit else " (the new sample misses a class of the saved forest)"))
+    with metrics.phase("save"):
+        save_selector(selector, solver_names)
+        save_table(table, solver_names)
+    metrics.info.update(rows_read=rows, instances=len(table), changed=len(changed), replayed=len(replay),
+                        trees=len(selector.estimators_), grown=grow, jobs=jobs)
+    metrics.write(metrics_path)
@@ -18,7 +18,7 @@ sns.scatterplot(
     x="num_clauses_walksat",
     y="num_vars_walksat",
     hue=merged["result_walksat"],
-    palette={"SAT":"green", "UNSAT":"red"},
+    palette={"SAT":"green", "UNSAT":"red", "UNKNOWN":"gray"},
     alpha=0.6
 )
 plt.title("WalkSAT: Satisfiability vs Clauses / Variables")
@@ -36,7 +36,7 @@ sns.scatterplot(
     x="num_clauses_walksat",
     y="runtime_seconds_walksat",
     hue=merged["result_walksat"],
-    palette={"SAT":"green", "UNSAT":"red"},
+    palette={"SAT":"green", "UNSAT":"red", "UNKNOWN":"gray"},
     alpha=0.6
 )
 plt.title("WalkSAT: Runtime vs Clauses")